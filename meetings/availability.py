@@ -0,0 +1,67 @@
+"""
+Availability of meeting participants as slot vectors.
+
+The meeting's dateRange x timeRange is cut into fixed-size slots
+(15 minutes by default; see slot_grid).  A participant's free times
+become a boolean NumPy vector with one entry per slot, True where
+they are free for the whole slot (mask).  meeting_slots keeps the
+sum of those vectors per meeting, and "best slots where at least M
+people are free" is a vectorized selection over it (best_indices)
+rather than nested loops over participants and days.
+"""
+
+import numpy as np
+
+import freetime
+import slot_grid
+
+SLOT_MINUTES = slot_grid.SLOT_MINUTES
+
+
+class Availability:
+    """The slots of a fixed set of daily windows, as a mask source"""
+
+    def __init__(self, windows, slot_minutes=SLOT_MINUTES, slots=None):
+        self.slot_minutes = slot_minutes
+        # Slots of a shared SlotGrid are used as they are, not copied
+        if slots is None:
+            slots = slot_grid.slot_starts(windows, slot_minutes)
+        self.slots = slots
+
+    def mask(self, free):
+        """
+        Boolean slot vector for free intervals in epoch minutes,
+        either a flat list or one list per day.  A slot counts as
+        free only if it lies entirely inside one free interval.
+        """
+        if free and (not free[0] or isinstance(free[0][0], (list, tuple))):
+            free = [ interval for daily in free for interval in daily ]
+        if not free:
+            return np.zeros(len(self.slots), dtype=bool)
+        merged = np.array(freetime.merge_intervals(free), dtype=np.int64)
+        i = np.searchsorted(merged[:, 0], self.slots, side="right") - 1
+        inside = i >= 0
+        ends = merged[np.maximum(i, 0), 1]
+        return inside & (self.slots + self.slot_minutes <= ends)
+
+
+def best_indices(counts, k, at_least=1):
+    """
+    Indices of up to k entries of the counts array that are at
+    least 'at_least', largest first and lowest index among ties.
+    """
+    candidates = np.flatnonzero(counts >= at_least)
+    if len(candidates) > k:
+        # Partial selection of the k largest, then sort just those
+        top = np.argpartition(-counts[candidates], k - 1)[:k]
+        threshold = counts[candidates[top]].min()
+        candidates = candidates[counts[candidates] >= threshold]
+    order = np.lexsort((candidates, -counts[candidates]))[:k]
+    return candidates[order]
+
+
+def grid_for(record, tzinfo, slot_minutes=SLOT_MINUTES):
+    """The Availability of a meeting's dateRange and timeRange"""
+    grid = slot_grid.for_meeting(record, tzinfo, slot_minutes)
+    return Availability(grid.windows, slot_minutes, grid.slots)
+
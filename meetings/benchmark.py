@@ -0,0 +1,335 @@
+"""
+Benchmarks for free-time computation and the meeting pages.
+
+    python3 benchmark.py [--quick] [--output results.json]
+                         [--compare baseline.json]
+
+Three groups are timed:
+
+  engine   get_next_free_time over synthetic calendars of each kind
+           (sparse, dense, overlapping, all-day), for several event
+           counts per day and lengths of date range;
+  routes   /index (get_memos), /choose (list_calendars) and /setrange
+           (freebusy and meeting insert, without a background job)
+           through Flask's test client, with a stub Calendar service
+           and the database replaced by mongomock.  After its first
+           hit /index comes from the page cache, as it would;
+  startup  a fresh interpreter importing flask_main, then calling
+           create_app() and create_app(preload=True): the wall time
+           of each, and the time -X importtime counts for the
+           imports they make beyond the interpreter's own.
+
+Each case reports the minimum and median of its runs, in seconds.
+Results are written as JSON together with the git commit, so runs
+on two commits can be compared: --compare prints the ratio of each
+case's median to the baseline's and flags slowdowns beyond
+--threshold.  Run it from this directory (it reads credentials.ini
+like the app does); the event cache is turned off so that every
+run does the full work.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+import mongomock
+from oauth2client import client
+
+import database
+
+# Every Mongo client the app creates is an in-memory one
+database.MongoClient = mongomock.MongoClient
+
+import flask_main
+import meeting_repo
+from stubs import StubService
+
+BEGIN = date(2017, 11, 27)   # a Monday
+DAY_START = 9                # daily window, hours
+DAY_END = 17
+KINDS = ("sparse", "dense", "overlapping", "allday")
+
+
+####
+#
+#  Synthetic calendars
+#
+####
+
+def make_events(kind, days, per_day, seed=0):
+    """
+    Google-style event dicts, in start time order, over 'days' days
+    from BEGIN with about per_day events each day:
+
+      sparse       short meetings spread over the whole day
+      dense        back-to-back meetings within working hours
+      overlapping  long meetings that overlap one another
+      allday       timed meetings plus an all-day event every other day
+    """
+    rng = random.Random(seed)
+    local = flask_main.timeparse.local_tz()
+    events = [ ]
+    for day in range(days):
+        midnight = datetime.datetime.combine(BEGIN + timedelta(days=day),
+                                             datetime.time(0), local)
+        if kind == "allday" and day % 2 == 0:
+            events.append({ "summary": "All day",
+                            "start": { "date": midnight.date().isoformat() },
+                            "end": { "date": (midnight.date()
+                                              + timedelta(days=1)).isoformat() } })
+        for i in range(per_day):
+            if kind == "dense":
+                length = (DAY_END - DAY_START) * 60 // per_day
+                start = DAY_START * 60 + i * length
+            elif kind == "overlapping":
+                length = rng.randrange(60, 240, 15)
+                start = rng.randrange(DAY_START * 60 - 60, DAY_END * 60, 15)
+            else:
+                length = rng.choice((15, 30, 60))
+                start = rng.randrange(7 * 60, 20 * 60, 15)
+            begin = midnight + timedelta(minutes=start)
+            events.append({ "summary": "Event {}".format(i),
+                            "start": { "dateTime": begin.isoformat() },
+                            "end": { "dateTime": (begin + timedelta(
+                                minutes=length)).isoformat() } })
+    events.sort(key=lambda event: event["start"].get("dateTime")
+                or event["start"]["date"])
+    return events
+
+
+####
+#
+#  Timing
+#
+####
+
+def checked(response):
+    """A test client response, which must not be an error"""
+    if response.status_code >= 400:
+        raise RuntimeError("{} {}".format(response.status_code,
+                                          response.data[:200]))
+    return response
+
+
+def timed(fn, runs):
+    """(min, median) seconds of 'runs' calls of fn"""
+    times = [ ]
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def record(results, group, name, params, runs, fn):
+    best, median = timed(fn, runs)
+    add_result(results, group, name, params, runs, best, median)
+
+
+def add_result(results, group, name, params, runs, best, median):
+    results.append({ "group": group, "name": name, "params": params,
+                     "runs": runs, "min": best, "median": median })
+    print("{:8} {:24} {:44} {:10.6f} {:10.6f}".format(
+        group, name, json.dumps(params, sort_keys=True), best, median))
+
+
+def session_range(days):
+    """Session values for days days from BEGIN, DAY_START to DAY_END"""
+    local = flask_main.timeparse.local_tz()
+    midnight = datetime.datetime.combine(BEGIN, datetime.time(0), local)
+    return { "begin_date": midnight.isoformat(),
+             "end_date": (midnight + timedelta(days=days - 1)).isoformat(),
+             "begin_time": "{:02}:00".format(DAY_START),
+             "end_time": "{:02}:00".format(DAY_END) }
+
+
+def engine_benchmarks(results, quick):
+    day_counts = (1, 7) if quick else (1, 7, 30)
+    per_day_counts = (2, 20) if quick else (2, 10, 50)
+    runs = 3 if quick else 10
+    for kind in KINDS:
+        for days in day_counts:
+            for per_day in per_day_counts:
+                events = make_events(kind, days, per_day)
+                window = session_range(days)
+                with flask_main.app.test_request_context():
+                    flask_main.flask.session.update(window)
+                    time_min, time_max = flask_main.query_window()
+                    record(results, "engine", "get_next_free_time",
+                           { "kind": kind, "days": days, "per_day": per_day },
+                           runs,
+                           lambda: flask_main.get_next_free_time(
+                               time_min, time_max, { "items": iter(events) }))
+
+
+def route_benchmarks(results, quick):
+    runs = 5 if quick else 20
+    app = flask_main.app
+    flask_main.EVENT_CACHE = None
+    flask_main.JOBS = None
+    credentials = client.OAuth2Credentials(
+        "token", "client", "secret", "refresh",
+        datetime.datetime.utcnow() + timedelta(hours=1),
+        "https://oauth2.googleapis.com/token", "benchmark")
+
+    for meetings in ((10, 200) if quick else (10, 200, 2000)):
+        flask_main.collection.delete_many({ })
+        for i in range(meetings):
+            meeting_repo.insert(flask_main.collection, { "name": "m{}".format(i) })
+        meeting_repo.list_changed(flask_main.COUNTERS)
+        web = app.test_client()
+        record(results, "routes", "index", { "meetings": meetings }, runs,
+               lambda: checked(web.get("/index")))
+
+    for calendars in ((1, 5) if quick else (1, 5, 20)):
+        for per_day in (5, 30):
+            days = 7
+            service = StubService({
+                "calendar{}@example.com".format(i):
+                    make_events(KINDS[i % len(KINDS)], days, per_day, seed=i)
+                for i in range(calendars) })
+            flask_main.get_gcal_service = (
+                lambda credentials, timeout=None, service=service: service)
+            web = app.test_client()
+            with web.session_transaction() as session:
+                session["credentials"] = credentials.to_json()
+                session.update(session_range(days))
+            params = { "calendars": calendars, "days": days,
+                       "per_day": per_day }
+            record(results, "routes", "choose", params, runs,
+                   lambda: checked(web.get("/choose")))
+            form = { "daterange": "{} - {}".format(
+                         BEGIN.strftime("%m/%d/%Y"),
+                         (BEGIN + timedelta(days=days - 1)).strftime("%m/%d/%Y")),
+                     "start": "{}:00".format(DAY_START),
+                     "end": "{}:00".format(DAY_END),
+                     "title": "benchmark", "pw": "" }
+            record(results, "routes", "setrange", params, runs,
+                   lambda: checked(web.post("/setrange", data=form)))
+
+
+STARTUP_CASES = [
+    ("import", "import flask_main"),
+    ("create_app", "import flask_main; flask_main.create_app()"),
+    ("create_app_preload",
+     "import flask_main; flask_main.create_app(preload=True)"),
+]
+
+
+def import_seconds(code):
+    """
+    Seconds that -X importtime reports for the top-level imports of
+    a fresh interpreter running code (those it imports indirectly
+    are included in their importer's time).
+    """
+    proc = subprocess.run([ sys.executable, "-X", "importtime", "-c", code ],
+                          cwd=os.path.dirname(os.path.abspath(__file__)),
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    total = 0
+    for line in proc.stderr.splitlines():
+        # import time: <self us> | <cumulative us> | <indented name>
+        fields = line.split("|")
+        if (len(fields) == 3 and fields[1].strip().isdigit()
+                and not fields[2].startswith("  ")):
+            total += int(fields[1])
+    return total / 1e6
+
+
+def startup_benchmarks(results, quick):
+    runs = 3 if quick else 10
+    base = min(import_seconds("pass") for _ in range(runs))
+    for name, code in STARTUP_CASES:
+        imports = [ ]
+        record(results, "startup", name, { "measure": "wall" }, runs,
+               lambda: imports.append(import_seconds(code) - base))
+        add_result(results, "startup", name, { "measure": "importtime" },
+                   runs, min(imports), statistics.median(imports))
+
+
+####
+#
+#  Results
+#
+####
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            [ "git", "rev-parse", "--short", "HEAD" ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file, threshold):
+    """Print median ratios against a baseline; True if none regressed"""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    def case(result):
+        return (result["group"], result["name"],
+                json.dumps(result["params"], sort_keys=True))
+    before = { case(result): result for result in baseline["results"] }
+    ok = True
+    print("\nCompared with {} ({})".format(baseline_file, baseline.get("commit")))
+    for result in results:
+        old = before.get(case(result))
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else 0
+        flag = ""
+        if ratio > threshold:
+            flag = "  SLOWER"
+            ok = False
+        print("{:8} {:24} {:44} {:6.2f}x{}".format(
+            case(result)[0], case(result)[1], case(result)[2], ratio, flag))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MeetMe benchmarks")
+    parser.add_argument("--quick", action="store_true",
+                        help="fewer cases and runs")
+    parser.add_argument("--group", choices=("engine", "routes", "startup"),
+                        help="run only one group")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="where to write the results")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="median ratio counted as a slowdown")
+    args = parser.parse_args()
+
+    flask_main.create_app()
+    # The app logs every request at DEBUG; that is not what we measure
+    flask_main.app.logger.setLevel("WARNING")
+    results = [ ]
+    if args.group in (None, "engine"):
+        engine_benchmarks(results, args.quick)
+    if args.group in (None, "routes"):
+        route_benchmarks(results, args.quick)
+    if args.group in (None, "startup"):
+        startup_benchmarks(results, args.quick)
+
+    with open(args.output, "w") as f:
+        json.dump({ "commit": git_commit(),
+                    "python": platform.python_version(),
+                    "date": datetime.datetime.now().isoformat(),
+                    "quick": args.quick,
+                    "results": results }, f, indent=1)
+    print("Wrote {}".format(args.output))
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Streaming bulk transfer of documents between a collection and a file.
+
+Used by export_db.py and import_db.py.  Two file formats:
+
+  jsonl  one MongoDB Extended JSON document per line (relaxed mode,
+         so ObjectIds and dates survive the round trip)
+  bson   concatenated BSON documents, as written by mongodump
+
+Documents are read and written one at a time and sent to the
+database in batches, so memory stays constant however large the
+file or collection: exports read through a cursor with a large
+batch size, imports send unordered insert_many (or bulk_write
+upserts) of 'batch_size' documents.
+"""
+
+import sys
+import time
+
+import bson
+from bson import json_util
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+DEFAULT_BATCH = 1000
+FORMATS = ("jsonl", "bson")
+DUPLICATE_KEY = 11000
+
+
+class Progress:
+    """Counts documents and bytes, and reports the rate to stderr"""
+
+    def __init__(self, verb, every=10000, out=sys.stderr):
+        self.verb = verb
+        self.every = every
+        self.out = out
+        self.docs = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.start = time.perf_counter()
+
+    def add(self, docs, size):
+        before = self.docs // self.every
+        self.docs += docs
+        self.bytes += size
+        if self.docs // self.every != before:
+            self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        self.out.write("{}{} {} documents ({:.1f} MB) in {:.1f}s: "
+                       "{:.0f} docs/s, {:.1f} MB/s{}\n".format(
+                           "" if final else "... ", self.verb, self.docs,
+                           self.bytes / 1e6, elapsed, self.docs / elapsed,
+                           self.bytes / 1e6 / elapsed,
+                           ", {} skipped".format(self.skipped)
+                           if self.skipped else ""))
+
+
+def write_documents(documents, out, fmt, progress):
+    """Write documents to the binary file 'out' in format fmt"""
+    for document in documents:
+        if fmt == "bson":
+            data = bson.encode(document)
+        else:
+            data = (json_util.dumps(
+                document, json_options=json_util.RELAXED_JSON_OPTIONS)
+                    + "\n").encode()
+        out.write(data)
+        progress.add(1, len(data))
+
+
+def read_documents(stream, fmt, progress):
+    """Generator of the documents of the binary file 'stream'"""
+    if fmt == "bson":
+        while True:
+            # Each document starts with its own length, little-endian
+            head = stream.read(4)
+            if len(head) < 4:
+                return
+            data = head + stream.read(int.from_bytes(head, "little") - 4)
+            progress.bytes += len(data)
+            yield bson.decode(data)
+    for line in stream:
+        progress.bytes += len(line)
+        if line.strip():
+            yield json_util.loads(line)
+
+
+def export_collection(collection, out, fmt="jsonl", query=None,
+                      batch_size=DEFAULT_BATCH):
+    """Stream the documents of collection (matching query) to out"""
+    progress = Progress("Exported")
+    cursor = collection.find(query or { }, batch_size=batch_size)
+    write_documents(cursor, out, fmt, progress)
+    progress.report(final=True)
+    return progress
+
+
+def _batches(documents, size):
+    batch = [ ]
+    for document in documents:
+        batch.append(document)
+        if len(batch) == size:
+            yield batch
+            batch = [ ]
+    if batch:
+        yield batch
+
+
+def import_collection(collection, stream, fmt="jsonl", upsert=False,
+                      batch_size=DEFAULT_BATCH):
+    """
+    Load the documents of stream into collection, batch_size at a
+    time, unordered.  Documents whose _id is already there are
+    skipped, or replaced if upsert is set.
+    """
+    progress = Progress("Imported")
+    for batch in _batches(read_documents(stream, fmt, progress), batch_size):
+        if upsert:
+            for document in batch:
+                document.setdefault("_id", bson.ObjectId())
+            collection.bulk_write(
+                [ ReplaceOne({ "_id": document["_id"] }, document, upsert=True)
+                  for document in batch ],
+                ordered=False)
+        else:
+            try:
+                collection.insert_many(batch, ordered=False)
+            except BulkWriteError as err:
+                errors = err.details.get("writeErrors", [ ])
+                if any(error["code"] != DUPLICATE_KEY for error in errors):
+                    raise
+                progress.skipped += len(errors)
+        progress.add(len(batch), 0)
+    progress.report(final=True)
+    return progress
@@ -0,0 +1,128 @@
+"""
+Google Calendar REST calls on an asyncio event loop.
+
+The Google client library is synchronous: each call holds the
+thread for a whole round trip, and calendar_fetch needs a thread
+per calendar to overlap them.  CalendarClient speaks the same REST
+endpoints with aiohttp instead, so the calendar list, the events of
+every calendar and the freebusy queries of one request all wait on
+the network together in a single thread.
+
+Only the OAuth access token is needed, and the API root can be
+changed, so the client can be pointed at a local mock server (see
+mock_calendar.py) for load testing.  Responses are the same dicts
+the client library returns, so freebusy.busy_intervals and the
+free-time code work on them unchanged.
+"""
+
+import asyncio
+import logging
+from urllib.parse import quote
+
+import aiohttp
+
+import calendar_fetch
+import freebusy
+
+log = logging.getLogger(__name__)
+
+API_URL = "https://www.googleapis.com/calendar/v3"
+
+
+class CalendarError(Exception):
+    """The Calendar API answered with an error status"""
+
+    def __init__(self, status, message):
+        super().__init__("{}: {}".format(status, message))
+        self.status = status
+
+
+class CalendarClient:
+    """
+    One aiohttp session authorized with an access token; use as
+
+        async with CalendarClient(token) as client:
+            calendars = await client.calendar_list()
+    """
+
+    def __init__(self, access_token, base_url=API_URL,
+                 timeout=calendar_fetch.DEFAULT_TIMEOUT):
+        self.access_token = access_token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            headers={ "Authorization": "Bearer " + self.access_token },
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        return False
+
+    async def _request(self, method, path, params=None, body=None):
+        async with self._session.request(method, self.base_url + path,
+                                         params=params, json=body) as response:
+            if response.status >= 400:
+                raise CalendarError(response.status, await response.text())
+            return await response.json()
+
+    async def calendar_list(self):
+        """All entries of the user's calendar list"""
+        items = [ ]
+        params = { }
+        while True:
+            page = await self._request("GET", "/users/me/calendarList",
+                                       params)
+            items.extend(page.get("items", [ ]))
+            if not page.get("nextPageToken"):
+                return items
+            params["pageToken"] = page["nextPageToken"]
+
+    async def events(self, cal_id, time_min, time_max,
+                     page_size=calendar_fetch.PAGE_SIZE):
+        """Event items of one calendar in [time_min, time_max)"""
+        items = [ ]
+        params = { "singleEvents": "true",
+                   "orderBy": "startTime",
+                   "maxResults": str(page_size),
+                   "timeMin": time_min,
+                   "timeMax": time_max }
+        path = "/calendars/{}/events".format(quote(cal_id, safe=""))
+        while True:
+            page = await self._request("GET", path, params)
+            items.extend(page.get("items", [ ]))
+            if not page.get("nextPageToken"):
+                return items
+            params["pageToken"] = page["nextPageToken"]
+
+    async def events_for(self, cal_ids, time_min, time_max):
+        """
+        Dict cal_id -> event items, all calendars fetched at once.
+        As in calendar_fetch.fetch_all, a calendar that times out is
+        logged and given no events; other errors propagate.
+        """
+        async def fetch(cal_id):
+            try:
+                return await self.events(cal_id, time_min, time_max)
+            except asyncio.TimeoutError:
+                log.warning("Timed out fetching events for {}".format(cal_id))
+                return [ ]
+
+        results = await asyncio.gather(*[ fetch(cal_id)
+                                          for cal_id in cal_ids ])
+        return dict(zip(cal_ids, results))
+
+    async def freebusy(self, cal_ids, time_min, time_max):
+        """Freebusy responses as from freebusy.query, sent together"""
+        size = freebusy.MAX_CALENDARS
+        bodies = [ { "timeMin": time_min,
+                     "timeMax": time_max,
+                     "items": [ { "id": cal_id }
+                                for cal_id in cal_ids[i:i + size] ] }
+                   for i in range(0, len(cal_ids), size) ]
+        return list(await asyncio.gather(
+            *[ self._request("POST", "/freeBusy", body=body)
+               for body in bodies ]))
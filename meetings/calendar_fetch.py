@@ -0,0 +1,150 @@
+"""
+Fetch events for several Google calendars at once.
+
+Each calendar's events are listed in a bounded pool of worker
+threads.  The Google client's http object is not thread-safe, so
+every worker thread builds its own service object (once) from the
+service_factory it is given.  The pool lives as long as the process,
+so its threads keep their open connections (see http_pool) from one
+request to the next.  Anything with the shape of the
+Calendar API service object, service.events().list(...).execute(),
+can stand in for Google, so a local stub works for testing.
+
+fetch_batched gets the same result without threads: the event
+queries of all calendars go out as one multipart request to the
+API's batch endpoint (new_batch_http_request), and the responses
+are mapped back to their calendars by request id.  Calendars with
+more than one page of events are followed up in further batches,
+one per round of next pages.
+"""
+
+import logging
+import threading
+from concurrent import futures
+
+from thread_pool import ThreadPool
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 10   # seconds, for all the calendars of a fetch
+PAGE_SIZE = 2500       # largest page the events API will return
+MAX_BATCH = 50         # calls the batch endpoint takes at once
+
+_pools = { }           # max_workers -> ThreadPool
+_pools_lock = threading.Lock()
+
+
+def _pool(max_workers):
+    """The pool of max_workers threads, made on first use"""
+    with _pools_lock:
+        return _pools.setdefault(max_workers, ThreadPool(max_workers))
+
+
+def iter_items(service, cal_id, time_min, time_max, page_size=PAGE_SIZE):
+    """
+    Generator of the event items of one calendar in
+    [time_min, time_max), in start time order.  Pages are requested
+    only as the consumer reaches them, and only one page is held at
+    a time.
+    """
+    page_token = None
+    while True:
+        event_list = service.events().list(
+            calendarId=cal_id,
+            singleEvents=True,
+            orderBy='startTime',
+            maxResults=page_size,
+            pageToken=page_token,
+            timeMin=time_min,
+            timeMax=time_max).execute()
+        page_token = event_list.get('nextPageToken')
+        yield from event_list.get('items', [ ])
+        if not page_token:
+            return
+
+
+def list_items(service, cal_id, time_min, time_max):
+    """All event items of one calendar in [time_min, time_max)"""
+    return list(iter_items(service, cal_id, time_min, time_max))
+
+
+def fetch_all(cal_ids, service_factory, time_min, time_max,
+              max_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+              lister=list_items):
+    """
+    Returns dict cal_id -> list of event items, fetching up to
+    max_workers calendars in parallel.  Each calendar is fetched by
+    lister(service, cal_id, time_min, time_max), list_items unless
+    (say) a cache is put in front of it.  A calendar not fetched
+    within 'timeout' seconds of the start is logged and given no
+    events rather than holding up the whole page; other errors
+    propagate as they would for a sequential fetch.
+
+    The fetches run in pool threads, outside the request's context:
+    spans opened there are not traced, so the caller times the whole
+    fetch with one span.
+    """
+    local = threading.local()
+
+    def fetch(cal_id):
+        if not hasattr(local, "service"):
+            local.service = service_factory()
+        return lister(local.service, cal_id, time_min, time_max)
+
+    pool = _pool(max_workers)
+    pending = [ (cal_id, pool.submit(fetch, cal_id))
+                for cal_id in cal_ids ]
+    futures.wait([ future for _, future in pending ], timeout=timeout)
+    results = { }
+    for cal_id, future in pending:
+        if future.done():
+            results[cal_id] = future.result()
+        else:
+            log.warning("Timed out fetching events for {}".format(cal_id))
+            # Drops a fetch still queued; one that is running can't
+            # be stopped, and keeps its thread until it finishes
+            future.cancel()
+            results[cal_id] = [ ]
+    return results
+
+
+def fetch_batched(service, cal_ids, time_min, time_max,
+                  page_size=PAGE_SIZE, max_batch=MAX_BATCH):
+    """
+    Returns dict cal_id -> list of event items, like fetch_all, with
+    one batch request per MAX_BATCH calendars and round of pages
+    instead of one request per calendar and page.  An error for any
+    calendar propagates, as it would for a sequential fetch.
+    """
+    results = { cal_id: [ ] for cal_id in cal_ids }
+    tokens = { cal_id: None for cal_id in cal_ids }   # pages still wanted
+    while tokens:
+        pending = list(tokens.items())
+        tokens = { }
+        for i in range(0, len(pending), max_batch):
+            chunk = pending[i:i + max_batch]
+            responses = { }
+
+            def collect(request_id, response, exception):
+                responses[request_id] = (response, exception)
+
+            batch = service.new_batch_http_request(callback=collect)
+            for n, (cal_id, page_token) in enumerate(chunk):
+                batch.add(service.events().list(
+                    calendarId=cal_id,
+                    singleEvents=True,
+                    orderBy='startTime',
+                    maxResults=page_size,
+                    pageToken=page_token,
+                    timeMin=time_min,
+                    timeMax=time_max), request_id=str(n))
+            batch.execute()
+            for n, (cal_id, _) in enumerate(chunk):
+                response, exception = responses[str(n)]
+                if exception is not None:
+                    raise exception
+                results[cal_id].extend(response.get('items', [ ]))
+                if response.get('nextPageToken'):
+                    tokens[cal_id] = response['nextPageToken']
+    return results
@@ -10,6 +10,8 @@ from pymongo import MongoClient
 import sys
 
 import config
+import meeting_repo
+import meeting_slots
 CONFIG = config.configuration()
 
 MONGO_ADMIN_URL = "mongodb://{}:{}@{}:{}/admin".format(
@@ -30,4 +32,11 @@ except Exception as err:
     print("Failed")
     print(err)
 
-
+try:
+    print("Attempting to create indexes")
+    meeting_repo.ensure_indexes(db.meetings)
+    meeting_slots.ensure_indexes(db.participants)
+    print("Created indexes on meetings and participants")
+except Exception as err:
+    print("Failed")
+    print(err)
@@ -0,0 +1,177 @@
+"""
+Access to the Mongo database, one client per process.
+
+A MongoClient must not be carried across a fork: gunicorn forks its
+workers from the master, and a client created at import time would
+be shared (sockets, pool, monitor threads) by all of them.  Here the
+client is created lazily, on first use in each process, and created
+again if we find ourselves in a different process than the one that
+made it.  Module code can hold LazyCollection objects from import
+time on; they look up the real collection on each use.
+
+Pool and write settings come from config.configuration():
+    DB_POOL_SIZE        maxPoolSize
+    DB_MIN_POOL_SIZE    minPoolSize
+    DB_TIMEOUT_MS       server selection and connect timeouts
+    DB_WAIT_TIMEOUT_MS  longest wait for a free pooled connection
+    DB_WRITE_CONCERN    w (e.g. 1 or majority)
+Settings that are not given keep pymongo's defaults.
+
+pool_stats() reports pool utilization, counted by a pymongo
+connection pool listener.
+"""
+
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+
+_lock = threading.Lock()
+_client = None
+_pid = None
+_url = None
+_db_name = None
+_options = { }
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Counts of connection pool events in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+
+    def snapshot(self):
+        with self._lock:
+            return { "open": self.created - self.closed,
+                     "created": self.created,
+                     "closed": self.closed,
+                     "in_use": self.checked_out,
+                     "max_in_use": self.max_checked_out,
+                     "checkouts": self.checkouts,
+                     "checkout_failures": self.checkout_failures,
+                     "max_pool_size": _options.get("maxPoolSize", 100) }
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    # Events we don't count
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+STATS = PoolStats()
+
+
+def client_url(CONFIG):
+    return "mongodb://{}:{}@{}:{}/{}".format(
+        CONFIG.DB_USER,
+        CONFIG.DB_USER_PW,
+        CONFIG.DB_HOST,
+        CONFIG.DB_PORT,
+        CONFIG.DB)
+
+
+def configure(CONFIG):
+    """Note the settings to use; does not connect"""
+    global _url, _db_name, _options
+    _url = client_url(CONFIG)
+    _db_name = CONFIG.DB
+    options = { }
+    settings = [ ("DB_POOL_SIZE", "maxPoolSize"),
+                 ("DB_MIN_POOL_SIZE", "minPoolSize"),
+                 ("DB_TIMEOUT_MS", "serverSelectionTimeoutMS"),
+                 ("DB_TIMEOUT_MS", "connectTimeoutMS"),
+                 ("DB_WAIT_TIMEOUT_MS", "waitQueueTimeoutMS"),
+                 ("DB_WRITE_CONCERN", "w") ]
+    for setting, option in settings:
+        value = getattr(CONFIG, setting, None)
+        if value is not None and value != "":
+            options[option] = value
+    _options = options
+
+
+def client():
+    """This process's MongoClient, created on first use"""
+    global _client, _pid
+    pid = os.getpid()
+    if _client is None or _pid != pid:
+        with _lock:
+            if _client is None or _pid != pid:
+                if _url is None:
+                    raise RuntimeError("database.configure was not called")
+                # A client inherited from our parent is not ours to
+                # close; just stop using it
+                STATS.reset()
+                _client = MongoClient(_url, event_listeners=[ STATS ],
+                                      **_options)
+                _pid = pid
+    return _client
+
+
+def get_db():
+    return client()[_db_name]
+
+
+def pool_stats():
+    """Connection pool utilization of this process"""
+    return STATS.snapshot()
+
+
+class LazyCollection:
+    """
+    Stands in for db[name]; the collection is looked up (and the
+    client created, if need be) each time it is used.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __repr__(self):
+        return "LazyCollection({!r})".format(self.name)
@@ -0,0 +1,187 @@
+"""
+Cache of calendar events, keyed by owner, calendar and time window.
+
+Visiting /choose or /setrange again with the same range used to
+download every event again.  Here the events of each
+(owner, calendar, timeMin, timeMax) are kept together with the
+Calendar API's nextSyncToken.  Within 'ttl' seconds of the last
+fetch they are served straight from the cache; after that only the
+changes since the last fetch are requested (syncToken), and merged
+into the cached list.  If Google no longer accepts the token (410
+Gone) we fall back to a full fetch.
+
+Two backends: MemoryBackend (per process, LRU bounded) and
+MongoBackend (a collection shared by all workers, expired by a
+Mongo TTL index).
+"""
+
+import collections
+import datetime
+import time
+
+import freetime
+import timeparse
+from lru import LRUCache
+
+DEFAULT_TTL = 60            # seconds before we ask Google for changes
+DEFAULT_EXPIRE = 24 * 3600  # seconds before an entry is dropped
+DEFAULT_SIZE = 256          # entries kept by MemoryBackend
+PAGE_SIZE = 2500
+
+
+class MemoryBackend:
+    """In-process LRU of at most 'size' entries"""
+
+    def __init__(self, size=DEFAULT_SIZE, expire=DEFAULT_EXPIRE):
+        self.size = size
+        self.expire = expire
+        self._entries = LRUCache(size)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry["fetched"] > self.expire:
+            self._entries.pop(key)
+            return None
+        return entry
+
+    def put(self, key, entry):
+        self._entries.put(key, entry)
+
+
+class MongoBackend:
+    """
+    Entries as documents of a Mongo collection, so all workers share
+    them.  A TTL index on 'stored' removes entries after 'expire'
+    seconds.
+    """
+
+    def __init__(self, collection, expire=DEFAULT_EXPIRE):
+        self.collection = collection
+        self.expire = expire
+        self._indexed = False
+
+    def _ensure_index(self):
+        # Not in __init__, so that constructing this doesn't connect
+        if not self._indexed:
+            self.collection.create_index("stored",
+                                         expireAfterSeconds=self.expire)
+            self._indexed = True
+
+    def get(self, key):
+        self._ensure_index()
+        return self.collection.find_one({"_id": key})
+
+    def put(self, key, entry):
+        self._ensure_index()
+        document = dict(entry, stored=datetime.datetime.utcnow())
+        self.collection.replace_one({"_id": key}, document, upsert=True)
+
+
+class EventCache:
+    """Events of a calendar and window, refreshed incrementally"""
+
+    def __init__(self, backend, ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    def items(self, service, cal_id, time_min, time_max, owner=None):
+        """
+        Event items of one calendar in [time_min, time_max), in start
+        time order, like calendar_fetch.list_items.  'owner' keeps
+        apart users who see the same calendar differently.
+        """
+        key = "|".join([ owner or "", cal_id, time_min, time_max ])
+        entry = self.backend.get(key)
+        now = time.time()
+        if entry and now - entry["fetched"] < self.ttl:
+            return entry["items"]
+        window = (to_minutes(time_min), to_minutes(time_max))
+        items = None
+        if entry and entry.get("syncToken"):
+            # Loaded by the service already; not at app startup
+            from googleapiclient.errors import HttpError
+            try:
+                items, token = sync_items(service, cal_id, entry, window)
+            except HttpError as err:
+                if err.resp.status != 410:
+                    raise
+        if items is None:
+            items, token = full_items(service, cal_id, time_min, time_max)
+        self.backend.put(key, { "items": items,
+                                "syncToken": token,
+                                "fetched": now })
+        return items
+
+
+def to_minutes(text):
+    return freetime.to_minutes(freetime.parse_datetime(text))
+
+
+def field_minutes(field):
+    """An event's 'start' or 'end' in epoch minutes"""
+    if "dateTime" in field:
+        return to_minutes(field["dateTime"])
+    return freetime.to_minutes(datetime.datetime.combine(
+        datetime.date.fromisoformat(field["date"]), datetime.time(0),
+        timeparse.local_tz()))
+
+
+def start_key(event):
+    """Sort key: the event's start in epoch minutes"""
+    return field_minutes(event["start"])
+
+
+def in_window(event, window):
+    return (field_minutes(event["start"]) < window[1] and
+            field_minutes(event["end"]) > window[0])
+
+
+def full_items(service, cal_id, time_min, time_max):
+    """
+    All items of the window plus the sync token for later changes.
+    orderBy is not allowed in a query that should yield a sync
+    token, so we sort here.
+    """
+    items = [ ]
+    page_token = None
+    while True:
+        event_list = service.events().list(
+            calendarId=cal_id,
+            singleEvents=True,
+            maxResults=PAGE_SIZE,
+            pageToken=page_token,
+            timeMin=time_min,
+            timeMax=time_max).execute()
+        items.extend(event_list.get("items", [ ]))
+        page_token = event_list.get("nextPageToken")
+        if not page_token:
+            items.sort(key=start_key)
+            return items, event_list.get("nextSyncToken")
+
+
+def sync_items(service, cal_id, entry, window):
+    """
+    The cached items with the changes since entry's sync token
+    applied, and the new sync token.  Changes are not limited to
+    our window (timeMin/timeMax can't be combined with syncToken),
+    so events that moved out of it are dropped here.
+    """
+    by_id = collections.OrderedDict(
+        (event["id"], event) for event in entry["items"])
+    page_token = None
+    while True:
+        event_list = service.events().list(
+            calendarId=cal_id,
+            singleEvents=True,
+            maxResults=PAGE_SIZE,
+            pageToken=page_token,
+            syncToken=entry["syncToken"]).execute()
+        for event in event_list.get("items", [ ]):
+            by_id.pop(event["id"], None)
+            if event.get("status") != "cancelled" and in_window(event, window):
+                by_id[event["id"]] = event
+        page_token = event_list.get("nextPageToken")
+        if not page_token:
+            items = sorted(by_id.values(), key=start_key)
+            return items, event_list.get("nextSyncToken")
+
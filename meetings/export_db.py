@@ -0,0 +1,40 @@
+"""
+Export a collection (meetings by default) as JSON-lines or BSON.
+
+    python3 export_db.py [--collection meetings] [--format jsonl|bson]
+                         [--batch-size 1000] [output file, or - for stdout]
+
+Documents are streamed from a cursor straight to the file, so memory
+does not grow with the collection.  Throughput is reported on stderr.
+Load the file again with import_db.py.
+"""
+
+import argparse
+import sys
+
+import bulk_io
+import config
+import database
+CONFIG = config.configuration(proxied=True)
+
+parser = argparse.ArgumentParser(description="Export a collection")
+parser.add_argument("output", nargs="?", default="-")
+parser.add_argument("--collection", default="meetings")
+parser.add_argument("--format", choices=bulk_io.FORMATS, default="jsonl")
+parser.add_argument("--batch-size", type=int, default=bulk_io.DEFAULT_BATCH)
+args = parser.parse_args()
+
+database.configure(CONFIG)
+try:
+    collection = database.get_db()[args.collection]
+    if args.output == "-":
+        bulk_io.export_collection(collection, sys.stdout.buffer, args.format,
+                                  batch_size=args.batch_size)
+    else:
+        with open(args.output, "wb") as out:
+            bulk_io.export_collection(collection, out, args.format,
+                                      batch_size=args.batch_size)
+except Exception as err:
+    print("Failed", file=sys.stderr)
+    print(err, file=sys.stderr)
+    sys.exit(1)
@@ -3,66 +3,240 @@ from flask import g
 from flask import render_template
 from flask import request
 from flask import url_for
-import uuid
+import functools
 import hashlib
-import sys
 import json
-import logging
-from datetime import datetime
+import threading
+from datetime import datetime, time, timedelta
+from werkzeug.http import is_resource_modified
 
 # Mongo database
-from pymongo import MongoClient
-from bson.objectid import ObjectId
+import database  # One lazily created client per worker process
 
 # Date handling 
-import arrow # Replacement for datetime, based on moment.js
-# import datetime # But we still need time
-from dateutil import tz  # For interpreting local times
+# arrow (a replacement for datetime, based on moment.js) is imported
+# by the humanize filter, the one place it is still used
+import timeparse  # Fast parsing/formatting, cached time zones
+import freetime  # Free/busy interval arithmetic
+import slot_grid  # Daily windows of a range, per DST-correct day, shared
+import intervals  # Compact epoch-minute interval lists
 
 
-# OAuth2  - Google library implementation for convenience
-from oauth2client import client
-import httplib2   # used in oauth2 flow
+# OAuth2  - Google library implementation for convenience; imported
+# where credentials are handled, on first use
 
 # Google API for services 
-from apiclient import discovery
+import calendar_fetch  # Parallel event listing across calendars
+import freebusy  # Busy times without event bodies
+import gcal_service  # Cached discovery document and service objects
+import event_cache  # Events kept between requests, synced incrementally
+import session_store  # Session values kept server-side
+import tracing  # Span timings, /metrics and sampled request traces
+import meeting_repo  # Indexed, projected meeting queries
+import page_cache  # Rendered meeting pages by version
+import meeting_slots  # Per-meeting availability counts
+import jobs  # Background meeting creation with progress polling
+import passwords  # Slow password hashes, computed in a bounded pool
+# calendar_async (aiohttp), profiling and http_pool are imported by
+# create_app, only when the settings that need them are on
 
 ###
 # Globals
 ###
-import config
-if __name__ == "__main__":
-    CONFIG = config.configuration()
-else:
-    CONFIG = config.configuration(proxied=True)
-
-MONGO_CLIENT_URL = "mongodb://{}:{}@{}:{}/{}".format(
-    CONFIG.DB_USER,
-    CONFIG.DB_USER_PW,
-    CONFIG.DB_HOST,
-    CONFIG.DB_PORT,
-    CONFIG.DB)
-
-
-print("Using URL '{}'".format(MONGO_CLIENT_URL))
+from config import configuration
 
 app = flask.Flask(__name__)
-app.debug=CONFIG.DEBUG
-app.logger.setLevel(logging.DEBUG)
-app.secret_key=CONFIG.SECRET_KEY
 
 SCOPES = 'https://www.googleapis.com/auth/calendar.readonly'
-CLIENT_SECRET_FILE = CONFIG.GOOGLE_KEY_FILE  ## You'll need this
 APPLICATION_NAME = 'MeetMe class project'
 
-try:
-    dbclient = MongoClient(MONGO_CLIENT_URL)
-    db = getattr(dbclient, CONFIG.DB)
-    collection = db.meetings
+# No database connection is made until a request needs one
+collection = database.LazyCollection("meetings")
+# Version of the meetings list, for ETags and the page cache
+COUNTERS = database.LazyCollection("counters")
 
-except:
-    print("Failure opening database.  Is Mongo running? Correct password?")
-    sys.exit(1)
+
+def create_app(config=None, preload=False):
+    """
+    The application, configured from 'config' (a namespace from
+    config.configuration(); read from the .ini files if None).
+    Importing this module only defines the routes; settings, caches
+    and hooks are set up here, once per process, or on the first
+    request if nothing has called this by then.  With preload, the
+    libraries that are otherwise imported on first use are imported
+    now, so that a gunicorn master started with --preload shares
+    them with its workers.  The Mongo client is still created by
+    each worker after the fork.
+    """
+    global CONFIG, CLIENT_SECRET_FILE, SERVICE_CACHE, PAGE_CACHE
+    global CALENDAR_WORKERS, CALENDAR_TIMEOUT, CALENDAR_BATCH
+    global ASYNC_CALENDAR, CALENDAR_API_URL
+    global PASSWORDS, PASSWORD_CACHE_TTL, EVENT_CACHE, JOBS, MEETING_SLOTS
+    if app.config.get("CREATED"):
+        return app
+    CONFIG = config or configuration(proxied=True)
+    print("Using URL '{}'".format(database.client_url(CONFIG)))
+
+    app.debug=CONFIG.DEBUG
+    log_level = getattr(CONFIG, "LOG_LEVEL",
+                        "DEBUG" if CONFIG.DEBUG else "INFO")
+    if isinstance(log_level, str):
+        log_level = log_level.strip().upper()
+    try:
+        app.logger.setLevel(log_level)
+    except (TypeError, ValueError):
+        raise ValueError("Unknown LOG_LEVEL {!r}".format(log_level))
+    app.secret_key=CONFIG.SECRET_KEY
+
+    CLIENT_SECRET_FILE = CONFIG.GOOGLE_KEY_FILE  ## You'll need this
+
+    # Parallel event fetching across calendars (1 = one at a time)
+    CALENDAR_WORKERS = getattr(CONFIG, "CALENDAR_WORKERS",
+                               calendar_fetch.DEFAULT_WORKERS)
+    CALENDAR_TIMEOUT = getattr(CONFIG, "CALENDAR_TIMEOUT",
+                               calendar_fetch.DEFAULT_TIMEOUT)
+    # List all calendars' events in one batch request instead (no cache)
+    CALENDAR_BATCH = getattr(CONFIG, "CALENDAR_BATCH", False)
+
+    SERVICE_CACHE = gcal_service.ServiceCache(
+        getattr(CONFIG, "SERVICE_CACHE_SIZE", gcal_service.DEFAULT_CACHE_SIZE))
+
+    # The client itself is created on first use in each worker process
+    database.configure(CONFIG)
+    PAGE_CACHE = page_cache.FragmentCache(
+        getattr(CONFIG, "PAGE_CACHE_SIZE", page_cache.DEFAULT_SIZE))
+    # Availability writes bump the meeting's version (meeting_repo.touch)
+    MEETING_SLOTS = meeting_slots.MeetingSlots(
+        database.LazyCollection("participants"),
+        database.LazyCollection("meeting_slots"),
+        timeparse.local_tz(), collection)
+
+    # Meeting passwords: scrypt or pbkdf2_sha256, hashed in a pool of
+    # PASSWORD_WORKERS threads; a meeting opened with its password stays
+    # open to the session for PASSWORD_CACHE_TTL seconds
+    PASSWORDS = passwords.PasswordHasher(
+        scheme=getattr(CONFIG, "PASSWORD_SCHEME", passwords.DEFAULT_SCHEME),
+        scrypt_n=getattr(CONFIG, "PASSWORD_SCRYPT_N", passwords.DEFAULT_SCRYPT_N),
+        iterations=getattr(CONFIG, "PASSWORD_ITERATIONS",
+                           passwords.DEFAULT_ITERATIONS),
+        workers=getattr(CONFIG, "PASSWORD_WORKERS", passwords.DEFAULT_WORKERS))
+    PASSWORD_CACHE_TTL = getattr(CONFIG, "PASSWORD_CACHE_TTL", 900)
+
+    # Events per (owner, calendar, time window): "memory", "mongo" or "off"
+    event_cache_backend = getattr(CONFIG, "EVENT_CACHE", "memory")
+    if event_cache_backend == "mongo":
+        EVENT_CACHE = event_cache.EventCache(
+            event_cache.MongoBackend(database.LazyCollection("event_cache")),
+            ttl=getattr(CONFIG, "EVENT_CACHE_TTL", event_cache.DEFAULT_TTL))
+    elif event_cache_backend == "memory":
+        EVENT_CACHE = event_cache.EventCache(
+            event_cache.MemoryBackend(
+                getattr(CONFIG, "EVENT_CACHE_SIZE", event_cache.DEFAULT_SIZE)),
+            ttl=getattr(CONFIG, "EVENT_CACHE_TTL", event_cache.DEFAULT_TTL))
+    else:
+        EVENT_CACHE = None
+
+    # Where session values live: "mongo", "memory" (one process only) or
+    # "cookie" (Flask's signed cookie); the first two keep only an id
+    # in the cookie
+    session_backend = getattr(CONFIG, "SESSION_STORE", "mongo")
+    session_ttl = getattr(CONFIG, "SESSION_TTL", session_store.DEFAULT_TTL)
+    if session_backend == "mongo":
+        app.session_interface = session_store.ServerSessionInterface(
+            session_store.MongoSessionStore(database.LazyCollection("sessions")),
+            ttl=session_ttl)
+    elif session_backend == "memory":
+        app.session_interface = session_store.ServerSessionInterface(
+            session_store.MemorySessionStore(), ttl=session_ttl)
+
+    # Meetings are created by background jobs, polled at /_job_status;
+    # "mongo" lets any worker answer the polls, "memory" only the one
+    # that took the request, "off" creates them within /setrange
+    jobs_backend = getattr(CONFIG, "JOBS", "mongo")
+    if jobs_backend == "mongo":
+        store = jobs.MongoJobStore(database.LazyCollection("jobs"),
+                                   stale=getattr(CONFIG, "JOB_STALE",
+                                                 jobs.DEFAULT_STALE))
+        JOBS = jobs.JobQueue(store, workers=getattr(CONFIG, "JOB_WORKERS",
+                                                    jobs.DEFAULT_WORKERS))
+    elif jobs_backend == "memory":
+        JOBS = jobs.JobQueue(jobs.MemoryJobStore(),
+                             workers=getattr(CONFIG, "JOB_WORKERS",
+                                             jobs.DEFAULT_WORKERS))
+    else:
+        JOBS = None
+
+    # Per-request span timings and /metrics; free when TRACING is off
+    if getattr(CONFIG, "TRACING", False):
+        import http_pool
+        tracing.init_app(app,
+                         sample_rate=float(getattr(CONFIG, "TRACE_SAMPLE_RATE", 0)),
+                         trace_file=getattr(CONFIG, "TRACE_FILE", None) or None)
+        tracing.METRICS.gauges.append(
+            lambda: { "mongo_pool_" + name: value
+                      for name, value in database.pool_stats().items() })
+        tracing.METRICS.gauges.append(
+            lambda: { "google_http_" + name: value
+                      for name, value in http_pool.POOL.stats().items() })
+
+    # Profiles of sampled requests, or of those sent with PROFILE_HEADER
+    # set to PROFILE_SECRET; nothing is hooked in when PROFILE is off
+    if getattr(CONFIG, "PROFILE", False):
+        import profiling
+        profiling.init_app(app,
+                           getattr(CONFIG, "PROFILE_DIR", "profiles"),
+                           sample_rate=float(getattr(CONFIG, "PROFILE_SAMPLE_RATE", 0)),
+                           header=getattr(CONFIG, "PROFILE_HEADER", "X-Profile") or None,
+                           secret=str(getattr(CONFIG, "PROFILE_SECRET", "") or "") or None,
+                           mode=getattr(CONFIG, "PROFILE_MODE", "sample"),
+                           max_files=int(getattr(CONFIG, "PROFILE_MAX_FILES",
+                                                 profiling.DEFAULT_MAX_FILES)))
+
+    # Serve /choose, /_add_Meeting and /setrange with async views that
+    # call the Calendar REST API with aiohttp (needs Flask[async])
+    ASYNC_CALENDAR = getattr(CONFIG, "ASYNC_CALENDAR", False)
+    if ASYNC_CALENDAR:
+        import calendar_async
+        CALENDAR_API_URL = getattr(CONFIG, "CALENDAR_API_URL",
+                                   calendar_async.API_URL)
+        app.view_functions["choose"] = choose_async
+        app.view_functions["addMemo"] = add_memo_async
+        if not JOBS:
+            # Otherwise /setrange makes no calendar calls itself
+            app.view_functions["setrange"] = setrange_async
+
+    if preload:
+        import arrow
+        import numpy
+        import oauth2client.client
+        gcal_service.preload()
+        if ASYNC_CALENDAR:
+            import aiohttp
+
+    app.config["CREATED"] = True
+    return app
+
+
+_create_lock = threading.Lock()
+
+
+def _create_on_first_request(wsgi_app):
+    """
+    Wrap the app's WSGI callable so that a server handed the bare
+    module-level app (gunicorn flask_main:app) configures it from
+    the .ini files on the first request, in each worker.
+    """
+    @functools.wraps(wsgi_app)
+    def created_wsgi_app(environ, start_response):
+        if not app.config.get("CREATED"):
+            with _create_lock:
+                create_app()
+            # Through whatever create_app wrapped around us
+            return app.wsgi_app(environ, start_response)
+        return wsgi_app(environ, start_response)
+    return created_wsgi_app
+
+app.wsgi_app = _create_on_first_request(app.wsgi_app)
 
 #############################
 #
@@ -74,8 +248,16 @@ except:
 @app.route("/index")
 def index():
   app.logger.debug("Index page entry")
-  g.memos = get_memos()
-  return flask.render_template('meeting.html')
+  before = request.args.get("before", type=str)
+
+  def render():
+      g.memos = get_memos(before)
+      if len(g.memos) == meeting_repo.PAGE_SIZE:
+          g.older = str(g.memos[-1]["_id"])
+      return flask.render_template('meeting.html')
+
+  version, modified = meeting_repo.list_version(COUNTERS)
+  return cached_page("index", before or "", version, modified, render)
 
 @app.route("/choose")
 def choose():
@@ -91,7 +273,7 @@ def choose():
 
     gcal_service = get_gcal_service(credentials)
     app.logger.debug("Returned from get_gcal_service")
-    flask.g.calendars = list_calendars(gcal_service)
+    flask.g.calendars = list_calendars(gcal_service, credentials)
     return render_template('meeting.html')
 
 @app.route("/addMeeting")
@@ -107,19 +289,72 @@ def viewMeeting():
     # Will take user to a screen asking for the meeting id and password. if given correctly it will display that page
     # User will be able to comment(The same way we added memos) only after they add their availability
     app.logger.debug("View page entered")
-    app.logger.debug(flask.session['meeting'])
-    return flask.render_template('viewMeeting.html')
-
-@app.route("/_view_Meeting")
+    g.meeting = flask.session.get('meeting')
+    app.logger.debug(g.meeting)
+    if g.meeting is None:
+        flask.abort(404)
+
+    def render():
+        g.grid = slot_grid.for_meeting(g.meeting, timeparse.local_tz())
+        g.best_times = [ ]
+        for index, count in MEETING_SLOTS.best_slots(g.meeting):
+            start, end = g.grid.slot_span(index)
+            g.best_times.append({ "start": start.strftime("%m/%d %H:%M"),
+                                  "end": end.strftime("%H:%M"),
+                                  "count": count })
+        return flask.render_template('viewMeeting.html')
+
+    current = meeting_repo.version(collection, g.meeting["_id"])
+    if current is None:
+        # Deleted since it was chosen; show what we have
+        return render()
+    version, modified = current
+    if version != g.meeting.get("version", 0):
+        g.meeting = flask.session['meeting'] = meeting_repo.get(
+            collection, g.meeting["_id"], { "pw": 0 })
+    return cached_page("meeting", str(g.meeting["_id"]), version, modified,
+                       render)
+
+@app.route("/_view_Meeting", methods=["POST"])
 def _viewMeeting():
     # Will take user to a screen asking for the meeting id and password. if given correctly it will display that page
     # User will be able to comment(The same way we added memos) only after they add their availability
+    # The password comes in the body, never in the URL
     id = request.form.get("id", type=str)
-    for i in collection.find({"_id": ObjectId("5a2219b389d50f720c913979")}):
-        flask.session['meeting'] = i
+    record = meeting_repo.get(collection, id)
+    if record is None:
+        return flask.jsonify(error="No such meeting"), 404
+    if not meeting_unlocked(record, request.form.get("pw", "", type=str)):
+        return flask.jsonify(error="Wrong password"), 403
+    record.pop("pw", None)
+    flask.session['meeting'] = record
     app.logger.debug(flask.session['meeting'])
     app.logger.debug("_View page entered")
-    return 'Done'
+    return flask.jsonify(result="Done")
+
+
+def meeting_unlocked(record, password):
+    """
+    Whether this session may open the meeting 'record': it gave the
+    right password now, or within the last PASSWORD_CACHE_TTL
+    seconds.  A legacy hash that matches is replaced by one of the
+    current scheme.
+    """
+    meeting_id = str(record["_id"])
+    now = datetime.utcnow().timestamp()
+    unlocked = { id: until for id, until
+                 in flask.session.get("unlocked", { }).items() if until > now }
+    if meeting_id in unlocked:
+        return True
+    stored = record.get("pw")
+    if not check_password(stored, password):
+        return False
+    if PASSWORDS.needs_upgrade(stored):
+        meeting_repo.set_password(collection, meeting_id, stored,
+                                  hash_password(password))
+    unlocked[meeting_id] = now + PASSWORD_CACHE_TTL
+    flask.session["unlocked"] = unlocked
+    return True
 
 @app.route("/_add_Meeting")
 def addMemo():
@@ -131,43 +366,135 @@ def addMemo():
 
     gcal_service = get_gcal_service(credentials)
     app.logger.debug("Returned from get_gcal_service")
-    flask.g.calendars = list_calendars(gcal_service)
+    # Only busy times are stored with the meeting, not event titles
+    busy_free_time(gcal_service)
+    record = save_meeting()
+    return flask.jsonify(result="Done", meeting=str(record["_id"]))
+
+
+def save_meeting():
+    """
+    Insert a meeting for the request's form with the free times
+    busy_free_time left in the session.
+    """
+    return insert_meeting(meeting_form(), flask.session["freeTime"], g.owner)
 
+
+def meeting_form():
+    """
+    What a new meeting needs from the request and the session,
+    as plain values that can be handed to a background job.
+    """
     app.logger.debug("Got a JSON request")
-    title = request.form.get("title", type=str)
-    pw = request.form.get("pw", type=str)
-    comment = request.args.get("comment", type=str)
-
-    record = {"name": title,
-              'pw': hash_password(pw),
-              "comments" : [ comment ],
-              "dateRange" : [ arrow.get(flask.session['begin_date']).format("YYYY-MM-DD"),
-                              arrow.get(flask.session['end_date']).format("YYYY-MM-DD") ],
-              "timeRange" : [ arrow.get(flask.session['begin_time']).format("HH:mm"),
-                              arrow.get(flask.session['end_time']).format("HH:mm") ],
-              "freeTime" : flask.session["freeTime"]
+    return { "title": request.form.get("title", type=str),
+             "pw": request.form.get("pw", type=str),
+             "comment": request.args.get("comment", type=str),
+             "dateRange": [ timeparse.format(flask.session['begin_date'], "YYYY-MM-DD"),
+                            timeparse.format(flask.session['end_date'], "YYYY-MM-DD") ],
+             "timeRange": [ session_time("begin_time").strftime("%H:%M"),
+                            session_time("end_time").strftime("%H:%M") ] }
+
+
+def insert_meeting(form, free_time, owner):
+    """Insert the meeting for meeting_form() values; returns the record"""
+    record = {"name": form["title"],
+              'pw': hash_password(form["pw"] or ""),
+              "comments" : [ form["comment"] ],
+              "dateRange" : form["dateRange"],
+              "timeRange" : form["timeRange"],
+              "freeTime" : free_time,
+              "owner" : owner
               }
-    print(record)
-    collection.insert(record)
+    app.logger.debug("Inserting meeting %s", form["title"])
+    meeting_repo.insert(collection, record)
+    MEETING_SLOTS.set_availability(
+        record, record["owner"] or "owner",
+        intervals.Intervals.from_document(record["freeTime"]))
+    meetings_changed(record["_id"])
+    return record
+
+
+def add_meeting_job(progress, credentials_json, time_min, time_max, form):
+    """
+    Background job for /setrange: free times and meeting insert,
+    from values captured in the request.
+    """
+    from oauth2client import client
+    credentials = client.OAuth2Credentials.from_json(credentials_json)
+    progress("Reading your calendars")
+    service = get_gcal_service(credentials, timeout=CALENDAR_TIMEOUT)
+    free, owner = freebusy_free_time(service, time_min, time_max)
+    progress("Saving the meeting")
+    record = insert_meeting(form, free.to_document(), owner)
+    return { "meeting": str(record["_id"]), "freeTime": record["freeTime"] }
+
+
+@app.route("/_job_status")
+def job_status():
+    """
+    State of a background job, for the page to poll.  When a job is
+    done its free times become the session's, as if the work had
+    been done within the request.
+    """
+    job = JOBS.status(request.args.get("id", type=str)) if JOBS else None
+    if job is None:
+        return flask.jsonify(state="unknown"), 404
+    if job["state"] == jobs.DONE and \
+       flask.session.get("job") == job["_id"]:
+        flask.session["freeTime"] = job["result"]["freeTime"]
+        flask.session.pop("job")
+    return flask.jsonify(state=job["state"], progress=job.get("progress"),
+                         error=job.get("error"))
 
 
 
 def hash_password(password):
-    # uuid is used to generate a random number
-    salt = uuid.uuid4().hex
-    return hashlib.sha256(salt.encode() + password.encode()).hexdigest() + ':' + salt
+    return PASSWORDS.hash(password)
 
 
 def check_password(hashed_password, user_password):
-    password, salt = hashed_password.split(':')
-    return password == hashlib.sha256(salt.encode() + user_password.encode()).hexdigest()
+    return PASSWORDS.verify(hashed_password, user_password)
 
 @app.route("/_delete")
 def _delete():
     app.logger.debug("Starting to delete")
     post = request.args.get("delete", type=str)
-    collection.remove({"_id": ObjectId(post)})
+    meeting_id = meeting_repo.object_id(post)
+    if meeting_id is None:
+        return "No such meeting", 404
+    meeting_repo.delete(collection, meeting_id)
+    MEETING_SLOTS.delete(meeting_id)
+    meetings_changed(post)
     return "Nothing"
+
+
+def meetings_changed(meeting_id):
+    """After a meeting was added or deleted: new list version"""
+    meeting_repo.list_changed(COUNTERS)
+    PAGE_CACHE.invalidate("index")
+    PAGE_CACHE.invalidate("meeting", str(meeting_id))
+
+
+def cached_page(kind, name, version, modified, render):
+    """
+    Response for a page that is the same for everyone as long as its
+    version is: 304 if the client's copy (ETag or Last-Modified) is
+    current, else the HTML from PAGE_CACHE, rendered only on a miss.
+    Clients are asked to revalidate on every use.
+    """
+    etag = "{}-{}-{}".format(kind, name, version)
+    if not is_resource_modified(request.environ, etag=etag,
+                                last_modified=modified):
+        response = flask.Response(status=304)
+    else:
+        response = flask.make_response(
+            PAGE_CACHE.render(kind, name, version, render))
+    response.set_etag(etag)
+    if modified:
+        response.last_modified = modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 ####
 #
 #  Google calendar authorization:
@@ -207,6 +534,7 @@ def valid_credentials():
     if 'credentials' not in flask.session:
       return None
 
+    from oauth2client import client
     credentials = client.OAuth2Credentials.from_json(
         flask.session['credentials'])
 
@@ -216,7 +544,7 @@ def valid_credentials():
     return credentials
 
 
-def get_gcal_service(credentials):
+def get_gcal_service(credentials, timeout=None):
   """
   We need a Google calendar 'service' object to obtain
   list of calendars, busy times, etc.  This requires
@@ -225,10 +553,13 @@ def get_gcal_service(credentials):
   control flow will be interrupted by authorization, and we'll
   end up redirected back to /choose *without a service object*.
   Then the second call will succeed without additional authorization.
+  The optional timeout (seconds) applies to each http request.
+  Service objects come from a cache, so the discovery document
+  is not fetched and parsed again on every request.
   """
   app.logger.debug("Entering get_gcal_service")
-  http_auth = credentials.authorize(httplib2.Http())
-  service = discovery.build('calendar', 'v3', http=http_auth)
+  with tracing.span("calendar"):
+      service = SERVICE_CACHE.get(credentials, timeout=timeout)
   app.logger.debug("Returning service")
   return service
 
@@ -242,6 +573,7 @@ def oauth2callback():
   and so on.
   """
   app.logger.debug("Entering oauth2callback")
+  from oauth2client import client
   flow =  client.flow_from_clientsecrets(
       CLIENT_SECRET_FILE,
       scope= SCOPES,
@@ -291,6 +623,32 @@ def setrange():
     widget.
     """
     app.logger.debug("Entering setrange")  
+    set_range()
+    if JOBS:
+        credentials = valid_credentials()
+        if not credentials:
+          app.logger.debug("Redirecting to authorization")
+          return flask.redirect(flask.url_for('oauth2callback'))
+        time_min, time_max = query_window()
+        form = meeting_form()
+        # The same user creating the same meeting again joins the job
+        key = hashlib.sha256(json.dumps(
+            [ credentials.client_id, credentials.refresh_token
+              or credentials.access_token, time_min, time_max,
+              form["title"] ]).encode()).hexdigest()
+        g.job = JOBS.submit(key, add_meeting_job, credentials.to_json(),
+                            time_min, time_max, form)
+        flask.session["job"] = g.job
+        return flask.render_template('meeting.html')
+    response = addMemo()
+    if response.status_code != 200:
+        return response   # Off to authorization
+    return flask.render_template('meeting.html')
+    #return flask.redirect(flask.url_for("choose"))
+
+
+def set_range():
+    """Date and time range from the setrange form into the session"""
     flask.flash("Setrange gave us '{}'".format(
       request.form.get('daterange')))
     daterange = request.form.get('daterange')
@@ -304,14 +662,9 @@ def setrange():
     flask.session["end_time"] = interpret_time(end)
     flask.session["start"] = start
     flask.session["end"] = end
-    app.logger.debug("Setrange parsed {} - {}  dates as {} - {}".format(
+    app.logger.debug("Setrange parsed %s - %s  dates as %s - %s",
       daterange_parts[0], daterange_parts[1], 
-      flask.session['begin_date'], flask.session['end_date']))
-
-
-    addMemo()
-    return flask.render_template('meeting.html')
-    #return flask.redirect(flask.url_for("choose"))
+      flask.session['begin_date'], flask.session['end_date'])
 
 ####
 #
@@ -325,44 +678,50 @@ def init_session_values():
     Note this must be run in app context ... can't call from main. 
     """
     # Default date span = tomorrow to 1 week from now
-    now = arrow.now('local')     # We really should be using tz from browser
-    tomorrow = now.replace(days=+1)
-    nextweek = now.replace(days=+7)
-    flask.session["begin_date"] = tomorrow.floor('day').isoformat()
-    flask.session["end_date"] = nextweek.ceil('day').isoformat()
+    local = timeparse.local_tz()  # We really should be using tz from browser
+    today = datetime.now(local).date()
+    tomorrow = today + timedelta(days=1)
+    nextweek = today + timedelta(days=7)
+    flask.session["begin_date"] = datetime.combine(
+        tomorrow, time.min, local).isoformat()
+    flask.session["end_date"] = datetime.combine(
+        nextweek, time.max, local).isoformat()
     flask.session["daterange"] = "{} - {}".format(
-        tomorrow.format("MM/DD/YYYY"),
-        nextweek.format("MM/DD/YYYY"))
+        timeparse.format(tomorrow, "MM/DD/YYYY"),
+        timeparse.format(nextweek, "MM/DD/YYYY"))
     # Default time span each day, 8 to 5
 
 def interpret_time( text ):
     """
-    Read time in a human-compatible format and
-    interpret as ISO format with local timezone.
-    May throw exception if time can't be interpreted. In that
-    case it will also flash a message explaining accepted formats.
+    Read time in a human-compatible format and return it as "HH:MM".
+    It is a time of day, with no date or offset: it applies to every
+    day of the range, in whatever offset that day has (see
+    slot_grid).  May throw exception if time can't be interpreted.
+    In that case it will also flash a message explaining accepted
+    formats.
     """
-    app.logger.debug("Decoding time '{}'".format(text))
-    time_formats = ["ha", "h:mma",  "h:mm a", "H:mm"]
+    app.logger.debug("Decoding time '%s'", text)
     try: 
-        as_arrow = arrow.get(text, time_formats).replace(tzinfo=tz.tzlocal())
-        as_arrow = as_arrow.replace(year=2016) #HACK see below
+        # Accepts "ha", "h:mma", "h:mm a" and "H:mm"
+        as_time = timeparse.parse_time(text)
         app.logger.debug("Succeeded interpreting time")
     except:
         app.logger.debug("Failed to interpret time")
         flask.flash("Time '{}' didn't match accepted formats 13:30 or 1:30pm"
               .format(text))
         raise
-    return as_arrow.isoformat()
-    #HACK #Workaround
-    # isoformat() on raspberry Pi does not work for some dates
-    # far from now.  It will fail with an overflow from time stamp out
-    # of range while checking for daylight savings time.  Workaround is
-    # to force the date-time combination into the year 2016, which seems to
-    # get the timestamp into a reasonable range. This workaround should be
-    # removed when Arrow or Dateutil.tz is fixed.
-    # FIXME: Remove the workaround when arrow is fixed (but only after testing
-    # on raspberry Pi --- failure is likely due to 32-bit integers on that platform)
+    return as_time.strftime("%H:%M")
+
+
+def session_time(name):
+    """
+    The time of day stored under name by interpret_time; sessions
+    from before then hold it as a datetime in 2016.
+    """
+    text = flask.session[name]
+    if "T" in text:
+        return timeparse.parse_iso(text).time()
+    return time.fromisoformat(text)
 
 
 def interpret_date( text ):
@@ -371,19 +730,18 @@ def interpret_date( text ):
     with the local time zone.
     """
     try:
-      as_arrow = arrow.get(text, "MM/DD/YYYY").replace(
-          tzinfo=tz.tzlocal())
+      as_date = datetime.combine(timeparse.parse_date(text), time.min,
+                                 timeparse.local_tz())
     except:
         flask.flash("Date '{}' didn't fit expected format 12/31/2001")
         raise
-    return as_arrow.isoformat()
+    return as_date.isoformat()
 
 def next_day(isotext):
     """
     ISO date + 1 day (used in query to Google calendar)
     """
-    as_arrow = arrow.get(isotext)
-    return as_arrow.replace(days=+1).isoformat()
+    return (timeparse.parse_iso(isotext) + timedelta(days=1)).isoformat()
 
 ####
 #
@@ -391,16 +749,58 @@ def next_day(isotext):
 #
 ####
   
-def list_calendars(service):
+def list_calendars(service, credentials=None):
     """
     Given a google 'service' object, return a list of
     calendars.  Each calendar is represented by a dict.
     The returned list is sorted to have
     the primary calendar first, and selected (that is, displayed in
     Google Calendars web app) calendars before unselected calendars.
+    With CALENDAR_BATCH, events for all the calendars are fetched
+    in one batch request; otherwise, if credentials are given and
+    CALENDAR_WORKERS allows it, they are fetched in parallel.
     """
     app.logger.debug("Entering list_calendars")
-    calendar_list = service.calendarList().list().execute()["items"]
+    with tracing.span("calendar"):
+        calendar_list = service.calendarList().list().execute()["items"]
+    tracing.note("Listing events of %d calendars", len(calendar_list))
+    time_min, time_max = query_window()
+    owner = primary_id(calendar_list)
+    if CALENDAR_BATCH:
+        with tracing.span("calendar"):
+            fetched = calendar_fetch.fetch_batched(
+                service, [ cal["id"] for cal in calendar_list ],
+                time_min, time_max)
+    elif credentials and CALENDAR_WORKERS > 1:
+        if EVENT_CACHE:
+            lister = functools.partial(EVENT_CACHE.items, owner=owner)
+        else:
+            lister = calendar_fetch.list_items
+        with tracing.span("calendar"):
+            fetched = calendar_fetch.fetch_all(
+                [ cal["id"] for cal in calendar_list ],
+                lambda: get_gcal_service(credentials, timeout=CALENDAR_TIMEOUT),
+                time_min, time_max,
+                max_workers=CALENDAR_WORKERS, timeout=CALENDAR_TIMEOUT,
+                lister=lister)
+    else:
+        fetched = None
+
+    def events_of(cal_id):
+        if fetched is None:
+            return list_events(service, cal_id, owner)
+        with tracing.span("freetime"):
+            return get_next_free_time(time_min, time_max,
+                                      {'items': fetched[cal_id]})
+
+    return calendar_entries(calendar_list, events_of)
+
+
+def calendar_entries(calendar_list, events_of):
+    """
+    The calendars of calendar_list as dicts for the template, in
+    cal_sort_key order, with events_of(cal_id) as their events.
+    """
     result = [ ]
     for cal in calendar_list:
         kind = cal["kind"]
@@ -415,7 +815,7 @@ def list_calendars(service):
         # Optional binary attributes with False as default
         selected = ("selected" in cal) and cal["selected"]
         primary = ("primary" in cal) and cal["primary"]
-        events = list_events(service, cal_id)
+        events = events_of(cal_id)
 
         result.append(
           { "kind": kind,
@@ -429,112 +829,146 @@ def list_calendars(service):
     return sorted(result, key=cal_sort_key)
 
 
-def list_events(service, cal_id):
-    page_token = None
-    begin = flask.session["begin_date"]
-    end = flask.session["end_date"]
-    beginTime = flask.session["begin_time"]
-    endTime = flask.session["end_time"]
-    min = arrow.get(begin).format('YYYY-MM-DD') + "T" + arrow.get(beginTime).format("HH:mm:ssZZ")
-    #The reason I shifted 1 second here is because the max in non inclusive so I moved the time up to include the end
-    #Time
-    max = arrow.get(end).format('YYYY-MM-DD') + "T" + arrow.get(endTime).shift(seconds=+1).format("HH:mm:ssZZ")
-    freeStart = min
-    freeEnd = max
-    while True:
-        event_list = service.events().list(
-                                            calendarId=cal_id,
-                                            singleEvents=True,
-                                            orderBy='startTime',
-                                            pageToken=page_token,
-                                            timeMin=min,
-                                            timeMax=max).execute()
-
-        result = get_next_free_time(min, max, event_list)
-
-        page_token = event_list.get('nextPageToken')
-        if not page_token:
-            break
-
-    return result
+def primary_id(calendar_list):
+    """
+    The primary calendar's id, which is the user's address,
+    or None if there is no primary calendar in the list.
+    """
+    return next((cal["id"] for cal in calendar_list if cal.get("primary")),
+                None)
+
+
+def session_grid():
+    """The SlotGrid of the date and time range in the session"""
+    return slot_grid.grid(
+        timeparse.parse_iso(flask.session["begin_date"]).date(),
+        timeparse.parse_iso(flask.session["end_date"]).date(),
+        session_time("begin_time"), session_time("end_time"),
+        timeparse.local_tz())
+
+
+def query_window():
+    """
+    timeMin and timeMax for the Google calendar query, from the
+    date and time range in the session.  Each end has the offset of
+    its own day, and timeMax is a second past the end time since
+    Google's is not inclusive.
+    """
+    grid = session_grid()
+    return grid.time_min, grid.time_max
+
+
+def list_events(service, cal_id, owner=None):
+    """
+    Events and free times of one calendar for the session's range.
+    Events come from the event cache if there is one; otherwise they
+    are streamed page by page into the free-time sweep rather than
+    downloaded up front.
+    """
+    min, max = query_window()
+    if EVENT_CACHE:
+        with tracing.span("calendar"):
+            items = EVENT_CACHE.items(service, cal_id, min, max, owner=owner)
+    else:
+        items = calendar_fetch.iter_items(service, cal_id, min, max)
+    with tracing.span("freetime"):
+        return get_next_free_time(min, max, {'items': items})
 
 
 def get_next_free_time(start, end, event_list):
-    # This is probably the worst possible way to do this but I really struggled to get this project finished
-    # This ends up working but only because there are so many conditionals. Definitely not ideal but ill work
-    # with it for now. If you could give me some pointers when you read over this that would be great!!
-    # I annotated this as much as possible so there isnt much confusion on whats going on.
-    start = arrow.get(start)
-    end = arrow.get(end).shift(days=+1)
-    relStart = start
-    relEnd = arrow.get(arrow.get(start).format('YYYY-MM-DD') + "T" + arrow.get(end).format("HH:mm:ssZZ"))
-    result = []
-    dailyFreeTime = []
-    freeTime = []
-
-    for event in event_list['items']:
-        print(relStart.format('MM/DD HH:mm'), relEnd.format('MM/DD HH:mm'))
-        print(event['summary'], event['start'], event['end'])
-        if 'dateTime' not in event['start']:
-            print("skipping")
-            continue
-        eventStart = arrow.get(event['start']['dateTime'])
-        eventEnd = arrow.get(event['end']['dateTime'])
-        if (relStart.format('YYYY-MM-DD')) <= (eventStart.format('YYYY-MM-DD')):
-            print(1)
-            # If the relative day is not the same and the event day
-            while(relStart.format('YYYY-MM-DD') < (eventStart.format('YYYY-MM-DD'))):
-                print(relStart.format('HH:mm'), end.format('HH:mm'))
-                if relStart.format('HH:mm') < end.format('HH:mm'):
-                    print(2)
-                    # If the relative start time is before the end the time the user give
-                    result.append(addFreeTime(relStart.format('MM/DD HH:mm'), end.format('HH:mm')))
-                    dailyFreeTime.append((relStart.format("HH:mm"), end.format('HH:mm')))
-                freeTime.append(dailyFreeTime)
-                print(dailyFreeTime)
-                dailyFreeTime = []
-                start = start.shift(days=+1)
-                relStart = start
-                relEnd = relEnd.shift(days=+1)
-                print(relStart.format('MM/DD HH:mm'), relEnd.format('MM/DD HH:mm'))
-        if relStart.format('HH:mm') < relEnd.format('HH:mm'):
-            print(3)
-            # If the relative start time is before the end time
-            if relStart.isoformat() < eventStart.isoformat():
-                print(4)
-                if eventStart.isoformat() < relEnd.isoformat():
-                    print(5)
-                    # If the relative start time is before the event start
-                    result.append(addFreeTime(relStart.format('MM/DD HH:mm'), eventStart.format('HH:mm')))
-                    dailyFreeTime.append(relStart.format("HH:mm"), eventStart.format('HH:mm'))
-                else:
-                    print(6)
-                    result.append(addFreeTime(relStart.format('MM/DD HH:mm'), relEnd.format('HH:mm')))
-                    dailyFreeTime.append((relStart.format("HH:mm"), relEnd.format('HH:mm')))
-            elif eventEnd.isoformat() < start.isoformat():
-                print(7)
-                # If the event ends before the user given start we dont care
-                continue
-            if eventEnd.format('HH:mm') < relEnd.format('HH:mm'):
-                print(8)
-                # If the event ends at the same time or before the user given end time
-                relStart = eventEnd
-            else:
-                print(9)
-                # The time ends after the user given end time
-                relStart = relEnd
-
-        event['readStart'] = arrow.get(event['start']['dateTime']).format("MM/DD HH:mm")
-        event['readEnd'] = arrow.get(event['end']['dateTime']).format("HH:mm")
-        if "transparency" not in event:
-            result.append(event)
-        print(relStart.format('MM/DD HH:mm'), relEnd.format('MM/DD HH:mm'))
-
-    print(freeTime)
-    flask.session["freeTime"] = freeTime
-    return result
+    """
+    Free times between the daily start and end times of each day
+    from start to end (ISO strings, as built in query_window), given
+    Google calendar events in start time order.  event_list['items']
+    may be a lazy iterator; it is consumed once, by a streaming sweep
+    in the freetime engine that works on epoch minutes.  Stores the
+    free times in the session as an Intervals document and returns
+    the busy events interleaved with 'Free time' entries, in time
+    order, for display.
+    """
+    local = timeparse.local_tz()
+    windows = free_time_windows(start, end)
+    shown = [ ]
+
+    def busy(events):
+        # Pick out events for display as they stream past
+        for event in events:
+            if 'dateTime' in event['start'] and "transparency" not in event:
+                eventStart = freetime.parse_datetime(event['start']['dateTime'])
+                eventEnd = freetime.parse_datetime(event['end']['dateTime'])
+                # A copy: the event may be the event cache's own
+                shown.append((freetime.to_minutes(eventStart), dict(
+                    event, readStart=eventStart.strftime("%m/%d %H:%M"),
+                    readEnd=eventEnd.strftime("%H:%M"))))
+            yield event
+
+    free = intervals.Intervals()
+    busy_times = freetime.stream_intervals(busy(event_list['items']), local)
+    for day, freeStart, freeEnd in freetime.stream_free(windows, busy_times):
+        free.append(freeStart, freeEnd)
+        shown.append((freeStart, addFreeTime(
+            freetime.from_minutes(freeStart, local).strftime("%m/%d %H:%M"),
+            freetime.from_minutes(freeEnd, local).strftime("%H:%M"))))
+    shown.sort(key=lambda entry: entry[0])
+
+    flask.session["freeTime"] = free.to_document()
+    return [ entry for _, entry in shown ]
+
+
+def free_time_windows(start, end):
+    """
+    Daily windows (epoch minutes) between the time of day of start
+    and of end, for each day from start to end, as ISO strings built
+    by query_window; from the shared grid of that range.
+    """
+    return slot_grid.for_window(start, end, timeparse.local_tz()).windows
+
+
+def busy_free_time(service):
+    """
+    Free times (Intervals) for the session's date and time range
+    across the user's selected calendars, using a single freebusy
+    query instead of listing every event.  Also stored in the session.
+    """
+    time_min, time_max = query_window()
+    free, flask.g.owner = freebusy_free_time(service, time_min, time_max)
+    flask.session["freeTime"] = free.to_document()
+    return free
+
+
+def freebusy_free_time(service, time_min, time_max):
+    """
+    (free times, primary calendar id) for the selected calendars
+    between time_min and time_max; needs no request.
+    """
+    with tracing.span("calendar"):
+        calendar_list = service.calendarList().list().execute()["items"]
+        cal_ids = [ cal["id"] for cal in calendar_list if cal.get("selected") ]
+        responses = freebusy.query(service, cal_ids, time_min, time_max)
+    return (free_from_freebusy(responses, time_min, time_max),
+            primary_id(calendar_list))
+
+
+def store_free_time(responses, time_min, time_max):
+    """
+    Free times (Intervals) in the window of query_window given the
+    freebusy responses for it; also stored in the session.
+    """
+    free = free_from_freebusy(responses, time_min, time_max)
+    flask.session["freeTime"] = free.to_document()
+    return free
 
 
+def free_from_freebusy(responses, time_min, time_max):
+    """Free times (Intervals) left by freebusy responses"""
+    with tracing.span("freetime"):
+        busy = freebusy.busy_intervals(responses)
+        return intervals.Intervals(
+            interval
+            for daily in freetime.subtract(
+                free_time_windows(time_min, time_max), busy)
+            for interval in daily)
+
 
 def addFreeTime(start, end):
     return(
@@ -561,17 +995,89 @@ def cal_sort_key( cal ):
        primary_key = "X"
     return (primary_key, selected_key, cal["summary"])
 
-def get_memos():
+def get_memos(before=None):
     """
-    Returns all memos in the database, in a form that
-    can be inserted directly in the 'session' object.
+    Returns one page of meeting summaries, newest first, in a form
+    that can be inserted directly in the 'session' object.  'before'
+    is the id of the last meeting of the previous page.  Free times
+    and comments are not loaded here.
     """
-    records = [ ]
-    for record in collection.find():
-        print(record['dateRange'])
-        print(record['timeRange'])
-        records.append(record)
-    return records
+    return meeting_repo.list_summaries(collection, before=before)
+
+####
+#
+#  Async calendar mode (ASYNC_CALENDAR): the Calendar-bound pages
+#  as coroutines.  The calendar list, every calendar's events and
+#  the freebusy queries go out over one aiohttp session and wait on
+#  the network together instead of each holding a thread.  Events
+#  are not cached in this mode.
+#
+####
+
+def calendar_client(credentials):
+    import calendar_async
+    return calendar_async.CalendarClient(credentials.access_token,
+                                         base_url=CALENDAR_API_URL,
+                                         timeout=CALENDAR_TIMEOUT)
+
+
+async def list_calendars_async(credentials):
+    """list_calendars, with all calendars' events fetched at once"""
+    time_min, time_max = query_window()
+    async with calendar_client(credentials) as cal:
+        with tracing.span("calendar"):
+            calendar_list = await cal.calendar_list()
+            fetched = await cal.events_for(
+                [ entry["id"] for entry in calendar_list ],
+                time_min, time_max)
+
+    def events_of(cal_id):
+        with tracing.span("freetime"):
+            return get_next_free_time(time_min, time_max,
+                                      {'items': fetched[cal_id]})
+
+    return calendar_entries(calendar_list, events_of)
+
+
+async def busy_free_time_async(credentials):
+    """busy_free_time over the REST API"""
+    time_min, time_max = query_window()
+    async with calendar_client(credentials) as cal:
+        with tracing.span("calendar"):
+            calendar_list = await cal.calendar_list()
+            cal_ids = [ entry["id"] for entry in calendar_list
+                        if entry.get("selected") ]
+            flask.g.owner = primary_id(calendar_list)
+            responses = await cal.freebusy(cal_ids, time_min, time_max)
+    return store_free_time(responses, time_min, time_max)
+
+
+async def choose_async():
+    credentials = valid_credentials()
+    if not credentials:
+      app.logger.debug("Redirecting to authorization")
+      return flask.redirect(flask.url_for('oauth2callback'))
+    flask.g.calendars = await list_calendars_async(credentials)
+    return render_template('meeting.html')
+
+
+async def add_memo_async():
+    credentials = valid_credentials()
+    if not credentials:
+      app.logger.debug("Redirecting to authorization")
+      return flask.redirect(flask.url_for('oauth2callback'))
+    await busy_free_time_async(credentials)
+    record = save_meeting()
+    return flask.jsonify(result="Done", meeting=str(record["_id"]))
+
+
+async def setrange_async():
+    set_range()
+    response = await add_memo_async()
+    if response.status_code != 200:
+        return response   # Off to authorization
+    return flask.render_template('meeting.html')
+
 
 @app.template_filter( 'humanize' )
 def humanize_arrow_date( date ):
@@ -587,16 +1093,19 @@ def humanize_arrow_date( date ):
     temporarily.
     """
     try:
-        then = arrow.get(date).to('local')
-        now = arrow.utcnow().to('local')
-        if then.date() == arrow.get(arrow.now().shift(days=-1).isoformat()).date():
+        then = timeparse.as_local(date)
+        now = datetime.now(timeparse.local_tz())
+        today = now.date()
+        if then.date() == today - timedelta(days=1):
             human = "Today"
-        elif then.date() == arrow.get(arrow.now().isoformat()).date():
+        elif then.date() == today:
             human = "Tomorrow"
-        elif then.date() == arrow.get(arrow.now().isoformat()).shift(days=-2).date():
+        elif then.date() == today - timedelta(days=2):
             human = "Yesterday"
         else:
-            human = then.humanize(now)
+            # arrow only for the wording
+            import arrow
+            human = arrow.get(then).humanize(now)
     except:
         human = date
     return human
@@ -613,16 +1122,27 @@ def humanize_arrow_date( date ):
 @app.template_filter( 'fmtdate' )
 def format_arrow_date( date ):
     try: 
-        normal = arrow.get( date )
-        return normal.format("ddd MM/DD/YYYY")
+        return timeparse.format( date, "ddd MM/DD/YYYY" )
     except:
         return "(bad date)"
 
+@app.template_filter( 'freetimes' )
+def format_meeting_free_times( meeting ):
+    """
+    A meeting's free times as 'MM/DD HH:mm-HH:mm' strings; the
+    only place they are turned into text.
+    """
+    try:
+        free = intervals.Intervals.from_document(
+            meeting.get("freeTime"), meeting["dateRange"][0], timeparse.local_tz())
+        return free.format(timeparse.local_tz())
+    except:
+        return [ "(bad free times)" ]
+
 @app.template_filter( 'fmttime' )
 def format_arrow_time( time ):
     try:
-        normal = arrow.get( time )
-        return normal.format("HH:mm")
+        return timeparse.format( time, "HH:mm" )
     except:
         return "(bad time)"
     
@@ -630,8 +1150,8 @@ def format_arrow_time( time ):
 
 
 if __name__ == "__main__":
-  # App is created above so that it will
-  # exist whether this is 'main' or not
-  # (e.g., if we are running under green unicorn)
+  # Under gunicorn the app comes from create_app() instead, e.g.
+  #   gunicorn --preload "flask_main:create_app(preload=True)"
+  create_app(configuration())
   app.run(port=CONFIG.PORT,host="0.0.0.0")
     
@@ -0,0 +1,58 @@
+"""
+Busy times from the Google calendar freebusy endpoint.
+
+One freebusy().query call covers many calendars and returns only
+their busy intervals, not whole event bodies with summaries,
+attendees and descriptions.  That is all free-time computation
+needs; listing events (calendar_fetch) is still the way to go when
+event titles must be displayed.
+
+The responses are plain dicts, so a recorded response can be fed
+to busy_intervals directly for offline testing (see
+testdata/freebusy_response.json and test_freebusy.py).
+"""
+
+import logging
+
+import freetime
+
+log = logging.getLogger(__name__)
+
+# The API refuses queries for more calendars than this at once
+MAX_CALENDARS = 50
+
+
+def query(service, cal_ids, time_min, time_max):
+    """
+    Freebusy responses for the calendars in cal_ids between
+    time_min and time_max (RFC3339 strings).  Normally a single
+    request; more only if there are more than MAX_CALENDARS.
+    """
+    responses = [ ]
+    for i in range(0, len(cal_ids), MAX_CALENDARS):
+        body = { "timeMin": time_min,
+                 "timeMax": time_max,
+                 "items": [ { "id": cal_id }
+                            for cal_id in cal_ids[i:i + MAX_CALENDARS] ] }
+        responses.append(service.freebusy().query(body=body).execute())
+    return responses
+
+
+def busy_intervals(responses):
+    """
+    Merged busy intervals in epoch minutes across all calendars of
+    the given freebusy responses.  Calendars the API reports errors
+    for (e.g., no longer shared with us) are logged and skipped.
+    """
+    intervals = [ ]
+    for response in responses:
+        for cal_id, cal in response.get("calendars", { }).items():
+            if cal.get("errors"):
+                log.warning("Freebusy errors for {}: {}".format(
+                    cal_id, cal["errors"]))
+                continue
+            for busy in cal.get("busy", [ ]):
+                intervals.append(
+                    (freetime.to_minutes(freetime.parse_datetime(busy["start"])),
+                     freetime.to_minutes(freetime.parse_datetime(busy["end"]))))
+    return freetime.merge_intervals(intervals)
@@ -0,0 +1,191 @@
+"""
+Free/busy engine.
+
+Busy events are turned into integer intervals of epoch minutes,
+sorted and merged, and then subtracted from the daily time-of-day
+windows in one linear sweep.  Nothing is formatted as text here;
+callers collect the free intervals (see intervals.py) and format
+them when a page is rendered.  parse_free_times reads the older
+per-day form that meetings used to be stored in:
+
+    [ [ ("HH:mm", "HH:mm"), ... ],   # first day of the range
+      [ ... ],                       # second day
+      ... ]
+"""
+
+from datetime import datetime, date, time, timedelta
+
+import timeparse
+
+
+def to_minutes(dt):
+    """Aware datetime -> integer minutes since the epoch"""
+    return int(dt.timestamp()) // 60
+
+
+def from_minutes(minutes, tzinfo):
+    """Integer minutes since the epoch -> aware datetime in tzinfo"""
+    return datetime.fromtimestamp(minutes * 60, tzinfo)
+
+
+def parse_datetime(text):
+    """
+    RFC3339 text as returned by Google calendar (e.g.
+    2017-11-30T09:00:00-08:00 or 2017-11-30T17:00:00Z)
+    to an aware datetime.  Cached: the same times come back from
+    every page and every sync.
+    """
+    return timeparse.parse_iso(text)
+
+
+def event_interval(event, tzinfo):
+    """
+    (start, end) in epoch minutes for one Google calendar event,
+    or None if the event does not make us busy.  All-day events
+    ('date' rather than 'dateTime') run from local midnight of the
+    start date to local midnight of the (exclusive) end date, so
+    multi-day events of either kind are covered.
+    """
+    if event.get("transparency") == "transparent":
+        return None
+    start = event["start"]
+    end = event["end"]
+    if "dateTime" in start:
+        return (to_minutes(parse_datetime(start["dateTime"])),
+                to_minutes(parse_datetime(end["dateTime"])))
+    first = date.fromisoformat(start["date"])
+    last = date.fromisoformat(end["date"])
+    return (to_minutes(datetime.combine(first, time(0), tzinfo)),
+            to_minutes(datetime.combine(last, time(0), tzinfo)))
+
+
+def stream_intervals(events, tzinfo):
+    """
+    Busy intervals for an iterable of events, lazily, in the order
+    of the events (not merged).
+    """
+    for event in events:
+        interval = event_interval(event, tzinfo)
+        if interval and interval[0] < interval[1]:
+            yield interval
+
+
+def merge_intervals(intervals):
+    """
+    Sort intervals and merge the ones that overlap or touch.
+    Returns a new list of (start, end) tuples.
+    """
+    merged = [ ]
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def local_minutes(day, clock, tzinfo, fold=0):
+    """
+    Epoch minutes of the wall-clock time 'clock' on 'day' in tzinfo,
+    with that day's own UTC offset.  A time skipped when the clocks
+    go forward counts as that far past the change (02:30 is 03:30,
+    as in PEP 495); a time that happens twice when they go back is
+    the first occurrence, or the second with fold=1.
+    """
+    wall = datetime.combine(day, clock.replace(tzinfo=None, fold=fold), tzinfo)
+    # dateutil's tzlocal resolves skipped times backwards instead
+    if (datetime.fromtimestamp(wall.timestamp(), tzinfo).replace(tzinfo=None)
+            != wall.replace(tzinfo=None)):
+        # (aware arithmetic is wall-clock, so these are either side)
+        gap = ((wall + timedelta(hours=3)).utcoffset()
+               - (wall - timedelta(hours=3)).utcoffset())
+        wall = (wall.replace(tzinfo=None) + gap).replace(tzinfo=tzinfo)
+    return to_minutes(wall)
+
+
+def daily_windows(begin_date, end_date, begin_time, end_time, tzinfo):
+    """
+    One (start, end) window in epoch minutes for each day from
+    begin_date to end_date inclusive, between begin_time and
+    end_time of that day in the given time zone.  Each day uses its
+    own offset, so windows on either side of a daylight saving
+    change open at the same wall-clock time; a window that spans
+    the repeated hour when clocks go back keeps it.
+    """
+    windows = [ ]
+    day = begin_date
+    while day <= end_date:
+        windows.append(
+            (local_minutes(day, begin_time, tzinfo),
+             local_minutes(day, end_time, tzinfo, fold=1)))
+        day += timedelta(days=1)
+    return windows
+
+
+def stream_free(windows, busy):
+    """
+    Generator of (window index, start, end) free intervals, given
+    sorted daily windows and busy intervals sorted by start time
+    (overlaps allowed, as in Google's orderBy='startTime').  Busy
+    intervals are consumed one at a time and free time is yielded as
+    soon as it is settled, so the input can be a lazy stream of any
+    length and only the sweep position is kept in memory.
+    """
+    windows = enumerate(windows)
+    current = next(windows, None)
+    if current is None:
+        return
+    index, (win_start, win_end) = current
+    cursor = win_start
+    for start, end in busy:
+        # Windows that close before this busy interval starts are done
+        while start >= win_end:
+            if cursor < win_end:
+                yield (index, cursor, win_end)
+            current = next(windows, None)
+            if current is None:
+                return
+            index, (win_start, win_end) = current
+            cursor = max(cursor, win_start)
+        if start > cursor:
+            yield (index, cursor, start)
+        cursor = max(cursor, end)
+    while True:
+        if cursor < win_end:
+            yield (index, cursor, win_end)
+        current = next(windows, None)
+        if current is None:
+            return
+        index, (win_start, win_end) = current
+        cursor = max(cursor, win_start)
+
+
+def subtract(windows, busy):
+    """
+    Free intervals of each window once the busy intervals (sorted
+    by start) are removed, in one sweep.  Returns one list of
+    intervals per window.
+    """
+    free = [ [ ] for _ in windows ]
+    for index, start, end in stream_free(windows, busy):
+        free[index].append((start, end))
+    return free
+
+
+def parse_free_times(begin_date, free_times, tzinfo):
+    """
+    The old per-day 'freeTime' structure, whose first day is
+    begin_date, back to per-day lists of (start, end) intervals in
+    epoch minutes.
+    """
+    free = [ ]
+    day = begin_date
+    for daily in free_times:
+        free.append([ (to_minutes(datetime.combine(
+                           day, time.fromisoformat(start), tzinfo)),
+                       to_minutes(datetime.combine(
+                           day, time.fromisoformat(end), tzinfo)))
+                      for start, end in daily ])
+        day += timedelta(days=1)
+    return free
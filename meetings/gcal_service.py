@@ -0,0 +1,110 @@
+"""
+Cached Google calendar service objects.
+
+discovery.build fetches and parses the Calendar API discovery
+document every time it is called, which costs hundreds of
+milliseconds per request.  Here the parsed document is loaded once
+per process (from the copy bundled in discovery/, so this works
+offline, or fetched once if that copy is missing), and authorized
+service objects are kept in a small LRU cache keyed by access token.
+An entry is dropped when its token expires.
+
+Service objects are not thread-safe (they share one httplib2.Http),
+so each thread gets its own.  Their connections come from
+http_pool, so a new service on a thread reuses the sockets of the
+ones before it.
+
+The Google client library is imported on first use, since most
+pages never need it; preload() imports it and parses the document
+ahead of time (e.g. in a gunicorn master, before workers fork).
+"""
+
+import datetime
+import json
+import logging
+import os
+import threading
+
+from lru import LRUCache
+
+log = logging.getLogger(__name__)
+HERE = os.path.dirname(__file__)
+
+API = "calendar"
+VERSION = "v3"
+DISCOVERY_FILE = os.path.join(HERE, "discovery",
+                              "{}.{}.json".format(API, VERSION))
+DEFAULT_CACHE_SIZE = 64
+
+_document = None
+_document_lock = threading.Lock()
+
+
+def discovery_document():
+    """The parsed discovery document, loaded at most once per process"""
+    global _document
+    if _document is None:
+        with _document_lock:
+            if _document is None:
+                _document = load_document()
+    return _document
+
+
+def load_document(path=DISCOVERY_FILE):
+    """Parse the bundled discovery document, or fetch it if missing"""
+    if os.path.exists(path):
+        log.debug("Loading discovery document from {}".format(path))
+        with open(path) as f:
+            return json.load(f)
+    import httplib2
+    from apiclient import discovery
+    uri = discovery.DISCOVERY_URI.format(api=API, apiVersion=VERSION)
+    log.info("No {}; fetching discovery document from {}".format(path, uri))
+    resp, content = httplib2.Http().request(uri)
+    if resp.status >= 400:
+        raise RuntimeError("Discovery document fetch failed: {}".format(
+            resp.status))
+    return json.loads(content.decode("utf-8"))
+
+
+class ServiceCache:
+    """
+    LRU cache of authorized service objects, keyed by access token,
+    http timeout, and thread.  Entries whose token has expired are
+    never returned.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = size
+        self._entries = LRUCache(size)
+
+    def get(self, credentials, timeout=None):
+        """A service object for credentials, built only on a miss"""
+        key = (credentials.access_token, timeout, threading.get_ident())
+        entry = self._entries.get(key)
+        if entry:
+            service, expiry = entry
+            if expiry is None or expiry > datetime.datetime.utcnow():
+                return service
+            self._entries.pop(key)
+        service = build(credentials, timeout)
+        self._entries.put(key, (service, credentials.token_expiry))
+        return service
+
+    def clear(self):
+        self._entries.clear()
+
+
+def preload():
+    """Import the client library and parse the document now"""
+    import apiclient.discovery
+    import http_pool
+    discovery_document()
+
+
+def build(credentials, timeout=None):
+    """A new authorized service object from the cached document"""
+    from apiclient import discovery
+    import http_pool
+    http_auth = credentials.authorize(http_pool.POOL.http(timeout))
+    return discovery.build_from_document(discovery_document(), http=http_auth)
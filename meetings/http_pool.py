@@ -0,0 +1,105 @@
+"""
+Keep-alive connections for the Google API client.
+
+httplib2 keeps a connection open per host, but only inside one Http
+object, and we used to build a new Http for every service object:
+each new user, token or worker thread paid for a fresh TCP and TLS
+handshake with googleapis.com (and accounts.google.com, to refresh
+a token) before doing any work.
+
+PooledHttp objects are still made one per service object, since
+oauth2client's authorize() wraps the request method of the Http it
+is given, but their connections come from a per-thread, per-timeout
+table in a ConnectionPool.  Later services on the same thread reuse
+the open sockets.  httplib2 connections are not thread-safe, so
+threads (including calendar_fetch's workers) never share one.
+
+The pool counts requests, new connections and the time spent
+opening them (stats()), which the app reports at /metrics.
+"""
+
+import os
+import threading
+import time
+
+import httplib2
+
+
+class _Connections(dict):
+    """httplib2's host -> connection table, timing each connect"""
+
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+
+    def __setitem__(self, key, conn):
+        connect = conn.connect
+
+        def timed_connect(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return connect(*args, **kwargs)
+            finally:
+                self.pool._connected(time.perf_counter() - start)
+
+        conn.connect = timed_connect
+        super().__setitem__(key, conn)
+
+
+class PooledHttp(httplib2.Http):
+    """An Http whose connections live in (and stay in) a pool"""
+
+    def __init__(self, pool, timeout=None):
+        super().__init__(timeout=timeout)
+        self.pool = pool
+        self.connections = pool.connections(timeout)
+
+    def request(self, *args, **kwargs):
+        self.pool._requested()
+        return super().request(*args, **kwargs)
+
+    def close(self):
+        # The connections belong to the pool; only forget them here
+        self.connections = { }
+        super().close()
+
+
+class ConnectionPool:
+    """Per-thread connection tables shared by PooledHttp objects"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = { "requests": 0, "connects": 0, "connect_seconds": 0.0 }
+
+    def connections(self, timeout=None):
+        """This thread's connection table for the given timeout"""
+        local = self._local
+        # Sockets opened before a fork belong to the parent
+        if getattr(local, "pid", None) != os.getpid():
+            local.tables = { }
+            local.pid = os.getpid()
+        table = local.tables.get(timeout)
+        if table is None:
+            table = local.tables[timeout] = _Connections(self)
+        return table
+
+    def http(self, timeout=None):
+        return PooledHttp(self, timeout)
+
+    def _requested(self):
+        with self._lock:
+            self._stats["requests"] += 1
+
+    def _connected(self, seconds):
+        with self._lock:
+            self._stats["connects"] += 1
+            self._stats["connect_seconds"] += seconds
+
+    def stats(self):
+        """Requests made, connections opened and seconds spent opening"""
+        with self._lock:
+            return dict(self._stats)
+
+
+POOL = ConnectionPool()
@@ -0,0 +1,52 @@
+"""
+Import a JSON-lines or BSON file written by export_db.py (or
+mongodump, for BSON) into a collection, meetings by default.
+
+    python3 import_db.py [--collection meetings] [--format jsonl|bson]
+                         [--batch-size 1000] [--upsert] [input file, or -]
+
+Documents are sent in unordered batches; those whose _id is already
+in the collection are skipped, or replaced with --upsert.
+Throughput is reported on stderr.  Importing meetings bumps the
+meetings list version so cached pages are refreshed; the
+availability counts of imported meetings come with the participants
+and meeting_slots collections (import those too, or rebuild them
+with rebuild_slots.py).
+"""
+
+import argparse
+import sys
+
+import bulk_io
+import config
+import database
+import meeting_repo
+CONFIG = config.configuration(proxied=True)
+
+parser = argparse.ArgumentParser(description="Import a collection")
+parser.add_argument("input", nargs="?", default="-")
+parser.add_argument("--collection", default="meetings")
+parser.add_argument("--format", choices=bulk_io.FORMATS, default="jsonl")
+parser.add_argument("--batch-size", type=int, default=bulk_io.DEFAULT_BATCH)
+parser.add_argument("--upsert", action="store_true",
+                    help="replace documents that are already there")
+args = parser.parse_args()
+
+database.configure(CONFIG)
+try:
+    db = database.get_db()
+    if args.input == "-":
+        bulk_io.import_collection(db[args.collection], sys.stdin.buffer,
+                                  args.format, upsert=args.upsert,
+                                  batch_size=args.batch_size)
+    else:
+        with open(args.input, "rb") as stream:
+            bulk_io.import_collection(db[args.collection], stream,
+                                      args.format, upsert=args.upsert,
+                                      batch_size=args.batch_size)
+    if args.collection == "meetings":
+        meeting_repo.list_changed(db.counters)
+except Exception as err:
+    print("Failed", file=sys.stderr)
+    print(err, file=sys.stderr)
+    sys.exit(1)
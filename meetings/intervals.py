@@ -0,0 +1,84 @@
+"""
+Compact list of time intervals.
+
+Free times used to be per-day lists of ("HH:mm", "HH:mm") tuples
+(or dicts built by addFreeTime), several hundred bytes per slot and
+re-parsed for every comparison.  Intervals keeps them as two
+array('i') columns of epoch minutes, 8 bytes per interval, sorted by
+start.  This is what get_next_free_time produces, what the session
+and the meeting's 'freeTime' field hold (as {"starts": [...],
+"ends": [...]}), and what the template filters format; strings are
+made only when a page is rendered.
+
+Meetings stored before this change have the old per-day form;
+from_document reads both.
+"""
+
+from array import array
+from datetime import date
+
+import freetime
+
+
+class Intervals:
+    """(start, end) pairs of epoch minutes in two parallel arrays"""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, pairs=()):
+        self.starts = array("i")
+        self.ends = array("i")
+        for start, end in pairs:
+            self.append(start, end)
+
+    def append(self, start, end):
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def __getitem__(self, i):
+        return (self.starts[i], self.ends[i])
+
+    def __eq__(self, other):
+        return (isinstance(other, Intervals) and
+                self.starts == other.starts and self.ends == other.ends)
+
+    def __repr__(self):
+        return "Intervals({!r})".format(list(self))
+
+    def to_document(self):
+        """Form stored in the session and in Mongo"""
+        return { "starts": self.starts.tolist(), "ends": self.ends.tolist() }
+
+    @classmethod
+    def from_document(cls, document, begin_date=None, tzinfo=None):
+        """
+        Read to_document's form, or the old per-day
+        [[("HH:mm", "HH:mm"), ...], ...] form, which needs the date
+        of its first day and the time zone.
+        """
+        result = cls()
+        if not document:
+            return result
+        if isinstance(document, dict):
+            result.starts.extend(document["starts"])
+            result.ends.extend(document["ends"])
+            return result
+        if isinstance(begin_date, str):
+            begin_date = date.fromisoformat(begin_date)
+        for daily in freetime.parse_free_times(begin_date, document, tzinfo):
+            for start, end in daily:
+                result.append(start, end)
+        return result
+
+    def format(self, tzinfo, fmt="%m/%d %H:%M", end_fmt="%H:%M"):
+        """One 'MM/DD HH:mm-HH:mm' string per interval"""
+        return [ "{}-{}".format(
+                     freetime.from_minutes(start, tzinfo).strftime(fmt),
+                     freetime.from_minutes(end, tzinfo).strftime(end_fmt))
+                 for start, end in self ]
@@ -0,0 +1,197 @@
+"""
+Background jobs with progress polling.
+
+Creating a meeting fetches the user's calendars, computes free
+times and inserts the meeting; doing that inside the /setrange
+request made its latency grow with the size of the calendars.
+Instead the request submits a job and returns at once, and the page
+polls a status endpoint until the job is done.
+
+Jobs run in a small pool of threads in the process that submitted
+them.  Their state lives in a store, so that (with MongoJobStore)
+any worker process can answer the status polls:
+
+    { "_id": <job id>, "key": <dedup key>, "state": "queued" |
+      "running" | "done" | "failed", "progress": <message>,
+      "result": <what the job returned>, "error": <message>,
+      "updated": <datetime> }
+
+Submitting a job with the key of a job that is still queued or
+running returns that job instead of starting another one, so a
+resubmitted form joins the computation already under way.  A job
+whose state has not changed for 'stale' seconds is taken to have
+died with its worker: it is marked failed and its key freed.
+"""
+
+import collections
+import datetime
+import logging
+import threading
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+from thread_pool import ThreadPool
+
+log = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_WORKERS = 2
+DEFAULT_EXPIRE = 3600   # seconds a finished job can still be polled
+DEFAULT_STALE = 300     # seconds without an update before a job is dead
+DEFAULT_SIZE = 1024     # jobs kept by MemoryJobStore
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+class MemoryJobStore:
+    """Jobs of this process only, at most 'size' of them"""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self._jobs = collections.OrderedDict()
+        self._active = { }   # key -> id of its queued or running job
+        self._lock = threading.Lock()
+
+    def create(self, key):
+        """(job, created): a new queued job, or the active one for key"""
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id is not None:
+                return dict(self._jobs[job_id]), False
+            job = { "_id": uuid.uuid4().hex, "key": key, "state": QUEUED,
+                    "progress": None, "updated": _now() }
+            self._jobs[job["_id"]] = job
+            self._active[key] = job["_id"]
+            while len(self._jobs) > self.size:
+                old_id, old = self._jobs.popitem(last=False)
+                if self._active.get(old["key"]) == old_id:
+                    del self._active[old["key"]]
+            return dict(job), True
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields, updated=_now())
+            if job["state"] in (DONE, FAILED) and \
+               self._active.get(job["key"]) == job_id:
+                del self._active[job["key"]]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+class MongoJobStore:
+    """
+    Jobs in a collection shared by all worker processes.  While a
+    job is active its key is also in 'active_key', which has a
+    unique sparse index, so two processes cannot start the same
+    job; finished jobs expire through a TTL index on 'updated'.
+    A worker that dies leaves its job active; once the job is
+    'stale' seconds old it no longer holds the key.
+    """
+
+    def __init__(self, collection, expire=DEFAULT_EXPIRE,
+                 stale=DEFAULT_STALE):
+        self.collection = collection
+        self.expire = expire
+        self.stale = stale
+        self._indexed = False
+
+    def _ensure_indexes(self):
+        if not self._indexed:
+            self.collection.create_index("active_key", unique=True,
+                                         sparse=True)
+            self.collection.create_index("updated",
+                                         expireAfterSeconds=self.expire)
+            self._indexed = True
+
+    def create(self, key):
+        self._ensure_indexes()
+        job = { "_id": uuid.uuid4().hex, "key": key, "active_key": key,
+                "state": QUEUED, "progress": None, "updated": _now() }
+        try:
+            self.collection.insert_one(job)
+            return job, True
+        except DuplicateKeyError:
+            existing = self._alive(
+                self.collection.find_one({ "active_key": key }))
+            if existing is None or "active_key" not in existing:
+                # Finished in between, or dead; start a fresh one
+                return self.create(key)
+            return existing, False
+
+    def update(self, job_id, **fields):
+        fields["updated"] = _now()
+        change = { "$set": fields }
+        if fields.get("state") in (DONE, FAILED):
+            change["$unset"] = { "active_key": "" }
+        self.collection.update_one({ "_id": job_id }, change)
+
+    def get(self, job_id):
+        return self._alive(self.collection.find_one({ "_id": job_id }))
+
+    def _alive(self, job):
+        """
+        job, or if it is active but stale, job marked failed.  Only
+        the caller that sees it unchanged marks it, so a job that is
+        still running and reports again keeps its key.
+        """
+        if job is None or "active_key" not in job or \
+           job["updated"] > _now() - datetime.timedelta(seconds=self.stale):
+            return job
+        fields = { "state": FAILED, "error": "The job stopped responding",
+                   "updated": _now() }
+        self.collection.update_one(
+            { "_id": job["_id"], "updated": job["updated"] },
+            { "$set": fields, "$unset": { "active_key": "" } })
+        job = dict(job, **fields)
+        del job["active_key"]
+        return job
+
+
+class JobQueue:
+    """Runs submitted functions in a thread pool, state in 'store'"""
+
+    def __init__(self, store, workers=DEFAULT_WORKERS):
+        self.store = store
+        self.workers = workers
+        self._pool = ThreadPool(workers)
+
+    def submit(self, key, fn, *args):
+        """
+        Id of the job running fn(progress, *args), where progress is
+        a function reporting a message to pollers.  If a job with
+        this key is already queued or running, its id instead.
+        """
+        job, created = self.store.create(key)
+        if created:
+            self._pool.submit(self._run, job["_id"], fn, args)
+        return job["_id"]
+
+    def _run(self, job_id, fn, args):
+        def progress(message):
+            self.store.update(job_id, progress=message)
+
+        self.store.update(job_id, state=RUNNING)
+        try:
+            result = fn(progress, *args)
+        except Exception as err:
+            log.exception("Job {} failed".format(job_id))
+            self.store.update(job_id, state=FAILED, error=str(err))
+        else:
+            self.store.update(job_id, state=DONE, result=result)
+
+    def status(self, job_id):
+        """The job's document, or None if there is no such job"""
+        return self.store.get(job_id)
@@ -0,0 +1,61 @@
+"""
+A bounded, thread-safe LRU mapping.
+
+A per-process cache keeps at most 'size' entries and drops the
+least recently used one first.  This is one OrderedDict behind a
+lock; what an entry is, and when it is stale, is up to the cache.
+"""
+
+import collections
+import threading
+
+
+class LRUCache:
+    """At most 'size' entries; reads and writes make an entry recent"""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, default)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def setdefault(self, key, value):
+        """The entry for key, storing value first if there is none"""
+        with self._lock:
+            value = self._entries.setdefault(key, value)
+            self._entries.move_to_end(key)
+            self._evict()
+            return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def pop_keys(self, predicate):
+        """Drop the entries whose key satisfies predicate"""
+        with self._lock:
+            for key in [ key for key in self._entries if predicate(key) ]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
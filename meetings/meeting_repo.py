@@ -0,0 +1,144 @@
+"""
+Queries on the meetings collection.
+
+Listing pages ask only for the summary fields, a page at a time,
+newest first, through indexes; the free times and comments of a
+meeting are loaded only when that meeting is viewed.  Pages are
+chained by the id of the last meeting shown (keyset pagination)
+rather than skip(), so a page costs the same however far back it is.
+
+Every meeting carries a 'version' counter and a 'modified' time,
+and a document in a counters collection does the same for the list
+as a whole.  Writes bump them; pages use them as ETag and
+Last-Modified values and as keys of their rendered HTML
+(page_cache).  Meetings stored before versions count as version 0.
+
+ensure_indexes is run by create_db.py.
+"""
+
+import datetime
+
+import pymongo
+from bson.objectid import ObjectId
+
+PAGE_SIZE = 50
+SUMMARY_FIELDS = { "name": 1, "dateRange": 1, "timeRange": 1,
+                   "owner": 1, "created": 1 }
+LIST_COUNTER = "meetings"   # _id of the list's document in counters
+
+NEWEST_FIRST = [ ("created", pymongo.DESCENDING),
+                 ("_id", pymongo.DESCENDING) ]
+INDEXES = [
+    [ ("name", pymongo.ASCENDING) ],
+    [ ("dateRange", pymongo.ASCENDING) ],
+    [ ("owner", pymongo.ASCENDING) ] + NEWEST_FIRST,
+    NEWEST_FIRST,
+]
+
+
+def ensure_indexes(collection):
+    """Create the indexes the queries below rely on (idempotent)"""
+    for keys in INDEXES:
+        collection.create_index(keys)
+
+
+def list_summaries(collection, before=None, owner=None, limit=PAGE_SIZE):
+    """
+    Up to 'limit' meeting summaries (SUMMARY_FIELDS only), newest
+    first.  'before' is the id of the last meeting of the previous
+    page; 'owner' restricts the list to one user's meetings.  A
+    'before' that is not a meeting id is ignored (first page).
+    """
+    query = { }
+    if owner:
+        query["owner"] = owner
+    if before and ObjectId.is_valid(before):
+        last = collection.find_one({ "_id": ObjectId(before) },
+                                   { "created": 1 })
+        # Meetings stored before 'created' sort after all others, by
+        # id alone
+        if last and "created" in last:
+            query["$or"] = [
+                { "created": { "$lt": last["created"] } },
+                { "created": last["created"], "_id": { "$lt": last["_id"] } },
+                { "created": None } ]
+        elif last:
+            query["created"] = None
+            query["_id"] = { "$lt": last["_id"] }
+    cursor = (collection.find(query, SUMMARY_FIELDS)
+              .sort(NEWEST_FIRST)
+              .limit(limit))
+    return list(cursor)
+
+
+def object_id(meeting_id):
+    """The ObjectId of a meeting id (string or ObjectId), or None"""
+    if isinstance(meeting_id, ObjectId):
+        return meeting_id
+    if meeting_id and ObjectId.is_valid(meeting_id):
+        return ObjectId(meeting_id)
+    return None
+
+
+def get(collection, meeting_id, fields=None):
+    """One meeting by id (string or ObjectId), or None"""
+    meeting_id = object_id(meeting_id)
+    if meeting_id is None:
+        return None
+    return collection.find_one({ "_id": meeting_id }, fields)
+
+
+def insert(collection, record):
+    """Store a new meeting, stamped with its creation time"""
+    record.setdefault("created", datetime.datetime.utcnow())
+    record.setdefault("modified", record["created"])
+    record.setdefault("version", 1)
+    return collection.insert_one(record).inserted_id
+
+
+def delete(collection, meeting_id):
+    collection.delete_one({ "_id": ObjectId(meeting_id) })
+
+
+def set_password(collection, meeting_id, old, new):
+    """
+    Replace a meeting's password hash (e.g. with a stronger one),
+    unless it was changed since 'old' was read.
+    """
+    collection.update_one({ "_id": ObjectId(meeting_id), "pw": old },
+                          { "$set": { "pw": new } })
+
+
+def touch(collection, meeting_id):
+    """
+    Bump a meeting's version, after anything shown on its page
+    changed (e.g. a participant's availability).
+    """
+    collection.update_one({ "_id": ObjectId(meeting_id) },
+                          { "$inc": { "version": 1 },
+                            "$set": { "modified": datetime.datetime.utcnow() } })
+
+
+def version(collection, meeting_id):
+    """(version, modified) of one meeting, or None if it is gone"""
+    doc = collection.find_one({ "_id": ObjectId(meeting_id) },
+                              { "version": 1, "modified": 1, "created": 1 })
+    if doc is None:
+        return None
+    return doc.get("version", 0), doc.get("modified", doc.get("created"))
+
+
+def list_changed(counters):
+    """Bump the version of the meetings list, after an insert or delete"""
+    counters.update_one({ "_id": LIST_COUNTER },
+                        { "$inc": { "version": 1 },
+                          "$set": { "modified": datetime.datetime.utcnow() } },
+                        upsert=True)
+
+
+def list_version(counters):
+    """(version, modified) of the meetings list; (0, None) at first"""
+    doc = counters.find_one({ "_id": LIST_COUNTER })
+    if doc is None:
+        return 0, None
+    return doc["version"], doc["modified"]
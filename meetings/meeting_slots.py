@@ -0,0 +1,127 @@
+"""
+Precomputed availability counts for each meeting.
+
+A meeting's dateRange x timeRange is cut into slots as in
+availability.py.  Two collections are kept:
+
+    participants   one document per (meeting, participant) with the
+                   indices of the slots that participant is free for
+                   {_id: "<meeting id>:<participant>", meeting,
+                    participant, slots: [3, 4, 5, ...]}
+    meeting_slots  one aggregate document per meeting
+                   {_id: <meeting id>, participants: n,
+                    counts: {"<slot index>": <number free>, ...}}
+
+When a participant adds or changes their availability, only the
+slots that changed are touched, with a single atomic $inc on the
+aggregate, so viewing a meeting reads one document instead of
+intersecting everyone's free times again.  rebuild() recomputes an
+aggregate from the participants collection (see rebuild_slots.py);
+delete() drops both kinds of document when the meeting goes.
+
+Given the meetings collection, both writes also bump the meeting's
+version (meeting_repo.touch), since the counts are shown on its
+page: cached pages and ETags of the old version go stale.
+
+NumPy (through availability) is imported on first use, so that
+importing the app does not load it.
+"""
+
+import collections
+
+from pymongo import ReturnDocument
+
+import meeting_repo
+
+
+def ensure_indexes(participants):
+    """Index the participants collection for rebuild (idempotent)"""
+    participants.create_index("meeting")
+
+
+class MeetingSlots:
+    """Participant availability and the per-meeting aggregate"""
+
+    def __init__(self, participants, aggregates, tzinfo, meetings=None):
+        self.participants = participants
+        self.aggregates = aggregates
+        self.tzinfo = tzinfo
+        self.meetings = meetings
+
+    def _changed(self, meeting_id):
+        if self.meetings is not None:
+            meeting_repo.touch(self.meetings, meeting_id)
+
+    def set_availability(self, meeting, participant, free):
+        """
+        Record (or replace) one participant's free intervals (epoch
+        minutes, flat or per day) for a meeting record, and update
+        the meeting's counts by the difference.
+        """
+        import numpy as np
+        import availability
+        grid = availability.grid_for(meeting, self.tzinfo)
+        slots = np.flatnonzero(grid.mask(free)).tolist()
+        old = self.participants.find_one_and_update(
+            { "_id": "{}:{}".format(meeting["_id"], participant) },
+            { "$set": { "meeting": meeting["_id"],
+                        "participant": participant,
+                        "slots": slots } },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE)
+        old_slots = set(old["slots"]) if old else set()
+        new_slots = set(slots)
+        inc = { }
+        for i in new_slots - old_slots:
+            inc["counts.{}".format(i)] = 1
+        for i in old_slots - new_slots:
+            inc["counts.{}".format(i)] = -1
+        if old is None:
+            inc["participants"] = 1
+        if inc:
+            self.aggregates.update_one({ "_id": meeting["_id"] },
+                                       { "$inc": inc }, upsert=True)
+            self._changed(meeting["_id"])
+
+    def counts(self, meeting, grid=None):
+        """Number of participants free in each slot, as an array"""
+        import numpy as np
+        import availability
+        grid = grid or availability.grid_for(meeting, self.tzinfo)
+        counts = np.zeros(len(grid.slots), dtype=np.int64)
+        aggregate = self.aggregates.find_one({ "_id": meeting["_id"] })
+        if aggregate:
+            for i, n in aggregate.get("counts", { }).items():
+                counts[int(i)] = n
+        return counts
+
+    def best_slots(self, meeting, k=5, at_least=1):
+        """
+        Up to k (slot index in the meeting's grid, number free)
+        pairs, most participants first, read from the aggregate.
+        """
+        import availability
+        counts = self.counts(meeting)
+        return [ (int(i), int(counts[i]))
+                 for i in availability.best_indices(counts, k, at_least) ]
+
+    def rebuild(self, meeting_id):
+        """Recompute one meeting's aggregate from its participants"""
+        counts = collections.Counter()
+        participants = 0
+        for doc in self.participants.find({ "meeting": meeting_id },
+                                          { "slots": 1 }):
+            participants += 1
+            counts.update(doc.get("slots", [ ]))
+        self.aggregates.replace_one(
+            { "_id": meeting_id },
+            { "participants": participants,
+              "counts": { str(i): n for i, n in counts.items() } },
+            upsert=True)
+        self._changed(meeting_id)
+        return participants
+
+    def delete(self, meeting_id):
+        """Remove a deleted meeting's participants and aggregate"""
+        self.participants.delete_many({ "meeting": meeting_id })
+        self.aggregates.delete_one({ "_id": meeting_id })
@@ -0,0 +1,112 @@
+"""
+Local stand-in for the Google Calendar API, for load testing.
+
+Serves the endpoints calendar_async uses (calendarList, events and
+freeBusy) with made-up calendars, each having a one-hour event every
+few hours, and waits 'latency' seconds before answering each request
+the way a slow upstream would.  Any bearer token is accepted.
+
+    python3 mock_calendar.py --port 8090 --calendars 5 --latency 0.2
+
+then set, in credentials.ini,
+
+    ASYNC_CALENDAR = True
+    CALENDAR_API_URL = http://localhost:8090/calendar/v3
+
+and drive /choose or /setrange with a load generator.  The session
+still needs (unexpired) OAuth credentials; their token is not checked.
+"""
+
+import argparse
+import asyncio
+from datetime import timedelta
+
+from aiohttp import web
+
+import freetime
+
+EVENT_EVERY = timedelta(hours=3)
+EVENT_LENGTH = timedelta(hours=1)
+
+
+def calendar_ids(count):
+    return [ "primary@example.com" ] + [
+        "calendar{}@example.com".format(i) for i in range(1, count) ]
+
+
+def make_events(cal_id, time_min, time_max, offset):
+    """One event every EVENT_EVERY in [time_min, time_max)"""
+    start = freetime.parse_datetime(time_min) + offset
+    end = freetime.parse_datetime(time_max)
+    events = [ ]
+    while start < end:
+        events.append({ "id": "{}-{}".format(cal_id, len(events)),
+                        "summary": "Busy",
+                        "start": { "dateTime": start.isoformat() },
+                        "end": { "dateTime": (start + EVENT_LENGTH).isoformat() } })
+        start += EVENT_EVERY
+    return events
+
+
+def make_app(calendars, latency, page_size):
+    ids = calendar_ids(calendars)
+    # Calendars' events are staggered so that they do not all overlap
+    offsets = { cal_id: timedelta(minutes=30 * i) for i, cal_id in enumerate(ids) }
+
+    async def calendar_list(request):
+        await asyncio.sleep(latency)
+        return web.json_response({ "items": [
+            { "kind": "calendar#calendarListEntry", "id": cal_id,
+              "summary": cal_id, "selected": True,
+              "primary": i == 0 }
+            for i, cal_id in enumerate(ids) ] })
+
+    async def events(request):
+        await asyncio.sleep(latency)
+        cal_id = request.match_info["cal_id"]
+        if cal_id not in offsets:
+            return web.json_response({ "error": "notFound" }, status=404)
+        items = make_events(cal_id, request.query["timeMin"],
+                            request.query["timeMax"], offsets[cal_id])
+        first = int(request.query.get("pageToken", 0))
+        size = min(int(request.query.get("maxResults", page_size)), page_size)
+        page = { "items": items[first:first + size] }
+        if first + size < len(items):
+            page["nextPageToken"] = str(first + size)
+        return web.json_response(page)
+
+    async def freebusy(request):
+        await asyncio.sleep(latency)
+        body = await request.json()
+        result = { }
+        for item in body["items"]:
+            cal_id = item["id"]
+            if cal_id not in offsets:
+                result[cal_id] = { "errors": [ { "reason": "notFound" } ] }
+                continue
+            result[cal_id] = { "busy": [
+                { "start": event["start"]["dateTime"],
+                  "end": event["end"]["dateTime"] }
+                for event in make_events(cal_id, body["timeMin"],
+                                         body["timeMax"], offsets[cal_id]) ] }
+        return web.json_response({ "timeMin": body["timeMin"],
+                                   "timeMax": body["timeMax"],
+                                   "calendars": result })
+
+    app = web.Application()
+    app.router.add_get("/calendar/v3/users/me/calendarList", calendar_list)
+    app.router.add_get("/calendar/v3/calendars/{cal_id}/events", events)
+    app.router.add_post("/calendar/v3/freeBusy", freebusy)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--calendars", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="seconds before each response")
+    parser.add_argument("--page-size", type=int, default=250)
+    args = parser.parse_args()
+    web.run_app(make_app(args.calendars, args.latency, args.page_size),
+                port=args.port)
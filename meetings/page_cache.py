@@ -0,0 +1,41 @@
+"""
+Rendered pages of meetings, by version.
+
+The meetings list and each meeting's page change only when a
+meeting is added, changed or deleted, and every such write bumps a
+version counter (see meeting_repo).  Rendered HTML is kept here
+under (kind, name, version), so a page is rendered once per version
+rather than once per hit, and writes drop the entries they make
+stale.  Per process and LRU bounded, like event_cache.MemoryBackend.
+"""
+
+from lru import LRUCache
+
+DEFAULT_SIZE = 256   # rendered pages kept per worker
+
+
+class FragmentCache:
+    """LRU of rendered HTML keyed by (kind, name, version)"""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self._entries = LRUCache(size)
+
+    def get(self, kind, name, version):
+        return self._entries.get((kind, name, version))
+
+    def put(self, kind, name, version, html):
+        self._entries.put((kind, name, version), html)
+
+    def render(self, kind, name, version, render):
+        """The cached HTML, or render() stored under this version"""
+        html = self.get(kind, name, version)
+        if html is None:
+            html = render()
+            self.put(kind, name, version, html)
+        return html
+
+    def invalidate(self, kind, name=None):
+        """Drop the entries of one kind (only 'name', if given)"""
+        self._entries.pop_keys(
+            lambda key: key[0] == kind and (name is None or key[1] == name))
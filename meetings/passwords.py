@@ -0,0 +1,117 @@
+"""
+Meeting passwords, hashed with a slow key derivation function.
+
+Stored hashes name their scheme and cost, so the cost can be raised
+(or the scheme changed) without breaking the hashes already stored:
+
+  scrypt$<n>$<r>$<p>$<salt hex>$<hash hex>
+  pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+  <sha256 hex>:<salt>          legacy: one salted SHA-256, still
+                               accepted, replaced on next use
+
+A slow hash costs tens of milliseconds of CPU (and, for scrypt,
+128 * n * r bytes of memory) by design.  Hashing and verifying run
+in a small pool of threads.  The calling request still waits for
+its result, but however many requests check a password at once, at
+most 'workers' hashes are being computed and the rest of the work
+of the process goes on beside them; hashlib releases the GIL while
+it hashes.  needs_upgrade() tells the caller
+when a hash that just verified should be stored again with
+hash().
+"""
+
+import hashlib
+import hmac
+import os
+
+from thread_pool import ThreadPool
+
+SCHEMES = ("scrypt", "pbkdf2_sha256")
+DEFAULT_SCHEME = "scrypt"
+DEFAULT_SCRYPT_N = 2 ** 14   # 16 MB per hash with r = 8
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+DEFAULT_ITERATIONS = 600000  # PBKDF2-HMAC-SHA256
+DEFAULT_WORKERS = 2          # hashes computed at once per worker
+SALT_BYTES = 16
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords with one scheme, in a thread pool"""
+
+    def __init__(self, scheme=DEFAULT_SCHEME, scrypt_n=DEFAULT_SCRYPT_N,
+                 scrypt_r=DEFAULT_SCRYPT_R, scrypt_p=DEFAULT_SCRYPT_P,
+                 iterations=DEFAULT_ITERATIONS, workers=DEFAULT_WORKERS):
+        if scheme not in SCHEMES:
+            raise ValueError("Unknown password scheme {}".format(scheme))
+        self.scheme = scheme
+        self.scrypt_params = (scrypt_n, scrypt_r, scrypt_p)
+        self.iterations = iterations
+        self.workers = workers
+        self._pool = ThreadPool(workers)
+
+    def hash(self, password):
+        """The stored form of password, in the current scheme"""
+        return self._pool.submit(self._hash, password).result()
+
+    def verify(self, stored, password):
+        """
+        Whether password matches the stored hash.  A meeting stored
+        without a password (empty or missing 'stored') is open.
+        """
+        if not stored:
+            return True
+        return self._pool.submit(self._verify, stored, password).result()
+
+    def needs_upgrade(self, stored):
+        """Whether a hash that verified should be hashed again"""
+        if not stored:
+            return False
+        fields = stored.split("$")
+        if fields[0] != self.scheme:
+            return True
+        if self.scheme == "scrypt":
+            return tuple(map(int, fields[1:4])) != self.scrypt_params
+        return int(fields[1]) != self.iterations
+
+    def _hash(self, password):
+        salt = os.urandom(SALT_BYTES)
+        if self.scheme == "scrypt":
+            params = self.scrypt_params
+            return "$".join([ "scrypt" ] + [ str(n) for n in params ]
+                            + [ salt.hex(), _scrypt(password, salt, *params).hex() ])
+        return "$".join([ "pbkdf2_sha256", str(self.iterations), salt.hex(),
+                          _pbkdf2(password, salt, self.iterations).hex() ])
+
+    def _verify(self, stored, password):
+        try:
+            return self._compare(stored, password)
+        except (ValueError, IndexError):
+            # Not a hash we can read (truncated, edited by hand...)
+            return False
+
+    def _compare(self, stored, password):
+        fields = stored.split("$")
+        if fields[0] == "scrypt":
+            n, r, p = map(int, fields[1:4])
+            salt, expected = bytes.fromhex(fields[4]), bytes.fromhex(fields[5])
+            actual = _scrypt(password, salt, n, r, p)
+        elif fields[0] == "pbkdf2_sha256":
+            salt, expected = bytes.fromhex(fields[2]), bytes.fromhex(fields[3])
+            actual = _pbkdf2(password, salt, int(fields[1]))
+        else:
+            digest, salt = stored.split(":")
+            expected = digest.encode()
+            actual = hashlib.sha256(
+                salt.encode() + password.encode()).hexdigest().encode()
+        return hmac.compare_digest(actual, expected)
+
+
+def _scrypt(password, salt, n, r, p):
+    # hashlib's default memory limit (32 MB) is too low for n = 2**15
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=32)
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
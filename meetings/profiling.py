@@ -0,0 +1,185 @@
+"""
+Opt-in profiling of selected requests.
+
+init_app(app, ...) profiles a sample_rate fraction of requests, and
+any request carrying the configured header with the configured
+secret as its value (e.g. X-Profile: <secret>; with no secret set,
+any value, but only when app.debug is on), and writes one set of
+files per profiled request to a directory:
+
+  sample mode    a thread samples the request thread's stack every
+                 'interval' seconds.  <name>.collapsed has one line
+                 per distinct stack, "outer;...;inner count", the
+                 input of flamegraph.pl and speedscope; <name>.txt
+                 lists the functions with the most samples, by self
+                 and by total (inclusive) count.
+  cprofile mode  cProfile on the request thread.  <name>.prof is the
+                 pstats dump (snakeviz, flameprof, gprof2dot);
+                 <name>.txt the top functions by cumulative time.
+
+Once the directory holds max_files files no more profiles are
+written, so that clients cannot fill the disk; clear it out to
+start again.  Unless init_app is called nothing is hooked into the
+app, so there is no cost at all when profiling is off.
+"""
+
+import collections
+import cProfile
+import datetime
+import hmac
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+
+import flask
+
+DEFAULT_INTERVAL = 0.005   # seconds between samples
+DEFAULT_TOP = 30           # functions listed in the summary
+DEFAULT_MAX_FILES = 200    # files in the output directory, at most
+FILES_PER_PROFILE = 2
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return "{} ({}:{})".format(code.co_name,
+                               os.path.basename(code.co_filename),
+                               code.co_firstlineno).replace(";", ":")
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of one thread until stopped"""
+
+    def __init__(self, thread_id, interval=DEFAULT_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = [ ]
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def collapsed(self):
+        """Stacks in collapsed (flamegraph.pl) form"""
+        return "".join("{} {}\n".format(";".join(stack), count)
+                       for stack, count in self.stacks.most_common())
+
+    def summary(self, top=DEFAULT_TOP):
+        """The functions with the most samples, self and inclusive"""
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        samples = sum(self.stacks.values())
+        lines = [ "{} samples, {:.1f} ms apart".format(
+                      samples, self.interval * 1000), "",
+                  "Self samples" ]
+        for label, count in own.most_common(top):
+            lines.append("{:7} {:5.1f}%  {}".format(
+                count, 100.0 * count / max(samples, 1), label))
+        lines += [ "", "Total samples" ]
+        for label, count in total.most_common(top):
+            lines.append("{:7} {:5.1f}%  {}".format(
+                count, 100.0 * count / max(samples, 1), label))
+        return "\n".join(lines) + "\n"
+
+
+def init_app(app, output_dir, sample_rate=0.0, header="X-Profile",
+             secret=None, mode="sample", interval=DEFAULT_INTERVAL,
+             top=DEFAULT_TOP, max_files=DEFAULT_MAX_FILES):
+    """
+    Profile requests of app that carry 'header' (if not None) set to
+    'secret' (or to anything, if there is no secret and app.debug
+    is on) and a sample_rate fraction of the others, writing to
+    output_dir until it holds max_files files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    lock = threading.Lock()
+    running = [ 0 ]   # profiles started and not yet written
+
+    def asked():
+        value = flask.request.headers.get(header) if header else None
+        if not value:
+            return False
+        if secret:
+            return hmac.compare_digest(value.encode(), secret.encode())
+        return app.debug
+
+    def selected():
+        wanted = asked() or (sample_rate > 0 and random.random() < sample_rate)
+        if not wanted:
+            return False
+        with lock:
+            written = len(os.listdir(output_dir))
+            if written + FILES_PER_PROFILE * (running[0] + 1) > max_files:
+                return False
+            running[0] += 1
+            return True
+
+    @app.before_request
+    def _start_profile():
+        if not selected():
+            return
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = Sampler(threading.get_ident(), interval)
+            profiler.start()
+        flask.g._profile = (profiler, time.perf_counter())
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        # teardown runs after the response is built, even on errors
+        profile = flask.g.pop("_profile", None)
+        if profile is None:
+            return
+        try:
+            _write_profile(profile)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    def _write_profile(profile):
+        profiler, start = profile
+        elapsed = time.perf_counter() - start
+        if mode == "cprofile":
+            profiler.disable()
+        else:
+            profiler.stop()
+        name = os.path.join(output_dir, "{:%Y%m%d-%H%M%S}-{}-{}".format(
+            datetime.datetime.now(), flask.request.endpoint or "none",
+            uuid.uuid4().hex[:6]))
+        heading = "{} {} {:.1f} ms\n\n".format(
+            flask.request.method, flask.request.full_path, elapsed * 1000)
+        if mode == "cprofile":
+            profiler.dump_stats(name + ".prof")
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats(
+                "cumulative").print_stats(top)
+            summary = out.getvalue()
+        else:
+            with open(name + ".collapsed", "w") as f:
+                f.write(profiler.collapsed())
+            summary = profiler.summary(top)
+        with open(name + ".txt", "w") as f:
+            f.write(heading + summary)
+        app.logger.info("Profiled %s in %s.*", flask.request.path, name)
@@ -0,0 +1,39 @@
+"""
+Rebuild the per-meeting availability counts (meeting_slots) from
+the participants collection, for every meeting or for the meeting
+ids given on the command line.
+
+Use this after restoring a backup, or if the counts are suspected
+to have drifted from the raw participant data.
+"""
+
+import sys
+
+from bson.objectid import ObjectId
+
+import config
+import database
+import meeting_slots
+import timeparse
+CONFIG = config.configuration(proxied=True)
+
+database.configure(CONFIG)
+# The meetings collection too, so each rebuild bumps the meeting's
+# version and its cached pages are rendered again
+slots = meeting_slots.MeetingSlots(database.LazyCollection("participants"),
+                                   database.LazyCollection("meeting_slots"),
+                                   timeparse.local_tz(),
+                                   database.LazyCollection("meetings"))
+
+try:
+    if len(sys.argv) > 1:
+        meeting_ids = [ ObjectId(arg) for arg in sys.argv[1:] ]
+    else:
+        meeting_ids = [ doc["_id"] for doc in
+                        database.get_db().meetings.find({ }, { "_id": 1 }) ]
+    for meeting_id in meeting_ids:
+        participants = slots.rebuild(meeting_id)
+        print("Rebuilt {} ({} participants)".format(meeting_id, participants))
+except Exception as err:
+    print("Failed")
+    print(err)
@@ -0,0 +1,226 @@
+"""
+Server-side sessions.
+
+Flask's default session is a signed cookie holding the whole
+session, which here means the freeTime list, a meeting document and
+the OAuth credentials, sent back and forth on every request and
+growing with the date range.  With ServerSessionInterface the cookie
+holds only a signed session id; the values live in a store (a Mongo
+collection, or a dict for tests) and expire 'ttl' seconds after the
+session was last written.
+
+Values are loaded one key at a time, the first time a request reads
+that key, and only keys that were assigned or deleted are written
+back.  As with Flask's own sessions, mutating a value in place
+(session['x'].append(...)) is not noticed unless the value is
+assigned again or session.modified is set.
+"""
+
+import collections.abc
+import datetime
+import threading
+import uuid
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+
+DEFAULT_TTL = 7 * 24 * 3600   # seconds
+
+_MISSING = object()
+
+
+class MemorySessionStore:
+    """Sessions in a dict; for tests and single-process use"""
+
+    def __init__(self):
+        self._sessions = { }
+        self._lock = threading.Lock()
+
+    def _live(self, sid):
+        data, expires = self._sessions.get(sid, (None, None))
+        if data is not None and expires < datetime.datetime.utcnow():
+            del self._sessions[sid]
+            return None
+        return data
+
+    def load_key(self, sid, key):
+        with self._lock:
+            data = self._live(sid) or { }
+            return data.get(key, _MISSING)
+
+    def load_all(self, sid):
+        with self._lock:
+            return dict(self._live(sid) or { })
+
+    def save(self, sid, changed, deleted, expires):
+        with self._lock:
+            data = self._live(sid) or { }
+            data.update(changed)
+            for key in deleted:
+                data.pop(key, None)
+            self._sessions[sid] = (data, expires)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+
+class MongoSessionStore:
+    """
+    One document per session, {_id: sid, data: {...}, expires: ...},
+    removed by a TTL index once 'expires' has passed.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._indexed = False
+
+    def _ensure_index(self):
+        # Not in __init__, so that constructing this doesn't connect
+        if not self._indexed:
+            self.collection.create_index("expires", expireAfterSeconds=0)
+            self._indexed = True
+
+    def _find(self, sid, projection):
+        self._ensure_index()
+        # The TTL monitor runs only once a minute, so check ourselves
+        return self.collection.find_one(
+            { "_id": sid, "expires": { "$gt": datetime.datetime.utcnow() } },
+            projection)
+
+    def load_key(self, sid, key):
+        document = self._find(sid, { "data." + key: 1 })
+        if document is None:
+            return _MISSING
+        return document.get("data", { }).get(key, _MISSING)
+
+    def load_all(self, sid):
+        document = self._find(sid, { "data": 1 })
+        if document is None:
+            return { }
+        return document.get("data", { })
+
+    def save(self, sid, changed, deleted, expires):
+        self._ensure_index()
+        update = { "$set": { "expires": expires } }
+        for key, value in changed.items():
+            update["$set"]["data." + key] = value
+        if deleted:
+            update["$unset"] = { "data." + key: "" for key in deleted }
+        self.collection.update_one({ "_id": sid }, update, upsert=True)
+
+    def delete(self, sid):
+        self.collection.delete_one({ "_id": sid })
+
+
+class ServerSession(SessionMixin, collections.abc.MutableMapping):
+    """A session whose values are fetched from the store on demand"""
+
+    def __init__(self, store, sid, new=False):
+        self.store = store
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self._values = { }       # key -> value, or _MISSING if not there
+        self._changed = set()
+        self._deleted = set()
+        self._complete = new     # all keys loaded?
+
+    def _load(self, key):
+        if key not in self._values:
+            if self._complete:
+                self._values[key] = _MISSING
+            else:
+                self._values[key] = self.store.load_key(self.sid, key)
+        return self._values[key]
+
+    def _load_all(self):
+        if not self._complete:
+            for key, value in self.store.load_all(self.sid).items():
+                self._values.setdefault(key, value)
+            self._complete = True
+
+    def __getitem__(self, key):
+        self.accessed = True
+        value = self._load(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.accessed = True
+        self._values[key] = value
+        self._changed.add(key)
+        self._deleted.discard(key)
+        self.modified = True
+
+    def __delitem__(self, key):
+        if self._load(key) is _MISSING:
+            raise KeyError(key)
+        self._values[key] = _MISSING
+        self._changed.discard(key)
+        self._deleted.add(key)
+        self.modified = True
+
+    def __iter__(self):
+        self.accessed = True
+        self._load_all()
+        return iter([ key for key, value in self._values.items()
+                      if value is not _MISSING ])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def changes(self):
+        """(changed values, deleted keys) to write back"""
+        if self.modified and not self._changed and not self._deleted:
+            # Someone set session.modified after changing a value in
+            # place; we can't tell which, so write all we've read
+            keys = [ key for key, value in self._values.items()
+                     if value is not _MISSING ]
+        else:
+            keys = self._changed
+        return ({ key: self._values[key] for key in keys },
+                set(self._deleted))
+
+
+class ServerSessionInterface(SessionInterface):
+    """Keeps only a signed session id in the cookie"""
+
+    def __init__(self, store, ttl=DEFAULT_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="server-session")
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(app.config["SESSION_COOKIE_NAME"])
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("utf-8")
+                return ServerSession(self.store, sid)
+            except BadSignature:
+                pass
+        return ServerSession(self.store, uuid.uuid4().hex, new=True)
+
+    def save_session(self, app, session, response):
+        if not session.modified:
+            return
+        changed, deleted = session.changes()
+        if session.new and not changed:
+            return
+        expires = datetime.datetime.utcnow() + datetime.timedelta(
+            seconds=self.ttl)
+        self.store.save(session.sid, changed, deleted, expires)
+        # The store's expiry moved forward, so the cookie's does too
+        response.set_cookie(
+            app.config["SESSION_COOKIE_NAME"],
+            self._signer(app).sign(session.sid.encode("utf-8")).decode("utf-8"),
+            max_age=self.ttl,
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app))
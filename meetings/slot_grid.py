@@ -0,0 +1,135 @@
+"""
+The daily windows and slots of a date and time range, shared.
+
+A meeting (and a session's chosen range) covers each day of its
+dateRange between the same two wall-clock times (its timeRange) in
+one time zone.  On days when daylight saving time starts or ends the
+window is an hour shorter or longer, so the days cannot be derived
+from one another; freetime.daily_windows works each one out with
+its own offset.
+
+A SlotGrid holds those windows and the start of every slot in them
+(epoch minutes), and gives Google's timeMin and timeMax for the
+range.  It never changes once built, so grids are memoized per
+process in an LRU keyed by (first day, last day, begin time, end
+time, time zone, slot size): every participant of a meeting, the
+free-time sweep and the pages use one object, computed once.
+Time zones are keyed by identity; they come from timeparse's caches,
+which hand out one object per zone.  NumPy is imported when the
+first grid is built, not with this module.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+
+import freetime
+import timeparse
+from lru import LRUCache
+
+SLOT_MINUTES = 15
+DEFAULT_SIZE = 256   # grids kept per worker
+
+
+class SlotGrid:
+    """Daily windows and slot starts of one range; read-only"""
+
+    def __init__(self, first, last, begin, end, tzinfo,
+                 slot_minutes=SLOT_MINUTES):
+        self.first = first
+        self.last = last
+        self.begin = begin
+        self.end = end
+        self.tzinfo = tzinfo
+        self.slot_minutes = slot_minutes
+        self.windows = tuple(freetime.daily_windows(first, last, begin, end,
+                                                    tzinfo))
+        self.slots = slot_starts(self.windows, slot_minutes)
+        self.slots.flags.writeable = False
+
+    @property
+    def time_min(self):
+        """RFC3339 start of the first day's window"""
+        return _rfc3339(datetime.combine(self.first, self.begin),
+                        self.windows[0][0] if self.windows else None)
+
+    @property
+    def time_max(self):
+        """
+        RFC3339 end of the last day's window, plus a second, since
+        Google's timeMax is exclusive.
+        """
+        return _rfc3339(datetime.combine(self.last, self.end),
+                        self.windows[-1][1] if self.windows else None,
+                        timedelta(seconds=1))
+
+    def window_labels(self):
+        """'Mon 11/27 09:00-17:00' for each day, for the pages"""
+        labels = [ ]
+        for start, end in self.windows:
+            start = freetime.from_minutes(start, self.tzinfo)
+            end = freetime.from_minutes(end, self.tzinfo)
+            labels.append("{} {}-{}".format(start.strftime("%a %m/%d"),
+                                            start.strftime("%H:%M"),
+                                            end.strftime("%H:%M")))
+        return labels
+
+    def slot_span(self, index):
+        """(start, end) of one slot as datetimes in the grid's zone"""
+        start = int(self.slots[index])
+        return (freetime.from_minutes(start, self.tzinfo),
+                freetime.from_minutes(start + self.slot_minutes, self.tzinfo))
+
+
+def slot_starts(windows, slot_minutes=SLOT_MINUTES):
+    """Start (epoch minutes) of each whole slot in the windows"""
+    import numpy as np
+    starts = [ np.arange(start, end - slot_minutes + 1, slot_minutes,
+                         dtype=np.int64)
+               for start, end in windows ]
+    if starts:
+        return np.concatenate(starts)
+    return np.zeros(0, dtype=np.int64)
+
+
+def _rfc3339(wall, minutes, extra=timedelta(0)):
+    # The wall-clock time itself, with the offset that makes it the
+    # instant 'minutes'; for a time the clocks skipped that is the
+    # offset before the change, so the text still names the time
+    # asked for and parses back to it
+    if minutes is None:
+        return wall.isoformat()
+    as_utc = freetime.to_minutes(wall.replace(tzinfo=timezone.utc))
+    offset = timezone(timedelta(minutes=as_utc - minutes))
+    return (wall.replace(tzinfo=offset) + extra).isoformat()
+
+
+_grids = LRUCache(DEFAULT_SIZE)
+
+
+def grid(first, last, begin, end, tzinfo, slot_minutes=SLOT_MINUTES):
+    """
+    The SlotGrid of days first..last (dates) between the times of
+    day begin and end (naive times) in tzinfo, built only on a miss.
+    """
+    begin = begin.replace(tzinfo=None)
+    end = end.replace(tzinfo=None)
+    # The entry holds tzinfo, so its id is not reused while cached
+    key = (first, last, begin, end, id(tzinfo), slot_minutes)
+    found = _grids.get(key)
+    if found is None:
+        found = _grids.setdefault(
+            key, SlotGrid(first, last, begin, end, tzinfo, slot_minutes))
+    return found
+
+
+def for_meeting(record, tzinfo, slot_minutes=SLOT_MINUTES):
+    """The grid of a meeting's dateRange and timeRange"""
+    first, last = [ date.fromisoformat(d) for d in record["dateRange"] ]
+    begin, end = [ time.fromisoformat(t) for t in record["timeRange"] ]
+    return grid(first, last, begin, end, tzinfo, slot_minutes)
+
+
+def for_window(time_min, time_max, tzinfo):
+    """The grid whose time_min and time_max these are"""
+    first = timeparse.parse_iso(time_min)
+    last = timeparse.parse_iso(time_max) - timedelta(seconds=1)
+    return grid(first.date(), last.date(), first.time(), last.time(), tzinfo)
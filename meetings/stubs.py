@@ -0,0 +1,87 @@
+"""
+Stand-ins shared by the tests and benchmark.py: a Calendar API
+service object over fixed event lists, the settings credentials.ini
+would give, and flask_main's app created from them over mongomock.
+"""
+
+import argparse
+
+import mongomock
+
+import database
+
+CONFIG = argparse.Namespace(
+    DEBUG=False, LOG_LEVEL="WARNING", SECRET_KEY="test", PORT=5000,
+    GOOGLE_KEY_FILE="client_secret.json",
+    DB_USER="test", DB_USER_PW="test", DB_HOST="localhost", DB_PORT=27017,
+    DB="meetings",
+    # Cheap hashes; the scheme is the one in production
+    PASSWORD_SCRYPT_N=2 ** 4, PASSWORD_CACHE_TTL=900,
+    JOBS="memory")
+
+
+class Request:
+    """What service.<resource>().<method>(...) returns"""
+
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class StubService:
+    """
+    Enough of the Calendar API service object for the app: calendar
+    list, paged event lists and freebusy, over fixed event lists.
+    The bodies of freebusy queries are kept in 'bodies'.
+    """
+
+    def __init__(self, calendars):
+        self.calendars = calendars   # dict cal_id -> events
+        self.bodies = [ ]
+
+    def calendarList(self):
+        return self
+
+    def events(self):
+        return self
+
+    def freebusy(self):
+        return self
+
+    def list(self, calendarId=None, maxResults=2500, pageToken=None, **kwargs):
+        if calendarId is None:
+            return Request({ "items": [
+                { "kind": "calendar#calendarListEntry", "id": cal_id,
+                  "summary": cal_id, "selected": True, "primary": i == 0 }
+                for i, cal_id in enumerate(self.calendars) ] })
+        events = self.calendars[calendarId]
+        first = int(pageToken or 0)
+        page = { "items": events[first:first + maxResults] }
+        if first + maxResults < len(events):
+            page["nextPageToken"] = str(first + maxResults)
+        return Request(page)
+
+    def query(self, body):
+        self.bodies.append(body)
+        calendars = { }
+        for item in body["items"]:
+            calendars[item["id"]] = { "busy": [
+                { "start": event["start"]["dateTime"],
+                  "end": event["end"]["dateTime"] }
+                for event in self.calendars[item["id"]]
+                if "dateTime" in event["start"] ] }
+        return Request({ "calendars": calendars })
+
+
+def app():
+    """
+    flask_main's app, created with CONFIG on an in-memory database.
+    There is one app per process, so the first caller's CONFIG is
+    the one every test gets.
+    """
+    database.MongoClient = mongomock.MongoClient
+    import flask_main
+    flask_main.create_app(CONFIG)
+    return flask_main.app
@@ -0,0 +1,56 @@
+"""
+Tests for availability.py: slot masks and the best-slot selection.
+"""
+
+import numpy as np
+
+import availability
+
+
+def test_slots_fill_each_window():
+    grid = availability.Availability([ (0, 70), (1440, 1470) ])
+    # A trailing part-slot (60-70) is not a slot
+    assert grid.slots.tolist() == [ 0, 15, 30, 45, 1440, 1455 ]
+    assert availability.Availability([ ]).slots.tolist() == [ ]
+
+
+def test_mask_needs_the_whole_slot():
+    grid = availability.Availability([ (0, 60) ])
+    assert grid.slots.tolist() == [ 0, 15, 30, 45 ]
+    # 10-50 covers only the slot starting at 15 and the one at 30
+    assert grid.mask([ (10, 50) ]).tolist() == [ False, True, True, False ]
+    # A free interval ending exactly at a slot's end includes it
+    assert grid.mask([ (0, 15) ]).tolist() == [ True, False, False, False ]
+    assert grid.mask([ (45, 60) ]).tolist() == [ False, False, False, True ]
+
+
+def test_mask_merges_touching_intervals():
+    grid = availability.Availability([ (0, 60) ])
+    # 0-20 and 20-45 together cover 0-45, though neither covers 15-30
+    assert grid.mask([ (20, 45), (0, 20) ]).tolist() == [
+        True, True, True, False ]
+
+
+def test_mask_of_per_day_lists_and_nothing():
+    grid = availability.Availability([ (0, 30), (1440, 1470) ])
+    assert grid.mask([ [ (0, 30) ], [ ], ]).tolist() == [
+        True, True, False, False ]
+    assert grid.mask([ [ ], [ (1455, 1470) ] ]).tolist() == [
+        False, False, False, True ]
+    assert grid.mask([ ]).tolist() == [ False ] * 4
+
+
+def test_best_indices_breaks_ties_by_index():
+    counts = np.array([ 1, 3, 2, 3, 0, 3, 2 ])
+    assert availability.best_indices(counts, 2).tolist() == [ 1, 3 ]
+    assert availability.best_indices(counts, 4).tolist() == [ 1, 3, 5, 2 ]
+    assert availability.best_indices(counts, 10).tolist() == [
+        1, 3, 5, 2, 6, 0 ]
+
+
+def test_best_indices_at_least():
+    counts = np.array([ 1, 3, 2, 3, 0 ])
+    assert availability.best_indices(counts, 5, at_least=2).tolist() == [
+        1, 3, 2 ]
+    assert availability.best_indices(counts, 5, at_least=4).tolist() == [ ]
+    assert availability.best_indices(np.zeros(0, dtype=int), 3).tolist() == [ ]
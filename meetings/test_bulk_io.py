@@ -0,0 +1,121 @@
+"""
+Tests for bulk_io.py, export_db.py and import_db.py, on mongomock.
+"""
+
+import io
+import os
+import runpy
+import sys
+from datetime import datetime
+
+import bson
+import mongomock
+from pymongo import ReplaceOne
+
+import bulk_io
+import config
+import database
+import stubs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DOCUMENTS = [
+    { "_id": bson.ObjectId(), "name": "Review", "pw": "",
+      "created": datetime(2017, 11, 27, 9, 30),
+      "freeTime": { "starts": [ 25196820 ], "ends": [ 25196880 ] } },
+    { "_id": bson.ObjectId(), "name": "Standup", "comments": [ None ] },
+    { "_id": "not an ObjectId", "version": 3 },
+]
+
+
+def collection():
+    db = mongomock.MongoClient().db
+    db.meetings.insert_many([ dict(document) for document in DOCUMENTS ])
+    return db.meetings
+
+
+def round_trip(fmt):
+    out = io.BytesIO()
+    exported = bulk_io.export_collection(collection(), out, fmt,
+                                         batch_size=2)
+    assert exported.docs == len(DOCUMENTS)
+    target = mongomock.MongoClient().db.meetings
+    imported = bulk_io.import_collection(target, io.BytesIO(out.getvalue()),
+                                         fmt, batch_size=2)
+    assert imported.docs == len(DOCUMENTS)
+    return list(target.find())
+
+
+def test_jsonl_round_trip():
+    # ObjectIds and dates come back as such, not as strings
+    assert round_trip("jsonl") == DOCUMENTS
+
+
+def test_bson_round_trip():
+    assert round_trip("bson") == DOCUMENTS
+
+
+def test_import_skips_documents_already_there():
+    target = collection()
+    target.update_one({ "name": "Review" }, { "$set": { "name": "Edited" } })
+    out = io.BytesIO()
+    bulk_io.export_collection(collection(), out, "jsonl")
+    added = dict(DOCUMENTS[1], _id=bson.ObjectId())
+    out.write(bulk_io.json_util.dumps(added).encode() + b"\n")
+    progress = bulk_io.import_collection(target, io.BytesIO(out.getvalue()))
+    assert progress.skipped == len(DOCUMENTS)
+    assert target.count_documents({ }) == len(DOCUMENTS) + 1
+    assert target.find_one({ "_id": DOCUMENTS[0]["_id"] })["name"] == "Edited"
+
+
+def replace_one_by_one(monkeypatch):
+    """
+    mongomock's bulk_write can't take pymongo's ReplaceOne since 4.9
+    (it has a 'sort' it doesn't know); send each as replace_one
+    """
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            assert isinstance(request, ReplaceOne)
+            self.replace_one(request._filter, request._doc,
+                             upsert=request._upsert)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write",
+                        bulk_write)
+
+
+def test_upsert_replaces_documents_already_there(monkeypatch):
+    replace_one_by_one(monkeypatch)
+    target = collection()
+    target.update_one({ "name": "Review" }, { "$set": { "name": "Edited" } })
+    out = io.BytesIO()
+    bulk_io.export_collection(collection(), out, "bson")
+    progress = bulk_io.import_collection(target, io.BytesIO(out.getvalue()),
+                                         "bson", upsert=True)
+    assert progress.skipped == 0
+    assert list(target.find()) == DOCUMENTS
+
+
+def run_script(monkeypatch, name, *args):
+    """Run export_db.py or import_db.py on the app's database"""
+    monkeypatch.setattr(config, "configuration",
+                        lambda proxied=False: stubs.CONFIG)
+    monkeypatch.setattr(sys, "argv", [ name ] + list(args))
+    runpy.run_path(os.path.join(HERE, name), run_name="__main__")
+
+
+def test_export_and_import_scripts(monkeypatch, tmp_path):
+    replace_one_by_one(monkeypatch)
+    stubs.app()
+    db = database.get_db()
+    db.bulk_source.delete_many({ })
+    db.bulk_target.delete_many({ })
+    db.bulk_source.insert_many([ dict(document) for document in DOCUMENTS ])
+    db.bulk_target.insert_one({ "_id": DOCUMENTS[2]["_id"], "stale": True })
+    path = str(tmp_path / "export.bson")
+    run_script(monkeypatch, "export_db.py", "--collection", "bulk_source",
+               "--format", "bson", path)
+    run_script(monkeypatch, "import_db.py", "--collection", "bulk_target",
+               "--format", "bson", "--upsert", path)
+    assert db.bulk_target.count_documents({ }) == len(DOCUMENTS)
+    for document in DOCUMENTS:
+        assert db.bulk_target.find_one({ "_id": document["_id"] }) == document
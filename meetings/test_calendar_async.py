@@ -0,0 +1,148 @@
+"""
+Tests for calendar_async.py and the async views of flask_main,
+against mock_calendar.py served on a local port.
+"""
+
+import asyncio
+import datetime
+import threading
+from datetime import date, time, timedelta
+
+from aiohttp import web
+from oauth2client import client
+
+import calendar_async
+import freetime
+import meeting_repo
+import mock_calendar
+import stubs
+import timeparse
+
+CALENDARS = 3
+TIME_MIN = "2017-11-27T09:00:00-08:00"
+TIME_MAX = "2017-11-27T17:00:01-08:00"
+
+server = { }
+
+
+def setup_module():
+    """mock_calendar in a thread of its own, on a free port"""
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(mock_calendar.make_app(CALENDARS, 0, 2))
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server.update(loop=loop, runner=runner, thread=thread,
+                  url="http://127.0.0.1:{}/calendar/v3".format(port))
+
+
+def teardown_module():
+    loop = server["loop"]
+    loop.call_soon_threadsafe(loop.stop)
+    server["thread"].join()
+    loop.run_until_complete(server["runner"].cleanup())
+    loop.close()
+
+
+def calendar_client():
+    return calendar_async.CalendarClient("token", base_url=server["url"])
+
+
+def test_client_follows_pages():
+    async def fetch():
+        async with calendar_client() as cal:
+            calendars = await cal.calendar_list()
+            events = await cal.events_for(
+                [ entry["id"] for entry in calendars ], TIME_MIN, TIME_MAX)
+        return calendars, events
+
+    calendars, events = asyncio.run(fetch())
+    assert [ entry["id"] for entry in calendars ] == (
+        mock_calendar.calendar_ids(CALENDARS))
+    # Pages of 2 events; each calendar has three in the day
+    for i, cal_id in enumerate(mock_calendar.calendar_ids(CALENDARS)):
+        assert events[cal_id] == mock_calendar.make_events(
+            cal_id, TIME_MIN, TIME_MAX, timedelta(minutes=30 * i))
+        assert len(events[cal_id]) == 3
+
+
+def test_client_raises_calendar_errors():
+    async def fetch():
+        async with calendar_client() as cal:
+            return await cal.events("missing@example.com", TIME_MIN, TIME_MAX)
+
+    try:
+        asyncio.run(fetch())
+    except calendar_async.CalendarError as err:
+        assert err.status == 404
+    else:
+        raise AssertionError("CalendarError not raised")
+
+
+def async_web(monkeypatch):
+    """
+    A test client whose session has credentials, with the async
+    views in place as if ASYNC_CALENDAR were on.
+    """
+    app = stubs.app()
+    import flask_main
+    monkeypatch.setattr(flask_main, "CALENDAR_API_URL", server["url"],
+                        raising=False)
+    for name, view in (("choose", flask_main.choose_async),
+                       ("addMemo", flask_main.add_memo_async),
+                       ("setrange", flask_main.setrange_async)):
+        monkeypatch.setitem(app.view_functions, name, view)
+    credentials = client.OAuth2Credentials(
+        "token", "client", "secret", "refresh",
+        datetime.datetime.utcnow() + timedelta(hours=1),
+        "https://oauth2.googleapis.com/token", "test")
+    web = app.test_client()
+    with web.session_transaction() as session:
+        session["credentials"] = credentials.to_json()
+    return web
+
+
+def free_minutes(*hours):
+    """Epoch minutes of local hours on 2017-11-27, in pairs"""
+    local = timeparse.local_tz()
+    minutes = [ freetime.local_minutes(date(2017, 11, 27), time(hour), local)
+                for hour in hours ]
+    return minutes[0::2], minutes[1::2]
+
+
+def test_setrange_async_saves_the_meeting(monkeypatch):
+    web = async_web(monkeypatch)
+    response = web.post("/setrange", data={
+        "daterange": "11/27/2017 - 11/27/2017", "start": "9:00",
+        "end": "17:00", "title": "async", "pw": "" })
+    assert response.status_code == 200
+    import flask_main
+    record = flask_main.collection.find_one({ "name": "async" })
+    assert record["owner"] == "primary@example.com"
+    # Busy 9-11, 12-14 and 15-17 between the three calendars
+    starts, ends = free_minutes(11, 12, 14, 15)
+    assert record["freeTime"] == { "starts": starts, "ends": ends }
+
+
+def test_add_memo_async_answers_with_the_meeting(monkeypatch):
+    web = async_web(monkeypatch)
+    web.post("/setrange", data={
+        "daterange": "11/27/2017 - 11/27/2017", "start": "9:00",
+        "end": "17:00", "title": "first", "pw": "" })
+    response = web.get("/_add_Meeting")
+    assert response.status_code == 200
+    assert response.json["result"] == "Done"
+    import flask_main
+    record = meeting_repo.get(flask_main.collection, response.json["meeting"])
+    assert record["freeTime"]["starts"] == free_minutes(11, 12, 14, 15)[0]
+
+
+def test_async_views_need_credentials(monkeypatch):
+    web = async_web(monkeypatch)
+    with web.session_transaction() as session:
+        del session["credentials"]
+    assert web.get("/_add_Meeting").status_code == 302
+    assert web.get("/choose").status_code == 302
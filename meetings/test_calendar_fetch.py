@@ -0,0 +1,205 @@
+"""
+Tests for calendar_fetch.py.  fetch_batched runs against the real
+Calendar API client, built from the bundled discovery document, with
+a stub in place of httplib2 that answers multipart batch requests
+from a few made-up calendars; the rest against a stub of the service
+object that pages through the same calendars.
+"""
+
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse
+
+import httplib2
+from googleapiclient import discovery
+from googleapiclient.errors import HttpError
+
+import calendar_fetch
+import gcal_service
+
+TIME_MIN = "2017-11-27T09:00:00-08:00"
+TIME_MAX = "2017-11-28T17:00:01-08:00"
+
+EVENTS = {
+    "a@example.com": [ { "id": "a{}".format(i) } for i in range(5) ],
+    "b@example.com": [ ],
+    "c@example.com": [ { "id": "c{}".format(i) } for i in range(2) ],
+}
+MISSING = "missing@example.com"   # answered with a 404
+
+RESPONSE_BOUNDARY = "response_boundary"
+
+
+class StubBatchHttp:
+    """
+    Stands in for httplib2.Http under the API client.  Takes only
+    batch requests; each events.list call in one is answered with
+    a page of EVENTS, its pageToken being the index of the page's
+    first event.  'requests' holds the calendars of each batch.
+    """
+
+    def __init__(self):
+        self.requests = [ ]
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        assert "/batch" in uri, uri
+        boundary = re.search(r'boundary="?([^";]+)',
+                             headers["content-type"]).group(1)
+        parts = body.split("--" + boundary)[1:-1]
+        calendars = [ ]
+        answers = [ ]
+        for part in parts:
+            content_id = re.search(r"Content-ID: <(.*)>", part).group(1)
+            url = urlparse(re.search(r"GET (\S+) HTTP/1.1", part).group(1))
+            query = parse_qs(url.query)
+            cal_id = unquote(url.path.split("/calendars/")[1].split("/")[0])
+            calendars.append(cal_id)
+            status, payload = self._page(cal_id, query)
+            data = json.dumps(payload)
+            answers.append(
+                "--{}\r\nContent-Type: application/http\r\n"
+                "Content-ID: <response-{}>\r\n\r\n"
+                "HTTP/1.1 {}\r\nContent-Type: application/json\r\n"
+                "Content-Length: {}\r\n\r\n{}\r\n".format(
+                    RESPONSE_BOUNDARY, content_id, status, len(data), data))
+        self.requests.append(calendars)
+        content = "".join(answers) + "--{}--".format(RESPONSE_BOUNDARY)
+        return httplib2.Response({
+            "status": "200",
+            "content-type": 'multipart/mixed; boundary="{}"'.format(
+                RESPONSE_BOUNDARY) }), content.encode()
+
+    def _page(self, cal_id, query):
+        if cal_id not in EVENTS:
+            return "404 Not Found", { "error": { "code": 404,
+                                                 "message": "Not Found" } }
+        first = int(query.get("pageToken", [ "0" ])[0])
+        size = int(query["maxResults"][0])
+        payload = { "items": EVENTS[cal_id][first:first + size] }
+        if first + size < len(EVENTS[cal_id]):
+            payload["nextPageToken"] = str(first + size)
+        return "200 OK", payload
+
+
+def stub_service():
+    http = StubBatchHttp()
+    service = discovery.build_from_document(gcal_service.discovery_document(),
+                                            http=http)
+    return service, http
+
+
+def test_fetch_batched_follows_pages():
+    service, http = stub_service()
+    results = calendar_fetch.fetch_batched(service, list(EVENTS), TIME_MIN,
+                                           TIME_MAX, page_size=2)
+    assert results == EVENTS
+    # Pages of 2: a needs three rounds, c one; b has nothing
+    assert http.requests == [ [ "a@example.com", "b@example.com",
+                                "c@example.com" ],
+                              [ "a@example.com" ], [ "a@example.com" ] ]
+
+
+def test_fetch_batched_splits_large_batches():
+    service, http = stub_service()
+    results = calendar_fetch.fetch_batched(service, list(EVENTS), TIME_MIN,
+                                           TIME_MAX, max_batch=2)
+    assert results == EVENTS
+    assert http.requests == [ [ "a@example.com", "b@example.com" ],
+                              [ "c@example.com" ] ]
+
+
+def test_fetch_batched_raises_calendar_errors():
+    service, _ = stub_service()
+    try:
+        calendar_fetch.fetch_batched(service, [ "a@example.com", MISSING ],
+                                     TIME_MIN, TIME_MAX)
+    except HttpError as err:
+        assert err.resp.status == 404
+    else:
+        raise AssertionError("HttpError not raised")
+
+
+class StubEvents:
+    """events().list(...).execute() over EVENTS, two items a page"""
+
+    def list(self, calendarId, pageToken=None, **kwargs):
+        self.calendar = calendarId
+        self.first = int(pageToken or 0)
+        return self
+
+    def execute(self):
+        items = EVENTS[self.calendar]
+        page = { "items": items[self.first:self.first + 2] }
+        if self.first + 2 < len(items):
+            page["nextPageToken"] = str(self.first + 2)
+        return page
+
+
+class StubService:
+    def events(self):
+        return StubEvents()
+
+
+def test_list_items_follows_pages():
+    for cal_id, events in EVENTS.items():
+        assert calendar_fetch.list_items(StubService(), cal_id, TIME_MIN,
+                                         TIME_MAX) == events
+
+
+def test_iter_items_requests_pages_as_they_are_reached():
+    pages = [ ]
+
+    class CountingService:
+        def events(self):
+            pages.append(1)
+            return StubEvents()
+
+    items = calendar_fetch.iter_items(CountingService(), "a@example.com",
+                                      TIME_MIN, TIME_MAX)
+    assert next(items) == EVENTS["a@example.com"][0]
+    assert len(pages) == 1
+    assert list(items) == EVENTS["a@example.com"][1:]
+    assert len(pages) == 3
+
+
+def test_fetch_all_gets_every_calendar():
+    for workers in (1, 3):
+        assert calendar_fetch.fetch_all(list(EVENTS), StubService, TIME_MIN,
+                                        TIME_MAX, max_workers=workers) == (
+            EVENTS)
+
+
+def test_fetch_all_timeout_covers_all_calendars():
+    release = threading.Event()
+
+    class StuckEvents(StubEvents):
+        def execute(self):
+            if self.calendar != "a@example.com":
+                release.wait(5)
+            return super().execute()
+
+    class StuckService:
+        def events(self):
+            return StuckEvents()
+
+    start = time.monotonic()
+    try:
+        results = calendar_fetch.fetch_all(list(EVENTS), StuckService,
+                                           TIME_MIN, TIME_MAX, max_workers=3,
+                                           timeout=0.2)
+    finally:
+        release.set()
+    # One wait for the lot, not 0.2 seconds for each stuck calendar
+    assert time.monotonic() - start < 0.35
+    assert results == { "a@example.com": EVENTS["a@example.com"],
+                        "b@example.com": [ ], "c@example.com": [ ] }
+
+
+def test_fetch_all_matches_fetch_batched():
+    service, _ = stub_service()
+    assert calendar_fetch.fetch_all(list(EVENTS), StubService, TIME_MIN,
+                                    TIME_MAX) == (
+        calendar_fetch.fetch_batched(service, list(EVENTS), TIME_MIN,
+                                     TIME_MAX))
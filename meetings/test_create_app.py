@@ -0,0 +1,72 @@
+"""
+Tests for flask_main's startup: what importing it loads, and
+create_app, called directly or on the first request.  Each runs in
+a fresh interpreter, since the app is made once per process.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY = ("numpy", "dateutil", "arrow", "oauth2client", "googleapiclient",
+         "aiohttp", "profiling", "http_pool")
+
+SETUP = """
+import json, sys
+import mongomock
+import database, stubs
+database.MongoClient = mongomock.MongoClient
+import flask_main
+reads = [ ]
+def configuration(proxied=False):
+    reads.append(proxied)
+    return stubs.CONFIG
+flask_main.configuration = configuration
+def loaded():
+    return [ name for name in {} if name in sys.modules ]
+""".format(HEAVY)
+
+
+def run(code):
+    """What code, run after SETUP in a new interpreter, prints (JSON)"""
+    proc = subprocess.run([ sys.executable, "-c", SETUP + code ], cwd=HERE,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def test_import_loads_no_heavy_modules():
+    assert run("print(json.dumps(loaded()))") == [ ]
+
+
+def test_first_request_creates_the_app():
+    result = run("""
+before = flask_main.app.config.get("CREATED", False)
+status = flask_main.app.test_client().get("/index").status_code
+flask_main.create_app()
+print(json.dumps([ before, status, reads ]))
+""")
+    # Configured once, from the .ini files as under gunicorn
+    assert result == [ False, 200, [ True ] ]
+
+
+def test_create_app_leaves_the_google_client_for_later():
+    loaded = run("""
+flask_main.create_app(stubs.CONFIG)
+print(json.dumps(loaded()))
+""")
+    assert not set(loaded) & { "numpy", "arrow", "oauth2client",
+                               "googleapiclient", "aiohttp", "profiling" }
+
+
+def test_preload_imports_ahead_of_time():
+    loaded = run("""
+flask_main.create_app(stubs.CONFIG, preload=True)
+print(json.dumps(loaded()))
+""")
+    assert set(loaded) >= { "numpy", "arrow", "oauth2client",
+                            "googleapiclient", "http_pool" }
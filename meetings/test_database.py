@@ -0,0 +1,105 @@
+"""
+Tests for database.py, with MongoClient replaced by a stub that
+records how it was made.
+"""
+
+import argparse
+
+import database
+
+
+class StubClient:
+    def __init__(self, url, **options):
+        self.url = url
+        self.options = options
+
+    def __getitem__(self, db_name):
+        # A database whose collections are dicts naming themselves
+        return StubDatabase(db_name)
+
+
+class StubDatabase:
+    def __init__(self, name):
+        self.name = name
+
+    def __getitem__(self, name):
+        return { "db": self.name, "name": name }
+
+
+CONFIG = argparse.Namespace(DB_USER="user", DB_USER_PW="pw",
+                            DB_HOST="db.example.com", DB_PORT=27017,
+                            DB="meetings", DB_POOL_SIZE=20,
+                            DB_TIMEOUT_MS=3000, DB_WRITE_CONCERN="",
+                            DB_WAIT_TIMEOUT_MS=None)
+
+
+def fresh(monkeypatch):
+    """database as in a new process, making StubClients"""
+    for name in ("_client", "_pid", "_url", "_db_name"):
+        monkeypatch.setattr(database, name, None)
+    monkeypatch.setattr(database, "_options", { })
+    monkeypatch.setattr(database, "MongoClient", StubClient)
+
+
+def test_client_needs_configure(monkeypatch):
+    fresh(monkeypatch)
+    try:
+        database.client()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("RuntimeError not raised")
+
+
+def test_settings_become_client_options(monkeypatch):
+    fresh(monkeypatch)
+    database.configure(CONFIG)
+    client = database.client()
+    assert client.url == "mongodb://user:pw@db.example.com:27017/meetings"
+    # Empty and missing settings keep pymongo's defaults
+    assert client.options == { "maxPoolSize": 20,
+                               "serverSelectionTimeoutMS": 3000,
+                               "connectTimeoutMS": 3000,
+                               "event_listeners": [ database.STATS ] }
+
+
+def test_one_client_per_process(monkeypatch):
+    fresh(monkeypatch)
+    database.configure(CONFIG)
+    client = database.client()
+    assert database.client() is client
+    # As seen by a forked child: the client was made by another pid
+    monkeypatch.setattr(database, "_pid", -1)
+    assert database.client() is not client
+
+
+def test_lazy_collection_connects_on_use(monkeypatch):
+    fresh(monkeypatch)
+    sessions = database.LazyCollection("sessions")
+    assert repr(sessions) == "LazyCollection('sessions')"
+    assert database._client is None
+    database.configure(CONFIG)
+    assert sessions.get("db") == "meetings"
+    assert sessions.get("name") == "sessions"
+    assert database._client is not None
+
+
+class Event:
+    pass
+
+
+def test_pool_stats_count_connections():
+    stats = database.PoolStats()
+    for _ in range(2):
+        stats.connection_created(Event())
+    stats.connection_checked_out(Event())
+    stats.connection_checked_out(Event())
+    stats.connection_checked_in(Event())
+    stats.connection_check_out_failed(Event())
+    stats.connection_closed(Event())
+    snapshot = stats.snapshot()
+    assert snapshot["open"] == 1
+    assert snapshot["in_use"] == 1
+    assert snapshot["max_in_use"] == 2
+    assert snapshot["checkouts"] == 2
+    assert snapshot["checkout_failures"] == 1
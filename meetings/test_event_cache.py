@@ -0,0 +1,166 @@
+"""
+Tests for event_cache.py, with a stub Calendar service that can
+answer incremental (syncToken) queries.
+"""
+
+import time
+
+import httplib2
+import mongomock
+from googleapiclient.errors import HttpError
+
+import event_cache
+import stubs
+
+TIME_MIN = "2017-11-27T09:00:00-08:00"
+TIME_MAX = "2017-11-27T17:00:01-08:00"
+CAL_ID = "owner@example.com"
+
+
+def event(event_id, start, end, day=27, **fields):
+    """A timed event of November 2017, times given as "HH:MM" """
+    return dict({ "id": event_id,
+                  "start": { "dateTime": "2017-11-{}T{}:00-08:00".format(
+                      day, start) },
+                  "end": { "dateTime": "2017-11-{}T{}:00-08:00".format(
+                      day, end) } },
+                **fields)
+
+
+class StubCalendar:
+    """
+    events().list over 'stored'; a query with a syncToken gets
+    'changes' instead, or 410 Gone if 'gone' is set.  'queries'
+    holds the arguments of each call.
+    """
+
+    def __init__(self, events):
+        self.stored = events
+        self.changes = [ ]
+        self.gone = False
+        self.queries = [ ]
+
+    def events(self):
+        return self
+
+    def list(self, **query):
+        self.queries.append(query)
+        if "syncToken" not in query:
+            return stubs.Request({ "items": list(self.stored),
+                                   "nextSyncToken": "full" })
+        if self.gone:
+            raise HttpError(httplib2.Response({ "status": 410 }), b"Gone")
+        return stubs.Request({ "items": self.changes,
+                               "nextSyncToken": "sync" })
+
+
+def ids(items):
+    return [ item["id"] for item in items ]
+
+
+def test_served_from_cache_within_ttl():
+    service = StubCalendar([ event("b", "11:00", "12:00"),
+                             event("a", "09:00", "10:00") ])
+    cache = event_cache.EventCache(event_cache.MemoryBackend(), ttl=60)
+    # Sorted here: a query that yields a sync token can't be ordered
+    items = cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    assert ids(items) == [ "a", "b" ]
+    items = cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    assert ids(items) == [ "a", "b" ]
+    assert len(service.queries) == 1
+    # Another owner, or another window, is another entry
+    cache.items(service, CAL_ID, TIME_MIN, TIME_MAX, owner="someone")
+    assert len(service.queries) == 2
+
+
+def test_changes_are_merged():
+    service = StubCalendar([ event("a", "09:00", "10:00"),
+                             event("b", "11:00", "12:00"),
+                             event("c", "13:00", "14:00"),
+                             event("d", "15:00", "16:00") ])
+    cache = event_cache.EventCache(event_cache.MemoryBackend(), ttl=0)
+    cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    service.changes = [
+        event("a", "14:30", "15:00"),                         # moved
+        event("b", "11:00", "12:00", status="cancelled"),     # deleted
+        event("c", "13:00", "14:00", day=28),                 # moved out
+        event("e", "10:00", "10:30"),                         # new
+        event("f", "10:00", "10:30", status="cancelled"),     # never seen
+    ]
+    items = cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    assert ids(items) == [ "e", "a", "d" ]
+    assert service.queries[-1]["syncToken"] == "full"
+    assert "timeMin" not in service.queries[-1]
+    # The next round asks for changes since this one
+    service.changes = [ ]
+    cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    assert service.queries[-1]["syncToken"] == "sync"
+
+
+def test_gone_sync_token_fetches_everything():
+    service = StubCalendar([ event("a", "09:00", "10:00") ])
+    cache = event_cache.EventCache(event_cache.MemoryBackend(), ttl=0)
+    cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    service.stored.append(event("b", "11:00", "12:00"))
+    service.gone = True
+    items = cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    assert ids(items) == [ "a", "b" ]
+    assert [ "syncToken" in query for query in service.queries ] == [
+        False, True, False ]
+
+
+def test_other_errors_propagate():
+    service = StubCalendar([ ])
+    cache = event_cache.EventCache(event_cache.MemoryBackend(), ttl=0)
+    cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+
+    def forbidden(**query):
+        raise HttpError(httplib2.Response({ "status": 403 }), b"Forbidden")
+
+    service.list = forbidden
+    try:
+        cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    except HttpError as err:
+        assert err.resp.status == 403
+    else:
+        raise AssertionError("HttpError not raised")
+
+
+def test_memory_backend_drops_least_recent_and_expired():
+    backend = event_cache.MemoryBackend(size=2, expire=60)
+    now = time.time()
+    backend.put("a", { "fetched": now })
+    backend.put("b", { "fetched": now })
+    backend.get("a")
+    backend.put("c", { "fetched": now })
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    backend.put("old", { "fetched": now - 61 })
+    assert backend.get("old") is None
+
+
+def test_mongo_backend_expires_with_a_ttl_index():
+    collection = mongomock.MongoClient().db.events
+    backend = event_cache.MongoBackend(collection, expire=60)
+    backend.put("a", { "items": [ ], "syncToken": "t", "fetched": 1 })
+    assert backend.get("a")["syncToken"] == "t"
+    assert collection.index_information()["stored_1"][
+        "expireAfterSeconds"] == 60
+    # Stored long ago, as the TTL monitor would find it
+    collection.update_one({ "_id": "a" }, { "$set": { "stored":
+        collection.find_one({ "_id": "a" })["stored"].replace(year=2000) } })
+    assert backend.get("a") is None
+
+
+def test_free_time_leaves_cached_events_alone():
+    app = stubs.app()
+    import flask_main
+    service = StubCalendar([ event("a", "09:00", "10:00") ])
+    cache = event_cache.EventCache(event_cache.MemoryBackend(), ttl=60)
+    items = cache.items(service, CAL_ID, TIME_MIN, TIME_MAX)
+    with app.test_request_context():
+        shown = flask_main.get_next_free_time(TIME_MIN, TIME_MAX,
+                                              { "items": items })
+    assert "readStart" in shown[0]
+    assert "readStart" not in cache.items(service, CAL_ID, TIME_MIN,
+                                          TIME_MAX)[0]
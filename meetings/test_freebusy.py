@@ -0,0 +1,62 @@
+"""
+Tests for freebusy.py, against a recorded freebusy response.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+import freebusy
+from stubs import StubService
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESPONSE_FILE = os.path.join(HERE, "testdata", "freebusy_response.json")
+
+
+def utc_minutes(*fields):
+    return int(datetime(*fields, tzinfo=timezone.utc).timestamp()) // 60
+
+
+def recorded_response():
+    with open(RESPONSE_FILE) as f:
+        return json.load(f)
+
+
+def test_busy_intervals_merges_calendars():
+    # Overlapping busy times of the two calendars become one interval;
+    # the calendar reported with errors is skipped
+    assert freebusy.busy_intervals([ recorded_response() ]) == [
+        (utc_minutes(2017, 11, 27, 18, 0), utc_minutes(2017, 11, 27, 20, 0)),
+        (utc_minutes(2017, 11, 27, 21, 30), utc_minutes(2017, 11, 27, 22, 0)),
+        (utc_minutes(2017, 11, 28, 17, 0), utc_minutes(2017, 11, 28, 18, 0)),
+    ]
+
+
+def test_busy_intervals_across_responses():
+    response = recorded_response()
+    owner = { "calendars": { "owner@example.com":
+                             response["calendars"]["owner@example.com"] } }
+    team = { "calendars": { "team@group.calendar.google.com":
+                            response["calendars"]["team@group.calendar.google.com"] } }
+    assert (freebusy.busy_intervals([ owner, team ])
+            == freebusy.busy_intervals([ response ]))
+
+
+def test_busy_intervals_empty():
+    assert freebusy.busy_intervals([ ]) == [ ]
+    assert freebusy.busy_intervals([ { "calendars": { } } ]) == [ ]
+
+
+def test_query_splits_large_calendar_lists():
+    cal_ids = [ "cal{}@example.com".format(i)
+                for i in range(freebusy.MAX_CALENDARS + 1) ]
+    service = StubService({ cal_id: [ ] for cal_id in cal_ids })
+    responses = freebusy.query(service, cal_ids, "2017-11-27T17:00:00Z",
+                               "2017-11-29T01:00:01Z")
+    assert len(responses) == 2
+    assert [ len(body["items"]) for body in service.bodies ] == [
+        freebusy.MAX_CALENDARS, 1 ]
+    assert all(body["timeMin"] == "2017-11-27T17:00:00Z"
+               for body in service.bodies)
+    assert [ item["id"] for body in service.bodies
+             for item in body["items"] ] == cal_ids
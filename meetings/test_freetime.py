@@ -0,0 +1,132 @@
+"""
+Tests for the free-time engine (freetime.py).
+
+The sweep is checked against a brute-force count of free minutes
+over random calendars, including days when daylight saving time
+starts or ends and all-day events.
+"""
+
+import random
+from datetime import date, datetime, time, timedelta
+
+import freetime
+import timeparse
+
+PACIFIC = timeparse.get_tz("America/Los_Angeles")
+
+
+def random_events(rng, first, last, tzinfo, count):
+    """Google-style events (timed and all-day) in start order"""
+    events = [ ]
+    days = (last - first).days + 1
+    for _ in range(count):
+        day = first + timedelta(days=rng.randrange(days))
+        if rng.random() < 0.15:
+            end = day + timedelta(days=rng.choice((1, 1, 2)))
+            events.append({ "start": { "date": day.isoformat() },
+                            "end": { "date": end.isoformat() } })
+            continue
+        start = datetime.combine(day, time(rng.randrange(24),
+                                           rng.choice((0, 15, 30, 45))),
+                                 tzinfo)
+        end = start + timedelta(minutes=rng.choice((15, 30, 60, 90, 240)))
+        event = { "start": { "dateTime": start.isoformat() },
+                  "end": { "dateTime": end.isoformat() } }
+        if rng.random() < 0.1:
+            event["transparency"] = "transparent"
+        events.append(event)
+    events.sort(key=lambda event: freetime.event_interval(event, tzinfo)
+                or (0, 0))
+    return events
+
+
+def brute_force_free(windows, events, tzinfo):
+    """(window index, start, end) free runs, minute by minute"""
+    busy = set()
+    for event in events:
+        interval = freetime.event_interval(event, tzinfo)
+        if interval:
+            busy.update(range(*interval))
+    free = [ ]
+    for index, (start, end) in enumerate(windows):
+        run = None
+        for minute in range(start, end):
+            if minute in busy:
+                if run is not None:
+                    free.append((index, run, minute))
+                    run = None
+            elif run is None:
+                run = minute
+        if run is not None:
+            free.append((index, run, end))
+    return free
+
+
+def check_against_brute_force(first, last, begin, end, seed):
+    rng = random.Random(seed)
+    windows = freetime.daily_windows(first, last, begin, end, PACIFIC)
+    events = random_events(rng, first, last, PACIFIC, rng.randrange(0, 40))
+    busy = freetime.stream_intervals(iter(events), PACIFIC)
+    assert (list(freetime.stream_free(windows, busy))
+            == brute_force_free(windows, events, PACIFIC))
+
+
+def test_stream_free_matches_brute_force():
+    for seed in range(50):
+        check_against_brute_force(date(2017, 11, 27), date(2017, 12, 3),
+                                  time(9), time(17), seed)
+
+
+def test_stream_free_across_dst_end():
+    # Clocks go back at 02:00 on 2026-11-01
+    for seed in range(50):
+        check_against_brute_force(date(2026, 10, 30), date(2026, 11, 3),
+                                  time(0, 30), time(3, 30), seed)
+        check_against_brute_force(date(2026, 10, 30), date(2026, 11, 3),
+                                  time(8), time(18), seed)
+
+
+def test_stream_free_across_dst_start():
+    # Clocks go forward at 02:00 on 2026-03-08
+    for seed in range(50):
+        check_against_brute_force(date(2026, 3, 6), date(2026, 3, 10),
+                                  time(1), time(4), seed)
+
+
+def test_stream_free_without_busy_times():
+    windows = [ (0, 60), (120, 180) ]
+    assert list(freetime.stream_free(windows, iter([ ]))) == [
+        (0, 0, 60), (1, 120, 180) ]
+    assert list(freetime.stream_free([ ], iter([ (0, 10) ]))) == [ ]
+
+
+def test_daily_windows_keep_wall_clock_times_over_dst():
+    windows = freetime.daily_windows(date(2026, 10, 31), date(2026, 11, 2),
+                                     time(0), time(3), PACIFIC)
+    # The repeated hour makes 2026-11-01 an hour longer
+    assert [ (end - start) // 60 for start, end in windows ] == [ 3, 4, 3 ]
+    for (start, _), day in zip(windows, (31, 1, 2)):
+        opens = freetime.from_minutes(start, PACIFIC)
+        assert (opens.day, opens.hour, opens.minute) == (day, 0, 0)
+    windows = freetime.daily_windows(date(2026, 3, 7), date(2026, 3, 9),
+                                     time(1), time(4), PACIFIC)
+    assert [ (end - start) // 60 for start, end in windows ] == [ 3, 2, 3 ]
+
+
+def test_skipped_time_moves_forward():
+    minutes = freetime.local_minutes(date(2026, 3, 8), time(2, 30), PACIFIC)
+    assert freetime.from_minutes(minutes, PACIFIC).isoformat() == (
+        "2026-03-08T03:30:00-07:00")
+
+
+def test_all_day_event_on_dst_day_covers_whole_day():
+    event = { "start": { "date": "2026-11-01" },
+              "end": { "date": "2026-11-02" } }
+    start, end = freetime.event_interval(event, PACIFIC)
+    assert end - start == 25 * 60
+
+
+def test_merge_intervals():
+    assert freetime.merge_intervals([ (5, 8), (0, 2), (2, 3), (7, 9), (12, 13) ]) == [
+        (0, 3), (5, 9), (12, 13) ]
+    assert freetime.merge_intervals([ ]) == [ ]
@@ -0,0 +1,78 @@
+"""
+Tests for gcal_service.py's ServiceCache, with build() replaced by a
+stub that counts the service objects made.
+"""
+
+import datetime
+import threading
+
+import gcal_service
+
+
+class Credentials:
+    def __init__(self, token, expires_in=3600):
+        self.access_token = token
+        self.token_expiry = (datetime.datetime.utcnow()
+                             + datetime.timedelta(seconds=expires_in))
+
+
+def counting_build(monkeypatch):
+    built = [ ]
+
+    def build(credentials, timeout=None):
+        built.append((credentials.access_token, timeout))
+        return object()
+
+    monkeypatch.setattr(gcal_service, "build", build)
+    return built
+
+
+def test_service_is_reused_for_a_token(monkeypatch):
+    built = counting_build(monkeypatch)
+    cache = gcal_service.ServiceCache()
+    alice = Credentials("alice")
+    service = cache.get(alice)
+    assert cache.get(alice) is service
+    assert cache.get(Credentials("alice")) is service
+    # Another timeout is another service
+    assert cache.get(alice, timeout=5) is not service
+    assert built == [ ("alice", None), ("alice", 5) ]
+
+
+def test_expired_token_is_not_served(monkeypatch):
+    built = counting_build(monkeypatch)
+    cache = gcal_service.ServiceCache()
+    stale = Credentials("alice", expires_in=-1)
+    first = cache.get(stale)
+    assert cache.get(stale) is not first
+    assert len(built) == 2
+    # No expiry known: kept
+    forever = Credentials("bob")
+    forever.token_expiry = None
+    assert cache.get(forever) is cache.get(forever)
+
+
+def test_least_recently_used_is_dropped(monkeypatch):
+    built = counting_build(monkeypatch)
+    cache = gcal_service.ServiceCache(size=2)
+    a, b, c = Credentials("a"), Credentials("b"), Credentials("c")
+    first_a = cache.get(a)
+    cache.get(b)
+    cache.get(a)
+    cache.get(c)                     # drops b
+    assert cache.get(a) is first_a
+    cache.get(b)
+    assert [ token for token, _ in built ] == [ "a", "b", "c", "b" ]
+
+
+def test_each_thread_gets_its_own(monkeypatch):
+    counting_build(monkeypatch)
+    cache = gcal_service.ServiceCache()
+    alice = Credentials("alice")
+    mine = cache.get(alice)
+    theirs = [ ]
+    thread = threading.Thread(target=lambda: theirs.append(cache.get(alice)))
+    thread.start()
+    thread.join()
+    assert theirs[0] is not mine
+    assert cache.get(alice) is mine
@@ -0,0 +1,98 @@
+"""
+Tests for http_pool.py, against a keep-alive HTTP server on a local
+port that counts the connections made to it.
+"""
+
+import http.server
+import threading
+
+import http_pool
+
+server = { }
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+
+    def setup(self):
+        super().setup()
+        server["connections"] += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def setup_module():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    server.update(httpd=httpd, connections=0,
+                  url="http://127.0.0.1:{}/".format(httpd.server_port))
+
+
+def teardown_module():
+    server["httpd"].shutdown()
+    server["httpd"].server_close()
+
+
+def get(pool, timeout=None):
+    response, content = pool.http(timeout).request(server["url"])
+    assert response.status == 200 and content == b"ok"
+
+
+def test_services_on_a_thread_share_connections():
+    pool = http_pool.ConnectionPool()
+    before = server["connections"]
+    # A new PooledHttp for each request, as for each service object
+    for _ in range(3):
+        get(pool)
+    assert server["connections"] - before == 1
+    stats = pool.stats()
+    assert stats["requests"] == 3
+    assert stats["connects"] == 1
+    assert stats["connect_seconds"] > 0
+
+
+def test_threads_do_not_share_connections():
+    pool = http_pool.ConnectionPool()
+    get(pool)
+    tables = [ ]
+
+    def other():
+        get(pool)
+        tables.append(pool.connections())
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    thread.join()
+    assert tables[0] is not pool.connections()
+    assert pool.stats()["connects"] == 2
+
+
+def test_timeouts_have_their_own_connections():
+    pool = http_pool.ConnectionPool()
+    get(pool)
+    get(pool, timeout=5)
+    assert pool.connections(5) is not pool.connections()
+    assert [ conn.timeout for conn in pool.connections(5).values() ] == [ 5 ]
+    assert pool.stats()["connects"] == 2
+    get(pool, timeout=5)
+    assert pool.stats()["connects"] == 2
+
+
+def test_connections_are_made_again_after_fork():
+    pool = http_pool.ConnectionPool()
+    get(pool)
+    table = pool.connections()
+    # As seen by a forked child: the table was made by another pid
+    pool._local.pid = -1
+    assert pool.connections() is not table
+    get(pool)
+    assert pool.stats()["connects"] == 2
@@ -0,0 +1,61 @@
+"""
+Tests for intervals.py.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+import freetime
+import intervals
+
+PST = timezone(timedelta(hours=-8))
+
+
+def minutes(day, hour, minute=0):
+    """Epoch minutes of a November 2017 time in PST"""
+    return freetime.to_minutes(datetime(2017, 11, day, hour, minute,
+                                        tzinfo=PST))
+
+
+def test_document_round_trip():
+    free = intervals.Intervals([ (minutes(27, 9), minutes(27, 10)),
+                                 (minutes(28, 13), minutes(28, 17)) ])
+    document = free.to_document()
+    assert document == { "starts": [ minutes(27, 9), minutes(28, 13) ],
+                         "ends": [ minutes(27, 10), minutes(28, 17) ] }
+    assert intervals.Intervals.from_document(document) == free
+    assert len(free) == 2
+    assert free[1] == (minutes(28, 13), minutes(28, 17))
+    assert list(free) == [ (minutes(27, 9), minutes(27, 10)),
+                           (minutes(28, 13), minutes(28, 17)) ]
+
+
+def test_old_per_day_documents_are_read():
+    old = [ [ ("09:00", "10:30") ], [ ], [ ("13:00", "14:00"),
+                                          ("15:00", "17:00") ] ]
+    free = intervals.Intervals.from_document(old, "2017-11-27", PST)
+    assert list(free) == [ (minutes(27, 9), minutes(27, 10, 30)),
+                           (minutes(29, 13), minutes(29, 14)),
+                           (minutes(29, 15), minutes(29, 17)) ]
+    assert intervals.Intervals.from_document(
+        old, date(2017, 11, 27), PST) == free
+
+
+def test_empty_documents():
+    for document in (None, [ ], { }):
+        assert len(intervals.Intervals.from_document(document)) == 0
+
+
+def test_format():
+    free = intervals.Intervals([ (minutes(27, 9), minutes(27, 10, 30)) ])
+    assert free.format(PST) == [ "11/27 09:00-10:30" ]
+    assert free.format(PST, fmt="%H:%M") == [ "09:00-10:30" ]
+
+
+def test_equality_and_slots():
+    free = intervals.Intervals([ (1, 2) ])
+    assert free == intervals.Intervals([ (1, 2) ])
+    assert free != intervals.Intervals([ (1, 3) ])
+    assert free != [ (1, 2) ]
+    assert repr(free) == "Intervals([(1, 2)])"
+    # Two arrays, no per-instance dict
+    assert not hasattr(free, "__dict__")
@@ -0,0 +1,123 @@
+"""
+Tests for jobs.py on its in-memory and (mongomock) Mongo stores,
+and for thread_pool.py.
+"""
+
+import datetime
+import threading
+import time
+
+import mongomock
+
+import jobs
+import thread_pool
+
+
+def wait_until_finished(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.status(job_id)
+        if job["state"] in (jobs.DONE, jobs.FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("Job {} did not finish".format(job_id))
+
+
+def test_job_result_and_progress():
+    queue = jobs.JobQueue(jobs.MemoryJobStore())
+
+    def work(progress, a, b):
+        progress("adding")
+        return a + b
+
+    job = wait_until_finished(queue, queue.submit("sum", work, 2, 3))
+    assert job["state"] == jobs.DONE
+    assert job["result"] == 5
+    assert job["progress"] == "adding"
+
+
+def test_failed_job_keeps_its_error():
+    queue = jobs.JobQueue(jobs.MemoryJobStore())
+
+    def work(progress):
+        raise ValueError("no calendars")
+
+    job = wait_until_finished(queue, queue.submit("fail", work))
+    assert job["state"] == jobs.FAILED
+    assert job["error"] == "no calendars"
+
+
+def test_active_key_joins_running_job():
+    queue = jobs.JobQueue(jobs.MemoryJobStore())
+    release = threading.Event()
+    calls = [ ]
+
+    def work(progress):
+        calls.append(1)
+        release.wait(5)
+        return len(calls)
+
+    first = queue.submit("meeting", work)
+    assert queue.submit("meeting", work) == first
+    release.set()
+    assert wait_until_finished(queue, first)["result"] == 1
+    # Once finished, the key starts a new job
+    second = queue.submit("meeting", work)
+    assert second != first
+    assert wait_until_finished(queue, second)["result"] == 2
+
+
+def test_unknown_job():
+    queue = jobs.JobQueue(jobs.MemoryJobStore())
+    assert queue.status("nope") is None
+
+
+def test_memory_store_keeps_size_jobs():
+    store = jobs.MemoryJobStore(size=2)
+    ids = [ store.create(key)[0]["_id"] for key in ("a", "b", "c") ]
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2])["state"] == jobs.QUEUED
+    # The dropped job's key is free again
+    job, created = store.create("a")
+    assert created and job["_id"] != ids[0]
+
+
+def test_mongo_store_joins_active_jobs():
+    store = jobs.MongoJobStore(mongomock.MongoClient().db.jobs)
+    job, created = store.create("a")
+    assert created
+    existing, created = store.create("a")
+    assert not created and existing["_id"] == job["_id"]
+    store.update(job["_id"], state=jobs.DONE, result=1)
+    second, created = store.create("a")
+    assert created and second["_id"] != job["_id"]
+    assert store.get(job["_id"])["result"] == 1
+
+
+def test_mongo_store_frees_keys_of_dead_jobs():
+    collection = mongomock.MongoClient().db.jobs
+    store = jobs.MongoJobStore(collection, stale=60)
+    job, _ = store.create("a")
+    store.update(job["_id"], state=jobs.RUNNING)
+    # Its worker died a while ago, after its last update
+    collection.update_one({ "_id": job["_id"] }, { "$set": {
+        "updated": datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=61) } })
+    assert store.get(job["_id"])["state"] == jobs.FAILED
+    second, created = store.create("a")
+    assert created and second["_id"] != job["_id"]
+    assert "active_key" not in collection.find_one({ "_id": job["_id"] })
+    # A live job keeps its key
+    existing, created = store.create("a")
+    assert not created and existing["_id"] == second["_id"]
+
+
+def test_thread_pool_is_made_again_after_fork():
+    pool = thread_pool.ThreadPool(1)
+    first = pool.executor()
+    assert pool.executor() is first
+    assert pool.submit(sum, [ 1, 2 ]).result() == 3
+    # As seen by a forked child: the pool was made by another pid
+    pool._pid = -1
+    assert pool.executor() is not first
+    first.shutdown()
@@ -0,0 +1,37 @@
+"""
+Tests for lru.py.
+"""
+
+from lru import LRUCache
+
+
+def test_least_recently_used_goes_first():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1      # now b is the oldest
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_setdefault_keeps_the_first_value():
+    cache = LRUCache(2)
+    assert cache.setdefault("a", 1) == 1
+    assert cache.setdefault("a", 2) == 1
+    cache.setdefault("b", 2)
+    cache.setdefault("c", 3)
+    assert cache.get("a") is None
+
+
+def test_pop_and_pop_keys():
+    cache = LRUCache(4)
+    for key in [ ("page", "x"), ("page", "y"), ("index", "") ]:
+        cache.put(key, key[1])
+    assert cache.pop(("page", "x")) == "x"
+    assert cache.pop(("page", "x"), "gone") == "gone"
+    cache.pop_keys(lambda key: key[0] == "page")
+    assert len(cache) == 1
+    cache.clear()
+    assert cache.get(("index", "")) is None
@@ -0,0 +1,99 @@
+"""
+Tests for meeting_repo.py, on mongomock collections.
+"""
+
+import datetime
+
+import mongomock
+from bson.objectid import ObjectId
+
+import meeting_repo
+
+
+def meetings(count, owner="ann"):
+    """A collection of count meetings, created a minute apart"""
+    collection = mongomock.MongoClient().db.meetings
+    start = datetime.datetime(2017, 11, 27, 9)
+    for i in range(count):
+        meeting_repo.insert(collection, {
+            "name": "m{}".format(i), "owner": owner, "pw": "secret",
+            "freeTime": { "starts": [ ], "ends": [ ] },
+            "created": start + datetime.timedelta(minutes=i) })
+    return collection
+
+
+def names(summaries):
+    return [ summary["name"] for summary in summaries ]
+
+
+def test_pages_newest_first():
+    collection = meetings(5)
+    first = meeting_repo.list_summaries(collection, limit=2)
+    assert names(first) == [ "m4", "m3" ]
+    second = meeting_repo.list_summaries(
+        collection, before=str(first[-1]["_id"]), limit=2)
+    assert names(second) == [ "m2", "m1" ]
+    last = meeting_repo.list_summaries(
+        collection, before=str(second[-1]["_id"]), limit=2)
+    assert names(last) == [ "m0" ]
+
+
+def test_summaries_leave_out_the_heavy_fields():
+    summary = meeting_repo.list_summaries(meetings(1))[0]
+    assert "freeTime" not in summary and "pw" not in summary
+    assert summary["owner"] == "ann"
+
+
+def test_owner_and_bad_before():
+    collection = meetings(2)
+    meeting_repo.insert(collection, { "name": "bob's", "owner": "bob" })
+    assert names(meeting_repo.list_summaries(collection, owner="bob")) == [
+        "bob's" ]
+    # Not an id: the first page
+    assert len(meeting_repo.list_summaries(collection, before="junk")) == 3
+
+
+def test_meetings_stored_without_created_come_last():
+    collection = meetings(2)
+    old = [ collection.insert_one({ "name": "old{}".format(i) }).inserted_id
+            for i in range(2) ]
+    assert names(meeting_repo.list_summaries(collection)) == [
+        "m1", "m0", "old1", "old0" ]
+    page = meeting_repo.list_summaries(collection, limit=3)
+    assert names(meeting_repo.list_summaries(
+        collection, before=str(page[-1]["_id"]))) == [ "old0" ]
+    assert old[1] == page[-1]["_id"]
+
+
+def test_get_by_any_id():
+    collection = meetings(1)
+    meeting_id = collection.find_one()["_id"]
+    assert meeting_repo.get(collection, meeting_id)["name"] == "m0"
+    assert meeting_repo.get(collection, str(meeting_id))["name"] == "m0"
+    assert "pw" not in meeting_repo.get(collection, meeting_id, { "pw": 0 })
+    assert meeting_repo.get(collection, str(ObjectId())) is None
+    assert meeting_repo.get(collection, "junk") is None
+    assert meeting_repo.object_id(str(meeting_id)) == meeting_id
+    assert meeting_repo.object_id("junk") is None
+    assert meeting_repo.object_id("") is None
+
+
+def test_writes_bump_versions():
+    collection = meetings(1)
+    counters = mongomock.MongoClient().db.counters
+    meeting_id = collection.find_one()["_id"]
+    version, modified = meeting_repo.version(collection, meeting_id)
+    assert version == 1
+    meeting_repo.touch(collection, meeting_id)
+    assert meeting_repo.version(collection, meeting_id)[0] == 2
+    assert meeting_repo.version(collection, meeting_id)[1] >= modified
+    # Stored before versions: version 0, as of its creation
+    old = collection.insert_one({ "name": "old", "created": modified })
+    assert meeting_repo.version(collection, old.inserted_id) == (0, modified)
+    meeting_repo.delete(collection, meeting_id)
+    assert meeting_repo.version(collection, meeting_id) is None
+
+    assert meeting_repo.list_version(counters) == (0, None)
+    meeting_repo.list_changed(counters)
+    meeting_repo.list_changed(counters)
+    assert meeting_repo.list_version(counters)[0] == 2
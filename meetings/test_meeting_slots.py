@@ -0,0 +1,73 @@
+"""
+Tests for meeting_slots.py, on mongomock collections.
+"""
+
+from datetime import date, time
+
+import mongomock
+
+import freetime
+import meeting_repo
+import meeting_slots
+import timeparse
+
+PACIFIC = timeparse.get_tz("America/Los_Angeles")
+
+
+def make_slots():
+    db = mongomock.MongoClient().db
+    slots = meeting_slots.MeetingSlots(db.participants, db.meeting_slots,
+                                       PACIFIC, db.meetings)
+    record = { "name": "Review", "dateRange": [ "2017-11-27", "2017-11-28" ],
+               "timeRange": [ "09:00", "11:00" ] }
+    meeting_repo.insert(db.meetings, record)
+    return db, slots, record
+
+
+def free(day, begin, end):
+    """One free interval on a day of the meeting, in epoch minutes"""
+    return [ (freetime.local_minutes(date(2017, 11, day), begin, PACIFIC),
+              freetime.local_minutes(date(2017, 11, day), end, PACIFIC)) ]
+
+
+def test_counts_follow_changed_availability():
+    db, slots, record = make_slots()
+    slots.set_availability(record, "ann", free(27, time(9), time(10)))
+    slots.set_availability(record, "bob", free(27, time(9, 30), time(11)))
+    counts = slots.counts(record)
+    # 8 slots a day: ann has 0-3, bob 2-7
+    assert counts.tolist() == [ 1, 1, 2, 2, 1, 1, 1, 1 ] + [ 0 ] * 8
+    assert slots.best_slots(record, k=2) == [ (2, 2), (3, 2) ]
+    slots.set_availability(record, "ann", free(28, time(9), time(9, 15)))
+    assert slots.counts(record).tolist() == (
+        [ 0, 0, 1, 1, 1, 1, 1, 1 ] + [ 1 ] + [ 0 ] * 7)
+    assert db.meeting_slots.find_one({ "_id": record["_id"] })[
+        "participants"] == 2
+
+
+def test_writes_bump_the_meeting_version():
+    db, slots, record = make_slots()
+    assert meeting_repo.version(db.meetings, record["_id"])[0] == 1
+    slots.set_availability(record, "ann", free(27, time(9), time(10)))
+    assert meeting_repo.version(db.meetings, record["_id"])[0] == 2
+    slots.rebuild(record["_id"])
+    assert meeting_repo.version(db.meetings, record["_id"])[0] == 3
+
+
+def test_rebuild_matches_incremental_counts():
+    db, slots, record = make_slots()
+    slots.set_availability(record, "ann", free(27, time(9), time(10)))
+    slots.set_availability(record, "bob", free(28, time(10), time(11)))
+    before = slots.counts(record).tolist()
+    db.meeting_slots.delete_many({ })
+    assert slots.rebuild(record["_id"]) == 2
+    assert slots.counts(record).tolist() == before
+
+
+def test_delete_removes_participants_and_counts():
+    db, slots, record = make_slots()
+    slots.set_availability(record, "ann", free(27, time(9), time(10)))
+    slots.delete(record["_id"])
+    assert db.participants.count_documents({ }) == 0
+    assert db.meeting_slots.count_documents({ }) == 0
+    assert slots.counts(record).sum() == 0
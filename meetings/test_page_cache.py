@@ -0,0 +1,56 @@
+"""
+Tests for page_cache.py, and for the ETag and Last-Modified answers
+of the meetings list.
+"""
+
+import meeting_repo
+import page_cache
+import stubs
+
+
+def test_render_once_per_version():
+    cache = page_cache.FragmentCache()
+    calls = [ ]
+
+    def render():
+        calls.append(1)
+        return "html {}".format(len(calls))
+
+    assert cache.render("meeting", "a", 1, render) == "html 1"
+    assert cache.render("meeting", "a", 1, render) == "html 1"
+    assert cache.render("meeting", "a", 2, render) == "html 2"
+    assert len(calls) == 2
+
+
+def test_invalidate():
+    cache = page_cache.FragmentCache()
+    cache.put("meeting", "a", 1, "a")
+    cache.put("meeting", "b", 1, "b")
+    cache.put("index", "", 1, "list")
+    cache.invalidate("meeting", "a")
+    assert cache.get("meeting", "a", 1) is None
+    assert cache.get("meeting", "b", 1) == "b"
+    cache.invalidate("meeting")
+    assert cache.get("meeting", "b", 1) is None
+    assert cache.get("index", "", 1) == "list"
+
+
+def test_index_answers_conditional_gets():
+    web = stubs.app().test_client()
+    import flask_main
+    flask_main.meetings_changed(None)
+    first = web.get("/index")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert web.get("/index", headers={ "If-None-Match": etag }
+                   ).status_code == 304
+    assert web.get("/index", headers={
+        "If-Modified-Since": first.headers["Last-Modified"] }
+                   ).status_code == 304
+    # A new meeting is a new version of the list
+    meeting_repo.insert(flask_main.collection, { "name": "new meeting" })
+    flask_main.meetings_changed(None)
+    again = web.get("/index", headers={ "If-None-Match": etag })
+    assert again.status_code == 200
+    assert again.headers["ETag"] != etag
+    assert b"new meeting" in again.data
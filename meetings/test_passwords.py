@@ -0,0 +1,125 @@
+"""
+Tests for passwords.py, for the compare-and-set in
+meeting_repo.set_password, and for how /_view_Meeting remembers a
+meeting a session has unlocked.
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+
+import mongomock
+
+import meeting_repo
+import passwords
+import stubs
+
+SCRYPT = passwords.PasswordHasher("scrypt", scrypt_n=2 ** 4)
+PBKDF2 = passwords.PasswordHasher("pbkdf2_sha256", iterations=1000)
+
+
+def legacy_hash(password, salt="abc"):
+    return "{}:{}".format(
+        hashlib.sha256(salt.encode() + password.encode()).hexdigest(), salt)
+
+
+def test_scrypt_round_trip():
+    stored = SCRYPT.hash("secret")
+    assert stored.startswith("scrypt$16$8$1$")
+    assert SCRYPT.verify(stored, "secret")
+    assert not SCRYPT.verify(stored, "Secret")
+    # Salted: the same password hashes differently each time
+    assert SCRYPT.hash("secret") != stored
+
+
+def test_pbkdf2_round_trip():
+    stored = PBKDF2.hash("secret")
+    assert stored.startswith("pbkdf2_sha256$1000$")
+    assert PBKDF2.verify(stored, "secret")
+    assert not PBKDF2.verify(stored, "secre")
+
+
+def test_hashes_of_other_schemes_and_costs_verify():
+    assert SCRYPT.verify(PBKDF2.hash("secret"), "secret")
+    stronger = passwords.PasswordHasher("scrypt", scrypt_n=2 ** 5)
+    assert stronger.verify(SCRYPT.hash("secret"), "secret")
+
+
+def test_needs_upgrade():
+    assert not SCRYPT.needs_upgrade(SCRYPT.hash("secret"))
+    assert SCRYPT.needs_upgrade(PBKDF2.hash("secret"))
+    assert SCRYPT.needs_upgrade(legacy_hash("secret"))
+    assert passwords.PasswordHasher(
+        "scrypt", scrypt_n=2 ** 5).needs_upgrade(SCRYPT.hash("secret"))
+    assert passwords.PasswordHasher(
+        "pbkdf2_sha256", iterations=2000).needs_upgrade(PBKDF2.hash("secret"))
+    assert not SCRYPT.needs_upgrade("")
+
+
+def test_legacy_hash_verifies():
+    assert SCRYPT.verify(legacy_hash("old"), "old")
+    assert not SCRYPT.verify(legacy_hash("old"), "new")
+
+
+def test_no_password_is_open():
+    assert SCRYPT.verify("", "anything")
+    assert SCRYPT.verify(None, "")
+
+
+def test_malformed_hash_does_not_verify():
+    stored = SCRYPT.hash("secret")
+    for bad in (stored[:20], stored.replace("$16$", "$x$"), "scrypt$",
+                "pbkdf2_sha256$1000$zz$zz", "no colon", "a:b:c"):
+        assert not SCRYPT.verify(bad, "secret"), bad
+
+
+def test_set_password_only_replaces_the_hash_it_read():
+    meetings = mongomock.MongoClient().db.meetings
+    record = { "name": "Review", "pw": legacy_hash("old") }
+    meeting_repo.insert(meetings, record)
+    meeting_id = str(record["_id"])
+    upgraded = SCRYPT.hash("old")
+    meeting_repo.set_password(meetings, meeting_id, record["pw"], upgraded)
+    assert meeting_repo.get(meetings, meeting_id)["pw"] == upgraded
+    # Another request that read the legacy hash too finds it gone
+    meeting_repo.set_password(meetings, meeting_id, record["pw"],
+                              SCRYPT.hash("old"))
+    assert meeting_repo.get(meetings, meeting_id)["pw"] == upgraded
+
+
+def unlock(web, meeting_id, password):
+    return web.post("/_view_Meeting",
+                    data={ "id": meeting_id, "pw": password }).status_code
+
+
+def test_view_meeting_unlocks_for_a_while(monkeypatch):
+    app = stubs.app()
+    import flask_main
+    record = { "name": "Review", "pw": legacy_hash("old") }
+    meeting_repo.insert(flask_main.collection, record)
+    meeting_id = str(record["_id"])
+    web = app.test_client()
+
+    assert unlock(web, meeting_id, "wrong") == 403
+    assert unlock(web, meeting_id, "old") == 200
+    # The legacy hash was replaced with one of the current scheme
+    stored = meeting_repo.get(flask_main.collection, meeting_id)["pw"]
+    assert stored.startswith("scrypt$")
+    # Unlocked: no password needed until PASSWORD_CACHE_TTL is up
+    assert unlock(web, meeting_id, "") == 200
+    assert unlock(app.test_client(), meeting_id, "") == 403
+
+    class Later(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() + timedelta(
+                seconds=stubs.CONFIG.PASSWORD_CACHE_TTL + 1)
+
+    monkeypatch.setattr(flask_main, "datetime", Later)
+    assert unlock(web, meeting_id, "") == 403
+    assert unlock(web, meeting_id, "old") == 200
+
+
+def test_view_meeting_unknown_id():
+    web = stubs.app().test_client()
+    assert unlock(web, "5a1c0ffee000000000000000", "") == 404
+    assert unlock(web, "not an id", "") == 404
@@ -0,0 +1,60 @@
+"""
+Tests for profiling.py, through a small Flask app.
+"""
+
+import os
+import shutil
+import tempfile
+
+import flask
+
+import profiling
+
+
+def make_app(output_dir, **kwargs):
+    app = flask.Flask(__name__)
+    profiling.init_app(app, output_dir, interval=0.001, **kwargs)
+
+    @app.route("/")
+    def index():
+        return "ok"
+
+    return app
+
+
+def profiled(output_dir, headers=None, **kwargs):
+    """Files written for one request to a new app"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    make_app(output_dir, **kwargs).test_client().get("/", headers=headers)
+    return sorted(os.listdir(output_dir))
+
+
+def test_header_needs_the_secret():
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = os.path.join(tmp, "profiles")
+        assert profiled(output_dir, { "X-Profile": "1" },
+                        secret="s3cret") == [ ]
+        files = profiled(output_dir, { "X-Profile": "s3cret" },
+                         secret="s3cret")
+        assert [ os.path.splitext(f)[1] for f in files ] == [
+            ".collapsed", ".txt" ]
+
+
+def test_header_without_secret_only_in_debug():
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = os.path.join(tmp, "profiles")
+        assert profiled(output_dir, { "X-Profile": "1" }) == [ ]
+        app = make_app(output_dir)
+        app.debug = True
+        app.test_client().get("/", headers={ "X-Profile": "1" })
+        assert len(os.listdir(output_dir)) == 2
+
+
+def test_no_more_files_than_max_files():
+    with tempfile.TemporaryDirectory() as output_dir:
+        client = make_app(output_dir, sample_rate=1.0, mode="cprofile",
+                          max_files=5).test_client()
+        for _ in range(4):
+            client.get("/")
+        # Two profiles of two files each; a third would make six
+        assert len(os.listdir(output_dir)) == 4
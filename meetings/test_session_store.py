@@ -0,0 +1,123 @@
+"""
+Tests for session_store.py on its in-memory backend, through a small
+Flask app.
+"""
+
+import datetime
+
+import flask
+
+import session_store
+
+
+class RecordingStore(session_store.MemorySessionStore):
+    """A MemorySessionStore that records the calls made to it"""
+
+    def __init__(self):
+        super().__init__()
+        self.loaded = [ ]
+        self.saved = [ ]
+
+    def load_key(self, sid, key):
+        self.loaded.append(key)
+        return super().load_key(sid, key)
+
+    def save(self, sid, changed, deleted, expires):
+        self.saved.append((dict(changed), set(deleted)))
+        super().save(sid, changed, deleted, expires)
+
+
+def make_app(store, ttl=session_store.DEFAULT_TTL):
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = session_store.ServerSessionInterface(store, ttl=ttl)
+
+    @app.route("/set/<key>/<value>")
+    def set_value(key, value):
+        flask.session[key] = value
+        return "ok"
+
+    @app.route("/get/<key>")
+    def get_value(key):
+        return flask.session.get(key, "-")
+
+    @app.route("/delete/<key>")
+    def delete_value(key):
+        flask.session.pop(key, None)
+        return "ok"
+
+    @app.route("/keys")
+    def keys():
+        return ",".join(sorted(flask.session))
+
+    return app
+
+
+def test_values_survive_between_requests():
+    store = RecordingStore()
+    client = make_app(store).test_client()
+    client.get("/set/a/1")
+    client.get("/set/b/2")
+    assert client.get("/get/a").data == b"1"
+    assert client.get("/keys").data == b"a,b"
+    # The cookie holds only the signed id; the values stay in the store
+    sid = client.get_cookie("session").value.rsplit(".", 1)[0]
+    assert list(store._sessions) == [ sid ]
+    assert store.load_all(sid) == { "a": "1", "b": "2" }
+
+
+def test_only_read_keys_are_loaded_and_changed_keys_saved():
+    store = RecordingStore()
+    client = make_app(store).test_client()
+    client.get("/set/a/1")
+    client.get("/set/b/2")
+    store.loaded.clear()
+    store.saved.clear()
+    assert client.get("/get/b").data == b"2"
+    assert store.loaded == [ "b" ]
+    assert store.saved == [ ]
+    client.get("/set/a/3")
+    assert store.saved == [ ({ "a": "3" }, set()) ]
+    assert client.get("/get/b").data == b"2"
+
+
+def test_deleted_keys_are_removed():
+    store = RecordingStore()
+    client = make_app(store).test_client()
+    client.get("/set/a/1")
+    client.get("/delete/a")
+    assert store.saved[-1] == ({ }, { "a" })
+    assert client.get("/get/a").data == b"-"
+
+
+def test_sessions_are_separate():
+    app = make_app(session_store.MemorySessionStore())
+    first = app.test_client()
+    second = app.test_client()
+    first.get("/set/a/1")
+    assert second.get("/get/a").data == b"-"
+
+
+def test_tampered_cookie_starts_a_new_session():
+    app = make_app(session_store.MemorySessionStore())
+    client = app.test_client()
+    client.get("/set/a/1")
+    sid = client.get_cookie("session").value
+    client.set_cookie("session", "x" + sid)
+    assert client.get("/get/a").data == b"-"
+
+
+def test_expired_sessions_are_gone():
+    store = session_store.MemorySessionStore()
+    past = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    store.save("old", { "a": 1 }, set(), past)
+    assert store.load_key("old", "a") is session_store._MISSING
+    assert store.load_all("old") == { }
+
+
+def test_unchanged_new_session_sets_no_cookie():
+    store = RecordingStore()
+    client = make_app(store).test_client()
+    response = client.get("/get/a")
+    assert "Set-Cookie" not in response.headers
+    assert store.saved == [ ]
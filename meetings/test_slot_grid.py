@@ -0,0 +1,103 @@
+"""
+Tests for slot_grid.py, over the days when daylight saving time
+starts (2026-03-08) and ends (2026-11-01) in Los Angeles.
+"""
+
+from datetime import date, time
+
+import freetime
+import slot_grid
+import timeparse
+
+PACIFIC = timeparse.get_tz("America/Los_Angeles")
+
+
+def local(minutes):
+    return freetime.from_minutes(minutes, PACIFIC).isoformat()
+
+
+def test_fall_back_day_keeps_the_repeated_hour():
+    grid = slot_grid.SlotGrid(date(2026, 10, 31), date(2026, 11, 2),
+                              time(0), time(3), PACIFIC)
+    assert [ (end - start) // 60 for start, end in grid.windows ] == [
+        3, 4, 3 ]
+    assert [ len(grid.slots[(grid.slots >= start) & (grid.slots < end)])
+             for start, end in grid.windows ] == [ 12, 16, 12 ]
+    assert [ local(start) for start, _ in grid.windows ] == [
+        "2026-10-31T00:00:00-07:00", "2026-11-01T00:00:00-07:00",
+        "2026-11-02T00:00:00-08:00" ]
+    # Opened in daylight time, closed in standard time
+    assert local(grid.windows[1][1]) == "2026-11-01T03:00:00-08:00"
+
+
+def test_spring_forward_day_skips_the_missing_hour():
+    grid = slot_grid.SlotGrid(date(2026, 3, 7), date(2026, 3, 9),
+                              time(1), time(4), PACIFIC)
+    assert [ (end - start) // 60 for start, end in grid.windows ] == [
+        3, 2, 3 ]
+    assert local(grid.windows[1][0]) == "2026-03-08T01:00:00-08:00"
+    assert local(grid.windows[1][1]) == "2026-03-08T04:00:00-07:00"
+
+
+def test_skipped_time_moves_forward():
+    # 02:30 does not exist on 2026-03-08; the window opens at 03:30
+    grid = slot_grid.SlotGrid(date(2026, 3, 8), date(2026, 3, 8),
+                              time(2, 30), time(5), PACIFIC)
+    assert local(grid.windows[0][0]) == "2026-03-08T03:30:00-07:00"
+    assert len(grid.slots) == 6
+
+
+def test_offsets_change_inside_one_range():
+    grid = slot_grid.SlotGrid(date(2026, 10, 31), date(2026, 11, 1),
+                              time(9), time(10), PACIFIC)
+    assert grid.time_min == "2026-10-31T09:00:00-07:00"
+    assert grid.time_max == "2026-11-01T10:00:01-08:00"
+    assert timeparse.parse_iso(grid.time_max) == freetime.from_minutes(
+        grid.windows[-1][1], PACIFIC).replace(second=1)
+    assert grid.window_labels() == [ "Sat 10/31 09:00-10:00",
+                                     "Sun 11/01 09:00-10:00" ]
+
+
+def test_rfc3339_of_a_skipped_time_names_the_time_asked_for():
+    grid = slot_grid.SlotGrid(date(2026, 3, 8), date(2026, 3, 8),
+                              time(2, 30), time(5), PACIFIC)
+    # The offset before the change: the text still says 02:30 and
+    # parses back to the instant the window opens
+    assert grid.time_min == "2026-03-08T02:30:00-08:00"
+    assert freetime.to_minutes(timeparse.parse_iso(grid.time_min)) == (
+        grid.windows[0][0])
+
+
+def test_rfc3339_of_an_empty_grid():
+    grid = slot_grid.SlotGrid(date(2026, 3, 9), date(2026, 3, 8),
+                              time(9), time(10), PACIFIC)
+    assert grid.windows == ( )
+    assert grid.time_min == "2026-03-09T09:00:00"
+
+
+def test_grid_is_shared_and_evicted():
+    first = slot_grid.grid(date(2026, 1, 5), date(2026, 1, 9), time(9),
+                           time(17), PACIFIC)
+    assert slot_grid.grid(date(2026, 1, 5), date(2026, 1, 9), time(9),
+                          time(17, tzinfo=PACIFIC), PACIFIC) is first
+    assert slot_grid.for_meeting({ "dateRange": [ "2026-01-05", "2026-01-09" ],
+                                   "timeRange": [ "09:00", "17:00" ] },
+                                 PACIFIC) is first
+    assert slot_grid.for_window(first.time_min, first.time_max,
+                                PACIFIC) is first
+    for day in range(1, slot_grid.DEFAULT_SIZE + 1):
+        slot_grid.grid(date(2025, 1, 1), date(2025, 1, 1), time(0),
+                       time(0, day % 60, day // 60), PACIFIC)
+    assert slot_grid.grid(date(2026, 1, 5), date(2026, 1, 9), time(9),
+                          time(17), PACIFIC) is not first
+
+
+def test_slots_are_read_only():
+    grid = slot_grid.grid(date(2026, 1, 5), date(2026, 1, 5), time(9),
+                          time(10), PACIFIC)
+    try:
+        grid.slots[0] = 0
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("slots are writable")
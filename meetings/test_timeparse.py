@@ -0,0 +1,80 @@
+"""
+Tests for timeparse.py: each fast path gives what arrow gave for
+the same input.
+"""
+
+from datetime import datetime, timezone
+
+import arrow
+
+import timeparse
+
+PACIFIC = timeparse.get_tz("America/Los_Angeles")
+TIME_FORMATS = [ "ha", "h:mma", "h:mm a", "H:mm" ]
+
+
+def test_parse_iso_matches_arrow():
+    for text in [ "2017-11-27T09:00:00-08:00", "2017-11-27T17:00:00Z",
+                  "2017-11-27T17:00:00.250000+00:00",
+                  "2026-11-01T01:30:00-07:00" ]:
+        assert timeparse.parse_iso(text) == arrow.get(text).datetime, text
+
+
+def test_parse_iso_keeps_text_without_offset_naive():
+    # arrow would take it as UTC; as_local takes it as local time
+    assert timeparse.parse_iso("2017-11-27T09:00:00") == datetime(
+        2017, 11, 27, 9)
+    assert timeparse.as_local("2017-11-27T09:00:00") == datetime(
+        2017, 11, 27, 9, tzinfo=timeparse.local_tz())
+
+
+def test_parse_iso_falls_back_to_arrow():
+    # Not something datetime.fromisoformat reads
+    assert timeparse.parse_iso("20171127T090000Z") == datetime(
+        2017, 11, 27, 9, tzinfo=timezone.utc)
+
+
+def test_parse_time_matches_arrow():
+    for text in [ "1pm", "12am", "12pm", "9am", "1:30pm", "11:05am",
+                  "1:30 pm", "12:15 am", "13:30", "0:05", "9:00" ]:
+        assert (timeparse.parse_time(text)
+                == arrow.get(text, TIME_FORMATS).time()), text
+
+
+def test_parse_time_rejects_what_arrow_rejects():
+    for text in [ "noon", "25:00", "1:3pm", "" ]:
+        try:
+            arrow.get(text, TIME_FORMATS)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("arrow read {!r}".format(text))
+        try:
+            timeparse.parse_time(text)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("parse_time read {!r}".format(text))
+
+
+def test_parse_date_matches_arrow():
+    for text in [ "11/27/2017", "02/29/2016", "12/31/2001" ]:
+        assert (timeparse.parse_date(text)
+                == arrow.get(text, "MM/DD/YYYY").date()), text
+
+
+def test_format_matches_arrow():
+    values = [ datetime(2017, 11, 27, 0, 5, tzinfo=PACIFIC),
+               datetime(2017, 11, 27, 12, 30, 9, tzinfo=PACIFIC),
+               datetime(2026, 7, 4, 21, 0, tzinfo=timezone.utc) ]
+    patterns = [ "YYYY-MM-DD", "MM/DD/YYYY", "ddd MM/DD/YYYY", "dddd",
+                 "HH:mm", "HH:mm:ss", "h:mm a", "h:mma", "hh:mm A",
+                 "YYYY-MM-DDTHH:mm:ssZZ", "HH:mm Z", "100% h" ]
+    for value in values:
+        for pattern in patterns:
+            assert (timeparse.format(value, pattern)
+                    == arrow.get(value).format(pattern)), (value, pattern)
+
+
+def test_format_reads_iso_text():
+    assert timeparse.format("2017-11-27T13:05:00-08:00", "h:mm a") == "1:05 pm"
@@ -0,0 +1,57 @@
+"""
+Tests for tracing.py, through a small Flask app with a sync and an
+async view.
+"""
+
+import asyncio
+
+import flask
+
+import tracing
+
+
+def make_app():
+    app = flask.Flask(__name__)
+    tracing.init_app(app)
+
+    @app.route("/sync")
+    def sync_view():
+        with tracing.span("work"):
+            pass
+        return "ok"
+
+    @app.route("/async")
+    async def async_view():
+        with tracing.span("work"):
+            await asyncio.sleep(0)
+        with tracing.span("work"):
+            pass
+        return "ok"
+
+    return app
+
+
+def teardown_function():
+    # init_app turns tracing on for the whole process
+    tracing._enabled = False
+
+
+def span_count(endpoint, name):
+    return tracing.METRICS.span_count[(endpoint, name)]
+
+
+def test_spans_of_sync_and_async_views_are_recorded():
+    client = make_app().test_client()
+    sync_before = span_count("sync_view", "work")
+    async_before = span_count("async_view", "work")
+    assert client.get("/sync").status_code == 200
+    assert client.get("/async").status_code == 200
+    assert span_count("sync_view", "work") == sync_before + 1
+    assert span_count("async_view", "work") == async_before + 2
+    assert tracing.METRICS.requests[("async_view", 200)] >= 1
+
+
+def test_no_trace_outside_a_request():
+    make_app()
+    assert tracing.current() is None
+    assert tracing.span("work") is tracing._NULL_SPAN
@@ -0,0 +1,37 @@
+"""
+A thread pool made on first use, and made again after a fork.
+
+Jobs, password hashing and calendar fetches each run in a bounded
+pool of threads that lives as long as the process.  Gunicorn forks
+its workers from a preloaded master, and threads do not survive a
+fork: a pool inherited from the parent holds no threads, and work
+submitted to it would never run.  So the pool notes the pid that
+made it, and a process that finds another pid there makes its own.
+"""
+
+import os
+import threading
+from concurrent import futures
+
+
+class ThreadPool:
+    """A ThreadPoolExecutor of max_workers threads per process"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        """This process's executor, made if there is none yet"""
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def submit(self, fn, *args):
+        """A future of fn(*args), run in this process's pool"""
+        return self.executor().submit(fn, *args)
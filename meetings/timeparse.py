@@ -0,0 +1,146 @@
+"""
+Parsing and formatting of dates and times.
+
+arrow.get with a list of formats tries each format in turn with
+regular expressions, and arrow's format() re-tokenizes its pattern
+on every call; in free-time requests that dominated CPU.  Here:
+
+  - time zones are looked up once (local_tz, get_tz), and dateutil
+    is imported only then;
+  - RFC3339 / ISO 8601 text, which is what Google and our own
+    session values use, goes through datetime.fromisoformat, with
+    arrow only as a fallback for anything unusual;
+  - arrow-style format patterns ("YYYY-MM-DD", "HH:mm", ...) are
+    translated to strftime once per pattern and cached.
+"""
+
+import functools
+import re
+from datetime import datetime, time
+
+
+@functools.lru_cache(maxsize=None)
+def local_tz():
+    """The server's local time zone, looked up once"""
+    from dateutil import tz
+    return tz.tzlocal()
+
+
+@functools.lru_cache(maxsize=64)
+def get_tz(name):
+    """A time zone by name ('local', 'UTC', 'America/Los_Angeles')"""
+    if name == "local":
+        return local_tz()
+    from dateutil import tz
+    return tz.gettz(name)
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_iso(text):
+    """
+    ISO 8601 / RFC3339 text to a datetime (aware if the text has
+    an offset).  Results are cached, since the same session values
+    and event times are parsed many times per request.
+    """
+    try:
+        if text.endswith("Z"):
+            return datetime.fromisoformat(text[:-1] + "+00:00")
+        return datetime.fromisoformat(text)
+    except ValueError:
+        import arrow  # slow to import, and rarely needed
+        return arrow.get(text).datetime
+
+
+# Times of day as people type them: 1pm, 1:30pm, 1:30 pm, 13:30
+_TIME = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*([aApP][mM])?\s*$")
+
+
+def parse_time(text):
+    """
+    Time of day in one of the formats "ha", "h:mma", "h:mm a" or
+    "H:mm" to a naive datetime.time.  Raises ValueError otherwise.
+    """
+    match = _TIME.match(text)
+    if not match:
+        raise ValueError("Time '{}' not understood".format(text))
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    meridian = match.group(3)
+    if meridian:
+        if not 1 <= hour <= 12:
+            raise ValueError("Time '{}' not understood".format(text))
+        hour = hour % 12 + (12 if meridian.lower() == "pm" else 0)
+    elif match.group(2) is None:
+        # A bare number is only a time with am/pm ("ha")
+        raise ValueError("Time '{}' not understood".format(text))
+    return time(hour, minute)
+
+
+def parse_date(text):
+    """Date as MM/DD/YYYY to a datetime.date"""
+    return datetime.strptime(text.strip(), "%m/%d/%Y").date()
+
+
+# arrow format tokens and their strftime equivalents.  Those with no
+# locale-independent strftime code (unpadded 12-hour clock, am/pm,
+# offset with a colon) are functions of the value instead.
+_TOKENS = re.compile(r"YYYY|MM|DD|dddd|ddd|HH|hh|h|mm|ss|A|a|ZZ|Z")
+_STRFTIME = { "YYYY": "%Y", "MM": "%m", "DD": "%d", "dddd": "%A",
+              "ddd": "%a", "HH": "%H", "hh": "%I", "mm": "%M",
+              "ss": "%S", "Z": "%z" }
+
+
+def _colon_offset(value):
+    offset = value.strftime("%z")
+    return offset[:3] + ":" + offset[3:] if offset else ""
+
+
+_FUNCTIONS = {
+    "h": lambda value: str(value.hour % 12 or 12),
+    "A": lambda value: "AM" if value.hour < 12 else "PM",
+    "a": lambda value: "am" if value.hour < 12 else "pm",
+    "ZZ": _colon_offset,
+}
+
+
+@functools.lru_cache(maxsize=64)
+def formatter(pattern):
+    """
+    A function formatting a datetime (or date) with an arrow-style
+    pattern such as "ddd MM/DD/YYYY" or "h:mm a ZZ", as arrow would.
+    """
+    pieces = [ "" ]   # strftime text, alternating with functions
+    last = 0
+    for match in _TOKENS.finditer(pattern):
+        pieces[-1] += pattern[last:match.start()].replace("%", "%%")
+        token = match.group(0)
+        if token in _FUNCTIONS:
+            pieces += [ _FUNCTIONS[token], "" ]
+        else:
+            pieces[-1] += _STRFTIME[token]
+        last = match.end()
+    pieces[-1] += pattern[last:].replace("%", "%%")
+    if len(pieces) == 1:
+        strftime = pieces[0]
+        return lambda value: value.strftime(strftime)
+
+    def format_pieces(value):
+        return "".join(piece(value) if callable(piece)
+                       else value.strftime(piece) for piece in pieces)
+    return format_pieces
+
+
+def format(value, pattern):
+    """value (datetime, date or ISO text) formatted with pattern"""
+    if isinstance(value, str):
+        value = parse_iso(value)
+    return formatter(pattern)(value)
+
+
+def as_local(value):
+    """ISO text or datetime to an aware datetime in local time"""
+    if isinstance(value, str):
+        value = parse_iso(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=local_tz())
+    return value.astimezone(local_tz())
@@ -0,0 +1,225 @@
+"""
+Request tracing and metrics.
+
+Code marks the expensive parts of a request with spans:
+
+    with tracing.span("calendar"):
+        ...
+
+and may attach messages that are formatted only if the request is
+being traced:
+
+    tracing.note("Got %d events for %s", len(items), cal_id)
+
+init_app(app, ...) turns this on for a Flask app.  For every request
+it then adds up the time spent in each kind of span (we use
+"calendar" for Google API calls, "freetime" for free-time
+computation, "mongo" for database commands and "render" for
+templates) into Prometheus-style metrics served at /metrics.  A
+sampled fraction of requests is also written, one JSON object per
+line, to a trace file: endpoint, status, total time, span timings
+and notes.  Spans may nest (free-time computation pulls event pages
+from Google as it goes); each is timed inclusively.
+
+The current request's trace is kept in a context variable rather
+than a thread-local: Flask runs async views in an event loop on
+another thread, in a copy of the request's context, and spans
+opened there still reach the request's trace.
+
+Unless init_app is called, span() hands back one shared do-nothing
+context manager and note() returns at once, so the instrumentation
+costs next to nothing when tracing is off.
+"""
+
+import collections
+import contextlib
+import contextvars
+import json
+import random
+import threading
+import time
+
+import flask
+from pymongo import monitoring
+
+_enabled = False
+_trace = contextvars.ContextVar("trace", default=None)
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class RequestTrace:
+    """Span timings and notes for one request"""
+
+    def __init__(self, endpoint, sampled):
+        self.endpoint = endpoint
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        self.spans = collections.defaultdict(float)
+        self.counts = collections.defaultdict(int)
+        self.notes = [ ]
+
+    def add(self, name, seconds):
+        self.spans[name] += seconds
+        self.counts[name] += 1
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def current():
+    """The RequestTrace of the current request, or None"""
+    if not _enabled:
+        return None
+    return _trace.get()
+
+
+def span(name):
+    """Context manager timing a block as part of the current request"""
+    trace = current()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+
+def note(message, *args):
+    """Attach a message to the trace, formatted only if it is sampled"""
+    trace = current()
+    if trace is not None and trace.sampled:
+        trace.notes.append(message % args if args else message)
+
+
+class Metrics:
+    """Counters and time totals, exported in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = collections.Counter()         # (endpoint, status)
+        self.request_seconds = collections.Counter()  # endpoint
+        self.span_seconds = collections.Counter()     # (endpoint, span)
+        self.span_count = collections.Counter()       # (endpoint, span)
+        self.gauges = [ ]                             # callables -> dict
+
+    def record(self, trace, status):
+        elapsed = time.perf_counter() - trace.start
+        with self._lock:
+            self.requests[(trace.endpoint, status)] += 1
+            self.request_seconds[trace.endpoint] += elapsed
+            for name, seconds in trace.spans.items():
+                self.span_seconds[(trace.endpoint, name)] += seconds
+                self.span_count[(trace.endpoint, name)] += trace.counts[name]
+        return elapsed
+
+    def text(self):
+        lines = [ "# TYPE meetme_requests_total counter" ]
+        with self._lock:
+            for (endpoint, status), n in sorted(self.requests.items()):
+                lines.append('meetme_requests_total{{endpoint="{}",status="{}"}} {}'
+                             .format(endpoint, status, n))
+            lines.append("# TYPE meetme_request_seconds_total counter")
+            for endpoint, seconds in sorted(self.request_seconds.items()):
+                lines.append('meetme_request_seconds_total{{endpoint="{}"}} {:.6f}'
+                             .format(endpoint, seconds))
+            lines.append("# TYPE meetme_span_seconds_total counter")
+            for (endpoint, name), seconds in sorted(self.span_seconds.items()):
+                lines.append('meetme_span_seconds_total{{endpoint="{}",span="{}"}} {:.6f}'
+                             .format(endpoint, name, seconds))
+            lines.append("# TYPE meetme_span_total counter")
+            for (endpoint, name), n in sorted(self.span_count.items()):
+                lines.append('meetme_span_total{{endpoint="{}",span="{}"}} {}'
+                             .format(endpoint, name, n))
+        for gauge in self.gauges:
+            for name, value in sorted(gauge().items()):
+                lines.append("# TYPE meetme_{} gauge".format(name))
+                lines.append("meetme_{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Adds the duration of each Mongo command to a 'mongo' span"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        trace = current()
+        if trace is not None:
+            trace.add("mongo", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+def init_app(app, sample_rate=0.0, trace_file=None, metrics_path="/metrics"):
+    """
+    Trace every request of app into METRICS, serve them at
+    metrics_path, and write a sample_rate fraction of requests to
+    trace_file (if given).
+    """
+    global _enabled
+    _enabled = True
+    # Applies to Mongo clients created from now on; ours are lazy
+    monitoring.register(MongoCommandTimer())
+    trace_lock = threading.Lock()
+
+    @app.before_request
+    def _start_trace():
+        sampled = trace_file is not None and random.random() < sample_rate
+        _trace.set(RequestTrace(flask.request.endpoint, sampled))
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = _trace.get()
+        if trace is None:
+            return response
+        _trace.set(None)
+        elapsed = METRICS.record(trace, response.status_code)
+        if trace.sampled:
+            line = json.dumps({ "endpoint": trace.endpoint,
+                                "status": response.status_code,
+                                "seconds": round(elapsed, 6),
+                                "spans": { name: round(seconds, 6)
+                                           for name, seconds in trace.spans.items() },
+                                "notes": trace.notes })
+            with trace_lock, open(trace_file, "a") as f:
+                f.write(line + "\n")
+        return response
+
+    @app.teardown_request
+    def _drop_trace(exc):
+        # after_request is skipped when a view raises
+        _trace.set(None)
+
+    renders = threading.local()
+
+    def _render_started(sender, template, context, **extra):
+        renders.start = time.perf_counter()
+
+    def _render_done(sender, template, context, **extra):
+        trace = current()
+        if trace is not None and getattr(renders, "start", None):
+            trace.add("render", time.perf_counter() - renders.start)
+            renders.start = None
+
+    flask.before_render_template.connect(_render_started, app, weak=False)
+    flask.template_rendered.connect(_render_done, app, weak=False)
+
+    def _metrics():
+        return flask.Response(METRICS.text(), mimetype="text/plain")
+
+    app.add_url_rule(metrics_path, "metrics", _metrics)